@@ -1,23 +1,20 @@
 # --- agents/analyzer_agent.py ---
+import asyncio
 import json
-from utils.local_llm import call_llm
+from typing import Optional
+
+from utils.async_llm import AsyncLLMClient
+from utils.local_llm import call_llm, llm_client
 from utils.logger import logger
 
 
 class AnalyzerAgent:
-    def __init__(self, model: str = "mistralai/devstral-small-2507"):
+    def __init__(self, model: str = "mistralai/devstral-small-2507", aclient: Optional[AsyncLLMClient] = None):
         self.model = model
+        self._aclient = aclient
 
     def analyze(self, task_prompt: str, generated_code: str, execution_output: str) -> dict:
-        full_prompt = (
-            f"### Task Prompt:\n{task_prompt.strip()}\n\n"
-            f"### Generated Code:\n{generated_code.strip()}\n\n"
-            f"### Execution Output:\n{execution_output.strip()}\n\n"
-            f"Now analyze and return JSON as instructed."
-        )
-
-        logger.debug("AnalyzerAgent prompt constructed")
-
+        full_prompt = self._prompt(task_prompt, generated_code, execution_output)
         try:
             result = call_llm(
                 prompt=full_prompt,
@@ -25,19 +22,56 @@ class AnalyzerAgent:
                 temperature=0.0,
                 max_tokens=256
             )
-            logger.debug("Raw Analyzer LLM response:\n{}", result)
-
-            parsed = json.loads(result)
-            if "status" in parsed and "explanation" in parsed:
-                return parsed
-            else:
-                raise ValueError("Missing 'status' or 'explanation' keys in response JSON")
+            return self._parse(result)
+        except Exception as e:
+            return self._failed(e)
+
+    async def aanalyze(self, task_prompt: str, generated_code: str, execution_output: str) -> dict:
+        """
+        asyncio counterpart of analyze(), bounded by the AsyncLLMClient in-flight caps.
+        Cancellation propagates to the caller; the request already sent still runs to completion.
+        """
+        if self._aclient is None:
+            self._aclient = AsyncLLMClient(llm_client)
+        full_prompt = self._prompt(task_prompt, generated_code, execution_output)
+        try:
+            result = await self._aclient.call_chat(
+                model=self.model,
+                messages=[{"role": "user", "content": full_prompt}],
+                temperature=0.0,
+                max_tokens=256
+            )
+            return self._parse(result)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            logger.error("AnalyzerAgent failed: {}", e)
-            return {
-                "status": "incomplete",
-                "explanation": f"Analyzer failed to evaluate properly: {e}"
-            }
+            return self._failed(e)
+
+    @staticmethod
+    def _prompt(task_prompt: str, generated_code: str, execution_output: str) -> str:
+        logger.debug("AnalyzerAgent prompt constructed")
+        return (
+            f"### Task Prompt:\n{task_prompt.strip()}\n\n"
+            f"### Generated Code:\n{generated_code.strip()}\n\n"
+            f"### Execution Output:\n{execution_output.strip()}\n\n"
+            f"Now analyze and return JSON as instructed."
+        )
+
+    @staticmethod
+    def _parse(result: str) -> dict:
+        logger.debug("Raw Analyzer LLM response:\n{}", result)
+        parsed = json.loads(result)
+        if "status" in parsed and "explanation" in parsed:
+            return parsed
+        raise ValueError("Missing 'status' or 'explanation' keys in response JSON")
+
+    @staticmethod
+    def _failed(e: Exception) -> dict:
+        logger.error("AnalyzerAgent failed: {}", e)
+        return {
+            "status": "incomplete",
+            "explanation": f"Analyzer failed to evaluate properly: {e}"
+        }
 
 
 # --- agents/builder_agent.py ---
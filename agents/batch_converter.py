@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Offline (Batch API) mode for bulk Selenium -> Playwright conversion.
+
+Stage 1 sends every analyzer request of the run as one batch job, stage 2 sends
+the builder requests for the stage-1 mappings that fail the builder gate
+(utils.mapping_gate) as a second job. Progress lives in
+<out>/.batch/state.json, so re-running the same command after a crash or restart
+resumes polling the submitted job instead of paying for it again.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from agents.pom_converter_agent import (
+    POMConverterAgent,
+    _accept,
+    _cache_key_for,
+    _call_json_strict,
+    _strict_attempts,
+)
+from utils.llm_cache import response_cache
+from utils.llm_metrics import llm_stage
+from utils.openai_batch import BatchClient, parse_batch_output, write_batch_file
+from utils.openai_llm import USAGE_STATS, build_chat_payload
+
+logger = logging.getLogger(__name__)
+
+
+class BatchConverter:
+    def __init__(
+        self,
+        agent: POMConverterAgent,
+        out_dir: Path,
+        client: Optional[BatchClient] = None,
+        poll_s: float = 30.0,
+    ) -> None:
+        self.agent = agent
+        self.out_dir = Path(out_dir)
+        self.client = client or BatchClient()
+        self.poll_s = poll_s
+        self.work_dir = self.out_dir / ".batch"
+        self.state_path = self.work_dir / "state.json"
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        self.state: Dict[str, Any] = self._load_state()
+        self.mappings: Dict[Path, Dict[str, Any]] = {}  # final mapping per converted source
+
+    def convert_all(self, src_paths: List[Path]) -> Dict[Path, Optional[Exception]]:
+        """Converts every file; returns src -> None on success or the exception it hit."""
+        units: List[Tuple[str, Path, Any]] = []  # (custom_id, src, chunk)
+        analyzer: Dict[str, Dict[str, Any]] = {}
+        results: Dict[Path, Optional[Exception]] = {}
+        sources: Dict[Path, str] = {}
+        for fi, src in enumerate(src_paths):
+            sources[src] = src.read_text(encoding="utf-8")
+            code, done = self.agent.preconverted(src, sources[src], self.out_dir)
+            if done is not None:
+                self.mappings[src] = self.agent._store(src, self.out_dir, sources[src], done)
+                results[src] = None
+                continue
+            # Only pages registered by earlier runs: this run's analyzer requests go out together.
+            context = self.agent.page_context(src, self.out_dir, code)
+            for chunk in self.agent._split(src, code):
+                cid = f"f{fi}-c{chunk.index}"
+                units.append((cid, src, chunk))
+                analyzer[cid] = self.agent.analyzer_args(src, chunk.code, chunk, context)
+
+        mappings = self._run_stage("analyzer", analyzer)
+        srcs = {cid: src for cid, src, _ in units}
+        finals: Dict[str, Any] = {}
+        builder: Dict[str, Dict[str, Any]] = {}
+        for cid, m in mappings.items():
+            if not isinstance(m, dict):
+                continue
+            if self.agent.needs_builder(srcs[cid], m, self.out_dir):
+                builder[cid] = self.agent.builder_args(m)
+            else:
+                finals[cid] = m
+        finals.update(self._run_stage("builder", builder))
+
+        by_file: Dict[Path, List[Tuple[str, Any]]] = {}
+        for cid, src, chunk in units:
+            by_file.setdefault(src, []).append((cid, chunk))
+        for src, parts in by_file.items():
+            try:
+                missing = [cid for cid, _ in parts if not isinstance(finals.get(cid), dict)]
+                if missing:
+                    raise RuntimeError(f"no result for {', '.join(missing)}")
+                merged = self.agent._merge_chunks(src, [finals[cid] for cid, _ in parts])
+                self.mappings[src] = self.agent._store(src, self.out_dir, sources[src], merged)
+                results[src] = None
+            except Exception as e:
+                logger.error("Batch conversion failed for %s: %s", src.name, e)
+                results[src] = e
+        return results
+
+    # private --------------------------------------------------------------
+    def _run_stage(self, name: str, calls: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Resolves every call to a parsed mapping (or None). Cache hits skip the batch;
+        a batch already submitted for the same request set is resumed, not resubmitted.
+        """
+        fingerprint = hashlib.sha256(
+            json.dumps(calls, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+        st = self.state.setdefault("stages", {}).get(name)
+        if st is None or st.get("fingerprint") != fingerprint:
+            st = {"fingerprint": fingerprint}
+            self.state["stages"][name] = st
+            self._save_state()
+        results_path = self.work_dir / f"{name}_results.json"
+        if st.get("done") and results_path.exists():
+            logger.info("Batch stage %s: already done, reusing results", name)
+            return json.loads(results_path.read_text(encoding="utf-8"))
+
+        results: Dict[str, Any] = {}
+        pending: Dict[str, Dict[str, Any]] = {}
+        for cid, args in calls.items():
+            call = _strict_attempts(**args)[0]
+            raw = response_cache.get(_cache_key_for(call))
+            if raw is not None:
+                try:
+                    results[cid] = _accept(raw, "", True, args["model"])
+                    continue
+                except ValueError:
+                    pass
+            pending[cid] = call
+
+        if pending:
+            output = self._submit_and_wait(name, st, pending)
+            for cid, call in pending.items():
+                item = output.get(cid) or {"error": "missing from batch output"}
+                if "content" in item:
+                    USAGE_STATS.add(item.get("usage"))
+                    try:
+                        results[cid] = _accept(item["content"], _cache_key_for(call), False, call["model"])
+                        continue
+                    except ValueError as e:
+                        item = {"error": f"non-JSON content: {e}"}
+                # Rare: fall back to the interactive path (includes the JSON-mode rescue).
+                logger.warning("Batch %s/%s failed (%s); retrying interactively", name, cid, item["error"][:200])
+                try:
+                    with llm_stage("batch_converter", name):
+                        results[cid] = _call_json_strict(**calls[cid])
+                except Exception as e:
+                    logger.error("Interactive retry failed for %s/%s: %s", name, cid, e)
+                    results[cid] = None
+
+        results_path.write_text(json.dumps(results, ensure_ascii=False), encoding="utf-8")
+        st["done"] = True
+        self._save_state()
+        logger.info("Batch stage %s: %s requests (%s from cache)", name, len(calls), len(calls) - len(pending))
+        return results
+
+    def _submit_and_wait(self, name: str, st: Dict[str, Any], pending: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        if not st.get("batch_id"):
+            jsonl = self.work_dir / f"{name}.jsonl"
+            n = write_batch_file(jsonl, ((cid, build_chat_payload(**call)) for cid, call in pending.items()))
+            st["input_file_id"] = self.client.upload(jsonl)
+            st["batch_id"] = self.client.create(st["input_file_id"], metadata={"stage": name})["id"]
+            self._save_state()
+            logger.info("Submitted batch %s for stage %s (%s requests)", st["batch_id"], name, n)
+        else:
+            logger.info("Resuming batch %s for stage %s", st["batch_id"], name)
+
+        batch = self.client.wait(st["batch_id"], poll_s=self.poll_s)
+        output: Dict[str, Dict[str, Any]] = {}
+        for key in ("output_file_id", "error_file_id"):
+            if batch.get(key):
+                output.update(parse_batch_output(self.client.download(batch[key])))
+        if batch.get("status") != "completed":
+            logger.error("Batch %s ended as %s", st["batch_id"], batch.get("status"))
+            st.pop("batch_id", None)  # a re-run submits a fresh job for whatever is left
+            self._save_state()
+        return output
+
+    def _load_state(self) -> Dict[str, Any]:
+        try:
+            return json.loads(self.state_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_state(self) -> None:
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.state, indent=2), encoding="utf-8")
+        tmp.replace(self.state_path)
@@ -1,5 +1,6 @@
 # --- agents/dom_analyzer_agent.py ---
 import json
+from utils.llm_metrics import llm_stage
 from utils.local_llm import call_llm
 from utils.logger import logger
 
@@ -19,12 +20,13 @@ class DOMAnalyzerAgent:
             }
 
         try:
-            result = call_llm(
-                prompt=prompt,
-                model=self.model,
-                temperature=0.2,
-                max_tokens=2048
-            )
+            with llm_stage("dom_analyzer", "analyze"):
+                result = call_llm(
+                    prompt=prompt,
+                    model=self.model,
+                    temperature=0.2,
+                    max_tokens=2048
+                )
 
             logger.debug("Raw DOMAnalyzerAgent LLM response:\n{}", result)
             parsed = json.loads(result)
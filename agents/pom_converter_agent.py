@@ -1,19 +1,42 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import ast
+import asyncio
 import json
 import logging
 import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any
+from typing import Awaitable, Callable, Dict, Any, Iterable, List, Optional, Tuple
 
-from utils.openai_llm import llm_client
+from agents.selenium_preconverter import RULES_VERSION, preconvert, preconvert_stats
+from utils.async_llm import AsyncLLMClient
+from utils.json_extract import extract_json_object
+from utils.json_mapping_validator import validate_code_mapping
+from utils.llm_cache import make_cache_key, response_cache
+from utils.llm_metrics import llm_stage
+from utils.mapping_gate import ALLOWED_PACKAGES, broken_modules, check_mapping, gate_stats, repair_stats
+from utils.convert_manifest import fingerprint_of, sha256_text
+from utils.hedging import HEDGE_BASE_URL, maybe_hedged
+from utils.openai_llm import OpenAIClient, llm_client
+from utils.page_merge import page_merge
+from utils.page_registry import class_signatures, is_page_source, registry_for
+from utils.module_merge import merge_mappings
+from utils.source_chunker import SourceChunk, count_tokens, split_source
+from utils.suite_graph import SuiteGraph
+from utils.streaming import FileMapStreamParser, StreamAborted
 
 logger = logging.getLogger(__name__)
 
 ALLOWED_PREFIXES = ("pages/", "tests/", "tests/conftest", "conftest")
 
+# Opt-in (LLM_HEDGE=1): slow calls get a duplicate, to LLM_HEDGE_BASE_URL when set.
+llm_client = maybe_hedged(llm_client, (lambda: OpenAIClient(base=HEDGE_BASE_URL)) if HEDGE_BASE_URL else None)
+
 # ===== System Prompts =====
 SYS_ANALYZER = (
     "You are a strict code-to-code converter.\n"
@@ -34,53 +57,65 @@ SYS_BUILDER = (
     "Return ONLY the JSON object. No explanations. No Markdown. No backticks."
 )
 
+SYS_REPAIR = (
+    "You fix generated Playwright Python/pytest modules that fail to compile or whose imports do not resolve.\n"
+    "You receive only the broken files, each with its errors, plus the signatures of the modules they may import.\n"
+    "Return ONLY a JSON object mapping the SAME keys to the corrected full modules; change only what the errors require.\n"
+    "No explanations. No Markdown. No backticks."
+)
+
 # ===== JSON extraction helpers =====
-def _parse_json_loose(text: str) -> Dict[str, Any]:
-    if not text:
-        raise ValueError("empty response")
-    s = text.strip()
-    if s.startswith("```"):
-        s = re.sub(r"^```(?:json)?\s*", "", s, flags=re.I)
-        s = re.sub(r"\s*```$", "", s)
-    if s.startswith("{") and s.endswith("}"):
-        return json.loads(s)
-    start = s.find("{")
-    if start == -1:
-        raise ValueError("no JSON object found")
-    best = None
-    depth = 0
-    cand_start = start
-    for i in range(start, len(s)):
-        c = s[i]
-        if c == "{":
-            if depth == 0:
-                cand_start = i
-            depth += 1
-        elif c == "}":
-            depth -= 1
-            if depth == 0:
-                best = s[cand_start:i+1]
-    if not best:
-        raise ValueError("unbalanced JSON braces")
-    return json.loads(best)
+_parse_json_loose = extract_json_object
+
+def _is_allowed_key(key: str) -> bool:
+    return any(key == p or key.startswith(p) for p in ALLOWED_PREFIXES)
 
 def _ensure_valid_keys(mapping: Dict[str, str]) -> None:
-    bad = [k for k in mapping.keys() if not any(k == p or k.startswith(p) for p in ALLOWED_PREFIXES)]
+    bad = [k for k in mapping.keys() if not _is_allowed_key(k)]
     if bad:
         raise ValueError(
             "Disallowed keys found: " + ", ".join(bad)
             + " | Allowed keys MUST start with 'pages/' or 'tests/' (or 'tests/conftest' / 'conftest'). "
         )
 
-def _save_mapping(out_dir: Path, mapping: Dict[str, str]) -> None:
+def _check_unit(mapping: Dict[str, Any]) -> None:
+    """Raises ValueError when a chunk's mapping cannot be merged: bad keys, empty or unparsable code."""
+    _, problems = validate_code_mapping(mapping)
+    for key, code in mapping.items():
+        if key not in problems:
+            try:
+                ast.parse(code)
+            except SyntaxError as e:
+                problems[key] = f"syntax error line {e.lineno}: {e.msg}"
+    if problems:
+        raise ValueError("; ".join(f"{k}: {v}" for k, v in problems.items()))
+
+# Files converted in parallel can emit the same key (typically a shared pages/* module).
+_WRITE_GUARD = threading.Lock()
+_WRITE_LOCKS: Dict[Path, threading.Lock] = {}
+
+def _write_lock(dest: Path) -> threading.Lock:
+    with _WRITE_GUARD:
+        return _WRITE_LOCKS.setdefault(dest, threading.Lock())
+
+def _save_mapping(out_dir: Path, mapping: Dict[str, str], owner: Optional[Path] = None) -> None:
+    """owner given: pages/* keys are merged with other sources' versions (utils.page_merge)."""
     out_dir.mkdir(parents=True, exist_ok=True)
     for key, code in mapping.items():
         key = key.strip().lstrip("/")
         if not key.endswith(".py"):
             key = f"{key}.py"
-        dest = out_dir / key
+        dest = (out_dir / key).resolve()
+        if owner is not None and key.startswith("pages/"):
+            page_merge.write(out_dir, key.removesuffix(".py"), owner, code)
+            logger.info("Saved: %s", dest)
+            continue
         dest.parent.mkdir(parents=True, exist_ok=True)
-        dest.write_text(code, encoding="utf-8")
+        # Atomic replace under a per-file lock: readers never see a half-written module.
+        with _write_lock(dest):
+            tmp = dest.with_name(f".{dest.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(code, encoding="utf-8")
+            os.replace(tmp, dest)
         logger.info("Saved: %s", dest)
 
 # ===== Structured Output schema (strict!) =====
@@ -101,89 +136,731 @@ FILEMAP_SCHEMA: Dict[str, Any] = {
     "strict": True
 }
 
-def _call_json_strict(model: str, system_prompt: str, user_prompt: str, max_tokens: int) -> Dict[str, Any]:
+def _strict_attempts(model: str, system_prompt: str, user_prompt: str, max_tokens: int) -> List[Dict[str, Any]]:
     messages = [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt},
     ]
-
-    # Attempt 1: Structured Outputs (json_schema)
-    raw = llm_client.call_chat(
-        model=model,
-        messages=messages,
-        max_tokens=max_tokens,
-        json_schema=FILEMAP_SCHEMA,
-    )
-    try:
-        return _parse_json_loose(raw)
-    except Exception as e:
-        logger.error("Model returned non-JSON (schema mode): %s", e)
-
-    # Attempt 2: JSON mode with an explicit reminder
+    # Rescue: JSON mode with an explicit reminder
     rescue_messages = messages + [
         {"role": "user", "content": "Return ONLY a pure JSON object as specified. No other text."}
     ]
-    raw2 = llm_client.call_chat(
-        model=model,
-        messages=rescue_messages,
-        max_tokens=max_tokens,
-        json_mode=True,
+    return [
+        # Attempt 1: Structured Outputs (json_schema)
+        dict(model=model, messages=messages, max_tokens=max_tokens, json_schema=FILEMAP_SCHEMA),
+        # Attempt 2: JSON mode
+        dict(model=model, messages=rescue_messages, max_tokens=max_tokens, json_mode=True),
+    ]
+
+def _cache_key_for(call: Dict[str, Any]) -> str:
+    return make_cache_key(
+        model=call["model"],
+        messages=call["messages"],
+        max_tokens=call["max_tokens"],
+        json_mode=call.get("json_mode", False),
+        json_schema=call.get("json_schema"),
     )
-    return _parse_json_loose(raw2)
+
+def _accept(raw: str, key: str, cached: bool, model: str) -> Dict[str, Any]:
+    """Parses raw; stores it in the cache only once it parses."""
+    mapping = _parse_json_loose(raw)
+    if not cached:
+        response_cache.put(key, raw, meta={"model": model})
+    return mapping
+
+def _call_json_strict(
+    model: str, system_prompt: str, user_prompt: str, max_tokens: int, refresh: bool = False
+) -> Dict[str, Any]:
+    """refresh=True skips cache reads (a retry of an answer that was parseable but unusable)."""
+    attempts = _strict_attempts(model, system_prompt, user_prompt, max_tokens)
+    for i, call in enumerate(attempts):
+        key = _cache_key_for(call)
+        raw = None if refresh else response_cache.get(key)
+        cached = raw is not None
+        if cached:
+            logger.debug("LLM cache hit (%s, %s…)", model, key[:12])
+        else:
+            raw = llm_client.call_chat(**call)
+        try:
+            return _accept(raw, key, cached, model)
+        except Exception as e:
+            if i == len(attempts) - 1:
+                raise
+            logger.error("Model returned non-JSON (schema mode): %s", e)
+    raise AssertionError("unreachable")
+
+def _stream_json_strict(
+    model: str,
+    system_prompt: str,
+    user_prompt: str,
+    max_tokens: int,
+    on_entry: Optional[Callable[[str, str], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Streaming _call_json_strict: each file entry goes to on_entry as soon as its value's
+    closing quote arrives, and a disallowed key aborts the stream before its code is generated.
+    If the stream is not a clean JSON object, the full text is parsed loosely and, failing
+    that, the JSON-mode rescue attempt runs without streaming.
+    """
+    attempts = _strict_attempts(model, system_prompt, user_prompt, max_tokens)
+    call = attempts[0]
+    key = _cache_key_for(call)
+    emitted: Dict[str, str] = {}
+    callback_failed = False
+
+    def emit(k: str, v: str) -> None:
+        nonlocal callback_failed
+        emitted[k] = v
+        if on_entry:
+            try:
+                on_entry(k, v)
+            except Exception:
+                callback_failed = True  # not a parse error: no rescue call for it
+                raise
+
+    def emit_rest(mapping: Dict[str, Any]) -> Dict[str, Any]:
+        _ensure_valid_keys(mapping)
+        for k, v in mapping.items():
+            if emitted.get(k) != v:
+                emit(k, v)
+        return mapping
+
+    raw = response_cache.get(key)
+    if raw is not None:
+        logger.debug("LLM cache hit (%s, %s…)", model, key[:12])
+        return emit_rest(_parse_json_loose(raw))
+
+    def on_key(k: str) -> None:
+        if not _is_allowed_key(k):
+            raise StreamAborted(f"Disallowed key {k!r} in stream – aborting")
+
+    parser = FileMapStreamParser(on_entry=emit, on_key=on_key)
+    parts: List[str] = []
+    stream = llm_client.stream_chat(**call)
+    try:
+        for delta in stream:
+            parts.append(delta)
+            parser.feed(delta)
+        mapping = parser.close()
+        response_cache.put(key, "".join(parts), meta={"model": model})
+        return mapping
+    except StreamAborted:
+        raise
+    except ValueError as e:
+        if callback_failed:
+            raise
+        logger.error("Streamed response is not a clean JSON object: %s", e)
+    finally:
+        stream.close()
+
+    try:
+        return emit_rest(_accept("".join(parts), key, False, model))
+    except ValueError:
+        pass
+    rescue = attempts[1]
+    rescue_key = _cache_key_for(rescue)
+    raw2 = response_cache.get(rescue_key)
+    cached2 = raw2 is not None
+    if not cached2:
+        raw2 = llm_client.call_chat(**rescue)
+    return emit_rest(_accept(raw2, rescue_key, cached2, model))
+
+async def _acall_json_strict(
+    aclient: AsyncLLMClient,
+    model: str,
+    system_prompt: str,
+    user_prompt: str,
+    max_tokens: int,
+    refresh: bool = False,
+) -> Dict[str, Any]:
+    """Async twin of _call_json_strict (same attempts, same cache)."""
+    attempts = _strict_attempts(model, system_prompt, user_prompt, max_tokens)
+    for i, call in enumerate(attempts):
+        key = _cache_key_for(call)
+        raw = None if refresh else response_cache.get(key)
+        cached = raw is not None
+        if cached:
+            logger.debug("LLM cache hit (%s, %s…)", model, key[:12])
+        else:
+            raw = await aclient.call_chat(**call)
+        try:
+            return _accept(raw, key, cached, model)
+        except Exception as e:
+            if i == len(attempts) - 1:
+                raise
+            logger.error("Model returned non-JSON (schema mode): %s", e)
+    raise AssertionError("unreachable")
 
 class POMConverterAgent:
     def __init__(self) -> None:
         self.model_analyzer = os.getenv("OPENAI_MODEL_ANALYZER", "gpt-5-mini")
         self.model_builder  = os.getenv("OPENAI_MODEL_BUILDER",  "gpt-5")
         self.max_tokens = int(os.getenv("OPENAI_MAX_COMPLETION_TOKENS", "4096"))
-        logger.info("MODELS: %s %s | max_tokens=%s", self.model_analyzer, self.model_builder, self.max_tokens)
+        self.stream = os.getenv("OPENAI_STREAM", "0") == "1"
+        # Output is roughly as long as the input, so keep each chunk well under the completion budget.
+        self.chunk_tokens = int(os.getenv("CONVERT_CHUNK_TOKENS", str(self.max_tokens // 2)))
+        self.chunk_workers = int(os.getenv("CONVERT_CHUNK_WORKERS", "4"))
+        # Opt-in: test classes with at least this many test methods are converted one method per
+        # call (0 = off). Every part repeats the preamble and setUp, so it costs extra input tokens.
+        self.fanout_min = int(os.getenv("CONVERT_FANOUT_MIN_METHODS", "0"))
+        # Extra attempts for a chunk that failed or came back unusable; only that chunk is redone.
+        self.unit_retries = int(os.getenv("CONVERT_UNIT_RETRIES", "1"))
+        # Skip the builder when the analyzer mapping already passes mapping_gate.check_mapping.
+        self.builder_gate = os.getenv("CONVERT_BUILDER_GATE", "1") != "0"
+        # Rule-based Selenium rewrites (agents/selenium_preconverter.py) before any LLM call.
+        self.preconvert = os.getenv("CONVERT_PRECONVERT", "1") != "0"
+        # Page objects' class signatures are kept in <out>/.page_registry.json and given to dependent tests.
+        self.page_registry = os.getenv("CONVERT_PAGE_REGISTRY", "1") != "0"
+        # pages/* modules emitted by several sources are AST-merged instead of overwritten.
+        self.page_merge = os.getenv("CONVERT_PAGE_MERGE", "1") != "0"
+        # Rounds of focused repair calls for final files that do not compile or import (0 = off).
+        self.repair_rounds = int(os.getenv("CONVERT_REPAIR_ROUNDS", "2"))
+        # Optional store of finished stage outputs (utils.job_queue.JobQueue); a resumed run replays them.
+        self.stage_store: Optional[Any] = None
+        logger.info("MODELS: %s %s | max_tokens=%s chunk_tokens=%s stream=%s",
+                    self.model_analyzer, self.model_builder, self.max_tokens, self.chunk_tokens, self.stream)
+
+    def config_fingerprint(self) -> str:
+        """Hash of everything besides the source that shapes the output (prompts, models, limits)."""
+        return fingerprint_of({
+            "sys_analyzer": SYS_ANALYZER,
+            "sys_builder": SYS_BUILDER,
+            "sys_repair": SYS_REPAIR,
+            "user_prompt": self._make_user_prompt(Path("x.py"), ""),
+            "builder_prompt": self._make_builder_prompt({}),
+            "models": [self.model_analyzer, self.model_builder],
+            "max_tokens": self.max_tokens,
+            "chunk_tokens": self.chunk_tokens,
+            "fanout_min": self.fanout_min,
+            "builder_gate": sorted(ALLOWED_PACKAGES) if self.builder_gate else False,
+            "repair_rounds": self.repair_rounds,
+            "preconvert": RULES_VERSION if self.preconvert else 0,
+        })
 
-    def _make_user_prompt(self, src_path: Path, code: str) -> str:
+    # Prompts keep a byte-identical prefix (system prompt + fixed instructions) and put
+    # everything that varies per call last, so provider-side prompt caching can hit.
+    def _make_user_prompt(
+        self, src_path: Path, code: str, chunk: Optional[SourceChunk] = None, context: str = ""
+    ) -> str:
         name = src_path.name
+        part = ""
+        if chunk is not None and chunk.total > 1:
+            stem = src_path.stem if src_path.stem.startswith("test") else f"test_{src_path.stem}"
+            # After the code: the parts of one file share preamble and setUp, hence a cacheable prefix.
+            part = (
+                f"Part {chunk.index + 1} of {chunk.total}; methods in this part: {', '.join(chunk.units)}; "
+                f"test key: tests/{stem}"
+            )
         return (
             "Convert the following single Python file from Selenium to Playwright.\n"
-            f"Filename: {name}\n\n"
+            "Output strictly as a JSON object mapping file keys to full Python modules (strings). "
+            "Keys must be: pages/* or tests/* (or tests/conftest or conftest), without '.py'.\n"
+            "A large file may be sent in parts that are converted separately and merged by key: "
+            "then convert only the methods of the given part, put its tests under the given test key, "
+            "and use the same page module keys and class names the whole file would get.\n"
+            "Parts of the input may already be Playwright (page / self.page, .locator(...), wait_for, fill): "
+            "keep those as they are and convert what is still Selenium.\n\n"
+            f"{self._context_block(context)}"
+            f"Filename: {name}\n"
             "=== INPUT CODE START ===\n"
             f"{code}\n"
             "=== INPUT CODE END ===\n"
-            "Output strictly as a JSON object mapping file keys to full Python modules (strings). "
-            "Keys must be: pages/* or tests/* (or tests/conftest or conftest), without '.py'."
+            f"{part}"
         )
 
-    def convert(self, src_path: Path, out_dir: Path) -> Dict[str, Any]:
-        src_path = Path(src_path)
-        out_dir = Path(out_dir)
-        logger.debug("POMConverterAgent: Starting conversion for %s -> %s", src_path, out_dir)
-
-        code = src_path.read_text(encoding="utf-8")
-        user_prompt = self._make_user_prompt(src_path, code)
-
-        # Analyzer (already returns mapping)
-        logger.debug("Analyzer call…")
-        mapping = _call_json_strict(
-            model=self.model_analyzer,
-            system_prompt=SYS_ANALYZER,
-            user_prompt=user_prompt,
-            max_tokens=self.max_tokens,
+    @staticmethod
+    def _context_block(context: str) -> str:
+        if not context:
+            return ""
+        return (
+            "Page objects this file imports are already converted. Import them from these keys "
+            "(e.g. pages/login_page -> `from pages.login_page import ...`), use only the methods listed, "
+            "and do NOT emit these pages/* keys again:\n"
+            "=== CONVERTED PAGES START ===\n"
+            f"{context}\n"
+            "=== CONVERTED PAGES END ===\n\n"
         )
 
-        # Builder (refines mapping)
-        logger.debug("Builder call…")
-        builder_user = (
+    def _make_builder_prompt(self, mapping: Dict[str, Any]) -> str:
+        return (
             "You receive an initial JSON mapping of files-to-code. "
             "Refine and finalize it for Playwright Python/pytest. "
             "IMPORTANT: Keep only pages/* or tests/* (or tests/conftest / conftest), no extensions.\n\n"
             "=== CURRENT MAPPING (JSON) ===\n"
-            f"{json.dumps(mapping, ensure_ascii=False)}\n"
+            f"{json.dumps(mapping, ensure_ascii=False, sort_keys=True)}\n"
             "=== END ==="
         )
-        final_mapping = _call_json_strict(
+
+    def _make_repair_prompt(
+        self, mapping: Dict[str, Any], broken: Dict[str, List[str]], out_dir: Optional[Path] = None
+    ) -> str:
+        files = {k: {"errors": broken[k], "code": mapping[k]} for k in sorted(broken)}
+        return (
+            "Fix the broken files below so that each compiles and every pages/*, tests/* or conftest "
+            "import names a module and names that exist (listed under AVAILABLE MODULES, or in the broken "
+            "files themselves). Return a JSON object with exactly the broken keys.\n\n"
+            "=== AVAILABLE MODULES ===\n"
+            f"{self._repair_context(mapping, broken, out_dir)}\n"
+            "=== BROKEN FILES (JSON: key -> errors, code) ===\n"
+            f"{json.dumps(files, ensure_ascii=False, sort_keys=True)}\n"
+            "=== END ==="
+        )
+
+    @staticmethod
+    def _repair_context(
+        mapping: Dict[str, Any], broken: Dict[str, List[str]], out_dir: Optional[Path] = None
+    ) -> str:
+        """Signatures of the sound modules of this mapping and of the out_dir modules the broken ones import."""
+        modules = {k: v for k, v in mapping.items() if k not in broken and isinstance(v, str)}
+        if out_dir is not None:
+            wanted = {m.replace(".", "/") for k in broken
+                      for m in re.findall(r"^\s*(?:from|import)\s+((?:pages|tests)\.[\w.]+|conftest)\b",
+                                          mapping[k], re.M)}
+            for key in sorted(wanted - set(modules) - set(broken)):
+                path = Path(out_dir) / f"{key}.py"
+                if path.is_file():
+                    modules[key] = path.read_text(encoding="utf-8")
+        blocks = []
+        for key, code in sorted(modules.items()):
+            sigs = class_signatures(code)
+            if sigs:
+                blocks.append(f"# {key}\n" + "\n".join("\n    ".join(lines) for lines in sigs.values()))
+        return "\n\n".join(blocks) or "(none)"
+
+    def _split(self, src_path: Path, code: str) -> List[SourceChunk]:
+        chunks = split_source(code, self.chunk_tokens, fanout_min=self.fanout_min)
+        if len(chunks) > 1:
+            logger.info("%s: %s tokens -> %s chunks (%s)", src_path.name, count_tokens(code),
+                        len(chunks), ", ".join(str(c.tokens) for c in chunks))
+        return chunks
+
+    @staticmethod
+    def _merge_chunks(src_path: Path, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        merged, conflicts = merge_mappings(results)
+        for key, names in conflicts.items():
+            logger.warning("%s: chunks disagree on %s in %s; kept the first definition",
+                           src_path.name, ", ".join(names), key)
+        return merged
+
+    def analyzer_args(
+        self, src_path: Path, code: str, chunk: Optional[SourceChunk] = None, context: str = ""
+    ) -> Dict[str, Any]:
+        return dict(
+            model=self.model_analyzer,
+            system_prompt=SYS_ANALYZER,
+            user_prompt=self._make_user_prompt(src_path, code, chunk, context),
+            max_tokens=self.max_tokens,
+        )
+
+    def builder_args(self, mapping: Dict[str, Any]) -> Dict[str, Any]:
+        return dict(
             model=self.model_builder,
             system_prompt=SYS_BUILDER,
-            user_prompt=builder_user,
+            user_prompt=self._make_builder_prompt(mapping),
             max_tokens=self.max_tokens,
         )
 
-        _ensure_valid_keys(final_mapping)
-        _save_mapping(out_dir, final_mapping)
-        return final_mapping
+    def repair_args(
+        self, mapping: Dict[str, Any], broken: Dict[str, List[str]], out_dir: Optional[Path] = None
+    ) -> Dict[str, Any]:
+        return dict(
+            model=self.model_builder,
+            system_prompt=SYS_REPAIR,
+            user_prompt=self._make_repair_prompt(mapping, broken, out_dir),
+            max_tokens=self.max_tokens,
+        )
+
+    @staticmethod
+    def output_key(src_path: Path) -> str:
+        """Key a file converted without the LLM is written under: tests/<stem> or pages/<snake_case stem>."""
+        stem = src_path.stem
+        if stem.startswith("test") or stem.endswith("_test"):
+            return f"tests/{stem}"
+        return "pages/" + re.sub(r"(?<=[a-z0-9])(?=[A-Z])", "_", stem).lower()
+
+    def preconverted(
+        self, src_path: Path, code: str, out_dir: Optional[Path] = None
+    ) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Runs the rule-based rewrite. Returns the code to send to the model and, when
+        nothing Selenium-specific is left and the result passes the mapping gate, the
+        final mapping (no LLM call needed).
+        """
+        if not self.preconvert:
+            return code, None
+        pre = preconvert(code)
+        mapping = {self.output_key(src_path): pre.code}
+        done = pre.complete and not check_mapping(mapping, out_dir)
+        preconvert_stats.add(pre, len(code), done)
+        if done:
+            logger.info("%s: converted by rules only (%s rewrites)", src_path.name, sum(pre.rewrites.values()))
+            return pre.code, mapping
+        if pre.rewrites:
+            logger.debug("%s: %s rule rewrites, %s chars -> %s; left for the model: %s", src_path.name,
+                         sum(pre.rewrites.values()), len(code), len(pre.code),
+                         ", ".join(sorted({w for _, w in pre.leftovers})[:5]))
+        return pre.code, None
+
+    def needs_builder(self, src_path: Path, mapping: Dict[str, Any], out_dir: Optional[Path] = None) -> bool:
+        """False when the analyzer mapping passes the static gate and the builder pass can be skipped."""
+        if not self.builder_gate:
+            return True
+        problems = check_mapping(mapping, out_dir)
+        gate_stats.add(problems)
+        if problems:
+            logger.debug("%s: builder needed: %s", src_path.name, "; ".join(problems[:5]))
+            return True
+        logger.info("%s: analyzer output passed the gate, skipping builder", src_path.name)
+        return False
+
+    def _broken(self, src_path: Path, out_dir: Path, mapping: Dict[str, Any]) -> Dict[str, List[str]]:
+        if self.repair_rounds <= 0:
+            return {}
+        broken = broken_modules(mapping, out_dir)
+        for key, problems in broken.items():
+            logger.info("%s: %s is broken: %s", src_path.name, key, "; ".join(problems[:3]))
+        return broken
+
+    @staticmethod
+    def _apply_repair(
+        src_path: Path, mapping: Dict[str, Any], broken: Dict[str, List[str]], fixed: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Takes the repaired versions of the broken keys only; everything else in the reply is ignored."""
+        extra = sorted(k for k in fixed if k not in broken)
+        if extra:
+            logger.debug("%s: ignoring keys the repair was not asked for: %s", src_path.name, ", ".join(extra))
+        return {**mapping, **{k: v for k, v in fixed.items() if k in broken and isinstance(v, str) and v.strip()}}
+
+    def _repair_done(
+        self, src_path: Path, first: Dict[str, List[str]], broken: Dict[str, List[str]], rounds: int
+    ) -> None:
+        repair_stats.add(first, broken, rounds)
+        if broken:
+            logger.warning("%s: still broken after %s repair round(s), writing as is: %s",
+                           src_path.name, rounds, ", ".join(sorted(broken)))
+        elif first:
+            logger.info("%s: repaired %s in %s round(s)", src_path.name, ", ".join(sorted(first)), rounds)
+
+    def repaired(self, src_path: Path, out_dir: Path, mapping: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Compiles every module of a final mapping and resolves its pages/tests imports;
+        only the broken files go back to the builder model, up to repair_rounds times.
+        """
+        first = broken = self._broken(src_path, out_dir, mapping)
+        rounds = 0
+        while broken and rounds < self.repair_rounds:
+            rounds += 1
+            try:
+                with llm_stage("pom_converter", "repair"):
+                    fixed = _call_json_strict(**self.repair_args(mapping, broken, out_dir), refresh=rounds > 1)
+            except Exception as e:
+                logger.warning("%s: repair round %s failed: %s", src_path.name, rounds, e)
+                continue
+            mapping = self._apply_repair(src_path, mapping, broken, fixed)
+            broken = self._broken(src_path, out_dir, mapping)
+        self._repair_done(src_path, first, broken, rounds)
+        return mapping
+
+    async def arepaired(
+        self, aclient: AsyncLLMClient, src_path: Path, out_dir: Path, mapping: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Async twin of repaired()."""
+        first = broken = self._broken(src_path, out_dir, mapping)
+        rounds = 0
+        while broken and rounds < self.repair_rounds:
+            rounds += 1
+            try:
+                with llm_stage("pom_converter", "repair"):
+                    fixed = await _acall_json_strict(
+                        aclient, **self.repair_args(mapping, broken, out_dir), refresh=rounds > 1
+                    )
+            except Exception as e:
+                logger.warning("%s: repair round %s failed: %s", src_path.name, rounds, e)
+                continue
+            mapping = self._apply_repair(src_path, mapping, broken, fixed)
+            broken = self._broken(src_path, out_dir, mapping)
+        self._repair_done(src_path, first, broken, rounds)
+        return mapping
+
+    def _convert_code(
+        self,
+        src_path: Path,
+        code: str,
+        chunk: Optional[SourceChunk] = None,
+        out_dir: Optional[Path] = None,
+        refresh: bool = False,
+        context: str = "",
+    ) -> Dict[str, Any]:
+        # Analyzer (already returns mapping)
+        logger.debug("Analyzer call…")
+        mapping = self._staged(src_path, "analyzer", chunk, refresh, lambda: _call_json_strict(
+            **self.analyzer_args(src_path, code, chunk, context), refresh=refresh))
+        if not self.needs_builder(src_path, mapping, out_dir):
+            return mapping
+
+        # Builder (refines mapping)
+        logger.debug("Builder call…")
+        return self._staged(src_path, "builder", chunk, refresh, lambda: _call_json_strict(
+            **self.builder_args(mapping), refresh=refresh))
+
+    def _staged(
+        self,
+        src_path: Path,
+        stage: str,
+        chunk: Optional[SourceChunk],
+        refresh: bool,
+        call: Callable[[], Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """Runs one LLM stage, or replays its stored output (stage_store) unless refresh is set."""
+        name = self._stage_name(stage, chunk)
+        saved = self._saved_stage(src_path, name, refresh)
+        if saved is not None:
+            return saved
+        t0 = time.monotonic()
+        with llm_stage("pom_converter", stage):
+            mapping = call()
+        if self.stage_store is not None:
+            self.stage_store.save_stage(src_path, name, mapping, time.monotonic() - t0)
+        return mapping
+
+    async def _astaged(
+        self,
+        src_path: Path,
+        stage: str,
+        chunk: Optional[SourceChunk],
+        refresh: bool,
+        call: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """Async twin of _staged."""
+        name = self._stage_name(stage, chunk)
+        saved = self._saved_stage(src_path, name, refresh)
+        if saved is not None:
+            return saved
+        t0 = time.monotonic()
+        with llm_stage("pom_converter", stage):
+            mapping = await call()
+        if self.stage_store is not None:
+            self.stage_store.save_stage(src_path, name, mapping, time.monotonic() - t0)
+        return mapping
+
+    @staticmethod
+    def _stage_name(stage: str, chunk: Optional[SourceChunk]) -> str:
+        return stage if chunk is None or chunk.total == 1 else f"{stage}:{chunk.index + 1}/{chunk.total}"
+
+    def _saved_stage(self, src_path: Path, name: str, refresh: bool) -> Optional[Dict[str, Any]]:
+        if self.stage_store is None or refresh:
+            return None
+        saved = self.stage_store.stage_output(src_path, name)
+        if saved is not None:
+            logger.info("%s: reusing stored %s output", src_path.name, name)
+        return saved
+
+    def _convert_chunk(
+        self, src_path: Path, chunk: SourceChunk, out_dir: Optional[Path] = None, context: str = ""
+    ) -> Dict[str, Any]:
+        """One part of a split file; a failed or unusable part is retried on its own, past the cache."""
+        for attempt in range(self.unit_retries + 1):
+            try:
+                result = self._convert_code(src_path, chunk.code, chunk, out_dir, attempt > 0, context)
+                _check_unit(result)
+                return result
+            except Exception as e:
+                if attempt == self.unit_retries:
+                    raise
+                logger.warning("%s part %s/%s (%s) failed: %s; retrying that part", src_path.name,
+                               chunk.index + 1, chunk.total, ", ".join(chunk.units), e)
+        raise AssertionError("unreachable")
+
+    def convert(self, src_path: Path, out_dir: Path) -> Dict[str, Any]:
+        src_path = Path(src_path)
+        out_dir = Path(out_dir)
+        logger.debug("POMConverterAgent: Starting conversion for %s -> %s", src_path, out_dir)
+
+        source = src_path.read_text(encoding="utf-8")
+        code, done = self.preconverted(src_path, source, out_dir)
+        if done is not None:
+            return self._store(src_path, out_dir, source, done)
+        context = self.page_context(src_path, out_dir, code)
+        chunks = self._split(src_path, code)
+        if len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=self.chunk_workers, thread_name_prefix="chunk") as ex:
+                results = list(ex.map(lambda c: self._convert_chunk(src_path, c, out_dir, context), chunks))
+            final_mapping = self._merge_chunks(src_path, results)
+        elif self.stream:
+            return self._convert_streaming(src_path, out_dir, code, source, context)
+        else:
+            final_mapping = self._convert_code(src_path, code, out_dir=out_dir, context=context)
+        return self._store(src_path, out_dir, source, final_mapping)
+
+    def file_fingerprint(self, src_path: Path, out_dir: Path, source: str, config: Optional[str] = None) -> str:
+        """
+        config_fingerprint() plus the registered signatures of the page objects
+        `source` imports, so a file goes stale when their API changes.
+        """
+        config = config or self.config_fingerprint()
+        context = registry_for(out_dir).context_for(src_path, source, count=False) if self.page_registry else ""
+        return fingerprint_of({"config": config, "pages": sha256_text(context)}) if context else config
+
+    def page_context(self, src_path: Path, out_dir: Path, code: str) -> str:
+        """Signatures of already converted page objects that `code` imports ('' when none or disabled)."""
+        if not self.page_registry:
+            return ""
+        context = registry_for(out_dir).context_for(src_path, code)
+        if context:
+            logger.debug("%s: using converted page signatures (%s chars)", src_path.name, len(context))
+        return context
+
+    def _store(self, src_path: Path, out_dir: Path, source: str, mapping: Dict[str, Any]) -> Dict[str, Any]:
+        """Repairs, validates and writes a final mapping; page objects are registered, others cannot overwrite them."""
+        mapping = self.repaired(src_path, out_dir, self._protect(src_path, out_dir, source, mapping))
+        return self._commit(src_path, out_dir, source, mapping)
+
+    async def _astore(
+        self, aclient: AsyncLLMClient, src_path: Path, out_dir: Path, source: str, mapping: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Async twin of _store."""
+        mapping = await self.arepaired(aclient, src_path, out_dir, self._protect(src_path, out_dir, source, mapping))
+        return self._commit(src_path, out_dir, source, mapping)
+
+    def _protect(self, src_path: Path, out_dir: Path, source: str, mapping: Dict[str, Any]) -> Dict[str, Any]:
+        """Drops page keys registered page objects own; page objects themselves merge (page_merge) instead."""
+        if not self.page_registry or (self.page_merge and is_page_source(source)):
+            return mapping
+        return registry_for(out_dir).protect(src_path, mapping)
+
+    def _commit(self, src_path: Path, out_dir: Path, source: str, mapping: Dict[str, Any]) -> Dict[str, Any]:
+        if self.page_registry:
+            if is_page_source(source) and any(k.startswith("pages/") for k in mapping):
+                registry_for(out_dir).register(src_path, mapping)
+            else:
+                registry_for(out_dir).forget(src_path)
+        _ensure_valid_keys(mapping)
+        _save_mapping(out_dir, mapping, self._merge_owner(src_path))
+        if self.page_merge:
+            page_merge.retain(out_dir, src_path, mapping.keys())
+        return mapping
+
+    def _merge_owner(self, src_path: Path) -> Optional[Path]:
+        return src_path if self.page_merge else None
+
+    def _convert_streaming(
+        self, src_path: Path, out_dir: Path, code: str, source: str, context: str = ""
+    ) -> Dict[str, Any]:
+        """Both stages stream; builder entries are validated and written as they complete."""
+        t0 = time.monotonic()
+        with llm_stage("pom_converter", "analyzer"):
+            mapping = _stream_json_strict(**self.analyzer_args(src_path, code, context=context))
+        if not self.needs_builder(src_path, mapping, out_dir):
+            return self._store(src_path, out_dir, source, mapping)
+
+        written: List[str] = []
+
+        def write_entry(key: str, code: str) -> None:
+            clean, problems = validate_code_mapping({key: code})
+            if problems:
+                raise StreamAborted(f"Invalid entry from builder: {problems}")
+            clean = self._protect(src_path, out_dir, source, clean)
+            _save_mapping(out_dir, clean, self._merge_owner(src_path))
+            if not written:
+                logger.info("First artifact for %s after %.1fs", src_path.name, time.monotonic() - t0)
+            written.append(key)
+
+        with llm_stage("pom_converter", "builder"):
+            mapping = _stream_json_strict(**self.builder_args(mapping), on_entry=write_entry)
+        # Entries are on disk already; this repairs the broken ones and registers page objects.
+        return self._store(src_path, out_dir, source, mapping)
+
+    async def _aconvert_code(
+        self,
+        aclient: AsyncLLMClient,
+        src_path: Path,
+        code: str,
+        chunk: Optional[SourceChunk] = None,
+        out_dir: Optional[Path] = None,
+        refresh: bool = False,
+        context: str = "",
+    ) -> Dict[str, Any]:
+        mapping = await self._astaged(src_path, "analyzer", chunk, refresh, lambda: _acall_json_strict(
+            aclient, **self.analyzer_args(src_path, code, chunk, context), refresh=refresh))
+        if not self.needs_builder(src_path, mapping, out_dir):
+            return mapping
+        return await self._astaged(src_path, "builder", chunk, refresh, lambda: _acall_json_strict(
+            aclient, **self.builder_args(mapping), refresh=refresh))
+
+    async def _aconvert_chunk(
+        self,
+        aclient: AsyncLLMClient,
+        src_path: Path,
+        chunk: SourceChunk,
+        out_dir: Optional[Path] = None,
+        context: str = "",
+    ) -> Dict[str, Any]:
+        """Async twin of _convert_chunk."""
+        for attempt in range(self.unit_retries + 1):
+            try:
+                result = await self._aconvert_code(
+                    aclient, src_path, chunk.code, chunk, out_dir, attempt > 0, context
+                )
+                _check_unit(result)
+                return result
+            except Exception as e:
+                if attempt == self.unit_retries:
+                    raise
+                logger.warning("%s part %s/%s (%s) failed: %s; retrying that part", src_path.name,
+                               chunk.index + 1, chunk.total, ", ".join(chunk.units), e)
+        raise AssertionError("unreachable")
+
+    async def aconvert(self, src_path: Path, out_dir: Path, aclient: AsyncLLMClient) -> Dict[str, Any]:
+        """Async twin of convert(); LLM calls go through aclient's concurrency limits."""
+        src_path = Path(src_path)
+        out_dir = Path(out_dir)
+        logger.debug("POMConverterAgent: Starting async conversion for %s -> %s", src_path, out_dir)
+
+        source = src_path.read_text(encoding="utf-8")
+        code, done = self.preconverted(src_path, source, out_dir)
+        if done is not None:
+            return await self._astore(aclient, src_path, out_dir, source, done)
+        context = self.page_context(src_path, out_dir, code)
+        chunks = self._split(src_path, code)
+        if len(chunks) > 1:
+            results = await asyncio.gather(
+                *(self._aconvert_chunk(aclient, src_path, c, out_dir, context) for c in chunks)
+            )
+            final_mapping = self._merge_chunks(src_path, list(results))
+        else:
+            final_mapping = await self._aconvert_code(aclient, src_path, code, out_dir=out_dir, context=context)
+        return await self._astore(aclient, src_path, out_dir, source, final_mapping)
+
+    async def aconvert_many(
+        self, src_paths: Iterable[Path], out_dir: Path, aclient: Optional[AsyncLLMClient] = None
+    ) -> List[Any]:
+        """
+        Fans out conversions over one event loop. Returns one entry per input, in order:
+        the final mapping, or the exception that file raised.
+        """
+        own = aclient is None
+        aclient = aclient or AsyncLLMClient(llm_client)
+        src_paths = [Path(p) for p in src_paths]
+        # Each file waits for the suite modules it imports, so it gets their converted signatures.
+        root = Path(os.path.commonpath([p.resolve().parent for p in src_paths])) if src_paths else Path(".")
+        graph = SuiteGraph.build([p.resolve() for p in src_paths], root)
+        finished = {p: asyncio.Event() for p in graph.files}
+        results: List[Any] = [None] * len(src_paths)
+
+        async def one(i: int) -> None:
+            path = src_paths[i].resolve()
+            for dep in graph.deps[path]:
+                await finished[dep].wait()
+            try:
+                results[i] = await self.aconvert(src_paths[i], out_dir, aclient)
+            except Exception as e:
+                results[i] = e
+            finally:
+                finished[path].set()
+
+        try:
+            await asyncio.gather(*(one(i) for i in range(len(src_paths))))
+            return results
+        finally:
+            if own:
+                aclient.close()
@@ -7,6 +7,46 @@ Pilot-only parser: סורק קובץ Page-Object וקובץ טסט של Selenium
 """
 
 import ast, pathlib, json
+from typing import Optional, Tuple
+
+# By.<NAME> and the string values the By constants stand for.
+BY_STRATEGIES = {
+    "ID": "id", "NAME": "name", "XPATH": "xpath", "CSS_SELECTOR": "css selector",
+    "CLASS_NAME": "class name", "TAG_NAME": "tag name",
+    "LINK_TEXT": "link text", "PARTIAL_LINK_TEXT": "partial link text",
+}
+_BY_VALUES = {v: k for k, v in BY_STRATEGIES.items()}
+
+
+def _strategy(node: ast.expr) -> Optional[str]:
+    """By.XPATH / "xpath" -> "XPATH"."""
+    if isinstance(node, ast.Attribute) and node.attr in BY_STRATEGIES:
+        return node.attr
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return _BY_VALUES.get(node.value)
+    return None
+
+
+def find_locator(node: ast.expr) -> Optional[Tuple[str, ast.expr]]:
+    """
+    (strategy, value expression) of a Selenium locator, or None. Understands
+        find_element(By.X, v) / find_elements(By.X, v) / find_element_by_x(v)
+        (By.X, v)   – the tuple passed to expected_conditions
+    """
+    if isinstance(node, ast.Tuple) and len(node.elts) == 2:
+        by = _strategy(node.elts[0])
+        return (by, node.elts[1]) if by else None
+    if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)):
+        return None
+    attr = node.func.attr
+    if attr in ("find_element", "find_elements") and len(node.args) == 2:
+        by = _strategy(node.args[0])
+        return (by, node.args[1]) if by else None
+    for prefix in ("find_elements_by_", "find_element_by_"):
+        if attr.startswith(prefix) and len(node.args) == 1:
+            by = attr[len(prefix):].upper()
+            return (by, node.args[0]) if by in BY_STRATEGIES else None
+    return None
 
 class SeleniumParserAgent:
     def __init__(self, page_path: pathlib.Path, test_path: pathlib.Path):
@@ -26,16 +66,14 @@ class SeleniumParserAgent:
         locators = {}
         for node in ast.walk(tree):
             # match: self.foo = driver.find_element(..., "selector")
-            if isinstance(node, ast.Call) and hasattr(node.func, "attr"):
-                if node.func.attr.startswith("find_element"):
-                    try:
-                        target = node.parent.targets[0]        # left-hand variable
-                        if isinstance(target, ast.Attribute):
-                            name = target.attr
-                            selector = ast.literal_eval(node.args[-1])
-                            locators[name] = selector
-                    except Exception:
-                        continue
+            if isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Attribute):
+                found = find_locator(node.value)
+                if found is None:
+                    continue
+                try:
+                    locators[node.targets[0].attr] = ast.literal_eval(found[1])
+                except ValueError:
+                    continue
         return {"locators": locators}
 
     def _parse_test(self, src: str) -> dict:
@@ -0,0 +1,611 @@
+#!/usr/bin/env python3
+"""
+Rule-based Selenium -> Playwright rewrite that runs before the LLM.
+
+The mechanical part of a Selenium file (locators, explicit waits, send_keys,
+sleeps, driver navigation) is rewritten with an ast.NodeTransformer; whatever
+it does not recognise is left untouched for the model, which then gets a
+shorter, mostly converted file. Only the statements that changed are written
+back into the original text, so comments and layout elsewhere survive.
+Locators are read with selenium_parser_agent.find_locator.
+"""
+from __future__ import annotations
+
+import ast
+import copy
+import io
+import re
+import threading
+import tokenize
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from agents.selenium_parser_agent import find_locator
+from utils.mapping_gate import selenium_usages
+
+# Bump when the rules change: it is part of the converter's config fingerprint.
+RULES_VERSION = 2
+
+# (prefix, suffix) around the Selenium value to get a Playwright selector.
+SELECTOR_TEMPLATES = {
+    "ID": ('[id="', '"]'),
+    "NAME": ('[name="', '"]'),
+    "XPATH": ("xpath=", ""),
+    "CSS_SELECTOR": ("", ""),
+    "CLASS_NAME": (".", ""),
+    "TAG_NAME": ("", ""),
+    "LINK_TEXT": ('a:text-is("', '")'),
+    "PARTIAL_LINK_TEXT": ('a:has-text("', '")'),
+}
+_CSS_IDENT = re.compile(r"-?[A-Za-z_][\w-]*")
+
+KEYS = {
+    "ENTER": "Enter", "RETURN": "Enter", "TAB": "Tab", "ESCAPE": "Escape", "SPACE": "Space",
+    "BACKSPACE": "Backspace", "BACK_SPACE": "Backspace", "DELETE": "Delete", "HOME": "Home", "END": "End",
+    "ARROW_UP": "ArrowUp", "ARROW_DOWN": "ArrowDown", "ARROW_LEFT": "ArrowLeft", "ARROW_RIGHT": "ArrowRight",
+    "UP": "ArrowUp", "DOWN": "ArrowDown", "LEFT": "ArrowLeft", "RIGHT": "ArrowRight",
+    "PAGE_UP": "PageUp", "PAGE_DOWN": "PageDown",
+}
+
+# expected_conditions on a locator -> Locator.wait_for state
+ELEMENT_STATES = {
+    "element_to_be_clickable": "visible",
+    "visibility_of_element_located": "visible",
+    "presence_of_element_located": "attached",
+    "invisibility_of_element_located": "hidden",
+}
+ELEMENT_METHODS = {"is_displayed": "is_visible", "is_selected": "is_checked"}
+PAGE_METHODS = {"get": "goto", "refresh": "reload", "back": "go_back", "forward": "go_forward"}
+
+# Statement lists of compound nodes.
+_BLOCKS = ("body", "orelse", "finalbody", "handlers")
+
+
+def _selector(by: str, value: ast.expr) -> ast.expr:
+    prefix, suffix = SELECTOR_TEMPLATES[by]
+    if isinstance(value, ast.Constant) and isinstance(value.value, str):
+        text = value.value
+        if by == "ID" and _CSS_IDENT.fullmatch(text):
+            return ast.Constant(f"#{text}")
+        if by in ("ID", "NAME", "LINK_TEXT", "PARTIAL_LINK_TEXT"):
+            text = text.replace("\\", "\\\\").replace('"', '\\"')
+        return ast.Constant(f"{prefix}{text}{suffix}")
+    if not prefix and not suffix:
+        return value
+    parts = list(value.values) if isinstance(value, ast.JoinedStr) else [ast.FormattedValue(value, -1, None)]
+    return ast.JoinedStr([ast.Constant(prefix), *parts, *([ast.Constant(suffix)] if suffix else [])])
+
+
+def _call(receiver: ast.expr, method: str, *args: ast.expr, **kwargs: ast.expr) -> ast.Call:
+    return ast.Call(
+        func=ast.Attribute(value=receiver, attr=method, ctx=ast.Load()),
+        args=list(args),
+        keywords=[ast.keyword(arg=k, value=v) for k, v in kwargs.items()],
+    )
+
+
+def _is_sleep(node: ast.expr) -> bool:
+    if not isinstance(node, ast.Call):
+        return False
+    f = node.func
+    return (isinstance(f, ast.Name) and f.id == "sleep") or (
+        isinstance(f, ast.Attribute) and f.attr == "sleep" and isinstance(f.value, ast.Name) and f.value.id == "time"
+    )
+
+
+def _method_call(stmt: ast.stmt, method: str, nargs: int) -> Optional[ast.Call]:
+    """The call of an `<expr>.method(<nargs positional args>)` statement."""
+    call = stmt.value if isinstance(stmt, ast.Expr) else None
+    if (isinstance(call, ast.Call) and isinstance(call.func, ast.Attribute) and call.func.attr == method
+            and len(call.args) == nargs and not call.keywords):
+        return call
+    return None
+
+
+def _key_name(node: ast.expr) -> Optional[str]:
+    """Keys.ENTER -> "ENTER" for the keys press() knows."""
+    if (isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name)
+            and node.value.id == "Keys" and node.attr in KEYS):
+        return node.attr
+    return None
+
+
+def _is_page(node: ast.expr) -> bool:
+    """page / self.page (after the driver rename)."""
+    return (isinstance(node, ast.Name) and node.id == "page") or (
+        isinstance(node, ast.Attribute) and node.attr == "page"
+        and isinstance(node.value, ast.Name) and node.value.id == "self"
+    )
+
+
+def _wait_until(node: ast.expr) -> Optional[Tuple[ast.expr, Optional[ast.expr], str, List[ast.expr]]]:
+    """WebDriverWait(driver, t).until(EC.cond(*args)) -> (driver, t, cond, args)."""
+    if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "until"):
+        return None
+    wait = node.func.value
+    if not (isinstance(wait, ast.Call) and isinstance(wait.func, ast.Name) and wait.func.id == "WebDriverWait"
+            and wait.args and len(node.args) == 1 and isinstance(node.args[0], ast.Call)):
+        return None
+    cond = node.args[0].func
+    if isinstance(cond, ast.Attribute) and isinstance(cond.value, ast.Name):
+        name = cond.attr
+    elif isinstance(cond, ast.Name):
+        name = cond.id
+    else:
+        return None
+    timeout = wait.args[1] if len(wait.args) > 1 else next((k.value for k in wait.keywords if k.arg == "timeout"), None)
+    return wait.args[0], timeout, name, list(node.args[0].args)
+
+
+def _timeout_ms(timeout: Optional[ast.expr]) -> Dict[str, ast.expr]:
+    if timeout is None:
+        return {}
+    if isinstance(timeout, ast.Constant) and isinstance(timeout.value, (int, float)):
+        return {"timeout": ast.Constant(int(timeout.value * 1000))}
+    return {"timeout": ast.BinOp(left=timeout, op=ast.Mult(), right=ast.Constant(1000))}
+
+
+class SeleniumToPlaywright(ast.NodeTransformer):
+    """
+    Rewrites, in place:
+      driver / self.driver                        -> page / self.page
+      find_element(By.X, v), find_element_by_x(v) -> .locator(selector)   (find_elements -> .locator(...).all())
+      WebDriverWait(d, t).until(EC.<cond>(loc))   -> d.locator(sel) as a value, .wait_for(state=...) as a statement
+      EC.url_to_be / url_contains                 -> page.wait_for_url(...)
+      EC.text_to_be_present_in_element            -> expect(...).to_contain_text(...)
+      .clear(); .send_keys(v) on one element      -> .fill(v)   (a lone send_keys appends: left for the model)
+      .send_keys(Keys.X) -> .press("X"), .text of a locator -> .inner_text()
+      driver.get / refresh / back / forward, .current_url, .title
+      sleep(n) / time.sleep(n) statements         -> removed
+    rewrites counts each rule that fired.
+    """
+
+    def __init__(self) -> None:
+        self.rewrites: Counter = Counter()
+        self.uses_expect = False
+        self._scopes: List[Set[str]] = [set()]
+        self._clears: Set[int] = set()
+        self._fills: Set[int] = set()
+
+    def visit_Module(self, node: ast.Module) -> ast.AST:
+        self._pair_clears(node)
+        return self.generic_visit(node)
+
+    def _pair_clears(self, tree: ast.AST) -> None:
+        """fill() replaces the value, send_keys() appends: only a send_keys right after a clear() is a fill."""
+        for node in ast.walk(tree):
+            for name in _BLOCKS:
+                block = getattr(node, name, None)
+                if not isinstance(block, list):
+                    continue
+                for first, second in zip(block, block[1:]):
+                    clear, keys = _method_call(first, "clear", 0), _method_call(second, "send_keys", 1)
+                    if (clear is not None and keys is not None and _key_name(keys.args[0]) is None
+                            and ast.dump(clear.func.value) == ast.dump(keys.func.value)):
+                        self._clears.add(id(first))
+                        self._fills.add(id(keys))
+
+    # scopes ---------------------------------------------------------------
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> ast.AST:
+        self._scopes.append(set())
+        try:
+            return self.generic_visit(node)
+        finally:
+            self._scopes.pop()
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_arg(self, node: ast.arg) -> ast.AST:
+        if node.arg == "driver":
+            node.arg = "page"
+            self.rewrites["driver->page"] += 1
+        return node
+
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        if node.id == "driver":
+            node.id = "page"
+            self.rewrites["driver->page"] += 1
+        return node
+
+    def visit_Assign(self, node: ast.Assign) -> ast.AST:
+        self.generic_visit(node)
+        if (len(node.targets) == 1 and isinstance(node.targets[0], ast.Name)
+                and isinstance(node.value, ast.Call) and isinstance(node.value.func, ast.Attribute)
+                and node.value.func.attr == "locator"):
+            self._scopes[-1].add(node.targets[0].id)
+        return node
+
+    # statements -----------------------------------------------------------
+    def visit_Expr(self, node: ast.Expr) -> Optional[ast.AST]:
+        if _is_sleep(node.value):
+            self.rewrites["sleep removed"] += 1
+            return None
+        if id(node) in self._clears:
+            return None  # folded into the fill() of the next statement
+        waited = _wait_until(node.value)
+        if waited is not None:
+            stmt = self._wait_statement(*waited)
+            if stmt is not None:
+                return ast.copy_location(ast.Expr(stmt), node)
+        return self.generic_visit(node)
+
+    def _wait_statement(
+        self, driver: ast.expr, timeout: Optional[ast.expr], cond: str, args: List[ast.expr]
+    ) -> Optional[ast.expr]:
+        on_element = cond in ELEMENT_STATES and len(args) == 1
+        on_url = cond in ("url_to_be", "url_contains") and len(args) == 1
+        on_text = cond == "text_to_be_present_in_element" and len(args) == 2
+        if not (on_url or ((on_element or on_text) and find_locator(args[0]) is not None)):
+            return None
+        driver = self.visit(driver)
+        args = [self.visit(a) for a in args]
+        ms = _timeout_ms(timeout)
+        if on_element:
+            self.rewrites["wait_for"] += 1
+            return _call(self._locator(driver, args[0]), "wait_for", state=ast.Constant(ELEMENT_STATES[cond]), **ms)
+        if on_text:
+            self.rewrites["expect text"] += 1
+            self.uses_expect = True
+            expected = ast.Call(func=ast.Name("expect", ast.Load()), args=[self._locator(driver, args[0])], keywords=[])
+            return _call(expected, "to_contain_text", args[1], **ms)
+        self.rewrites["wait_for_url"] += 1
+        if cond == "url_to_be":
+            return _call(driver, "wait_for_url", args[0], **ms)
+        predicate = ast.Lambda(
+            args=ast.arguments(posonlyargs=[], args=[ast.arg("url")], kwonlyargs=[], kw_defaults=[], defaults=[]),
+            body=ast.Compare(left=args[0], ops=[ast.In()], comparators=[ast.Name("url", ast.Load())]),
+        )
+        return _call(driver, "wait_for_url", predicate, **ms)
+
+    # expressions ----------------------------------------------------------
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        self.generic_visit(node)
+        waited = _wait_until(node)
+        if waited is not None:
+            driver, _, cond, args = waited
+            if (cond in ELEMENT_STATES and cond != "invisibility_of_element_located" and len(args) == 1
+                    and find_locator(args[0]) is not None):
+                self.rewrites["wait -> locator"] += 1
+                return self._locator(driver, args[0])
+            return node
+        if not isinstance(node.func, ast.Attribute):
+            return node
+        receiver, attr = node.func.value, node.func.attr
+
+        found = find_locator(node)
+        if found is not None:
+            self.rewrites["find_element"] += 1
+            loc = _call(receiver, "locator", _selector(*found))
+            return _call(loc, "all") if attr.startswith("find_elements") else loc
+        if attr == "send_keys" and len(node.args) == 1 and not node.keywords:
+            key = _key_name(node.args[0])
+            if key is not None:
+                self.rewrites["send_keys -> press"] += 1
+                return _call(receiver, "press", ast.Constant(KEYS[key]))
+            if id(node) in self._fills:
+                self.rewrites["clear + send_keys -> fill"] += 1
+                return _call(receiver, "fill", node.args[0])
+        if attr in ELEMENT_METHODS and not node.args:
+            self.rewrites[f"{attr} -> {ELEMENT_METHODS[attr]}"] += 1
+            node.func.attr = ELEMENT_METHODS[attr]
+        elif attr in PAGE_METHODS and _is_page(receiver):
+            self.rewrites[f"{attr} -> {PAGE_METHODS[attr]}"] += 1
+            node.func.attr = PAGE_METHODS[attr]
+        return node
+
+    def visit_Attribute(self, node: ast.Attribute) -> ast.AST:
+        self.generic_visit(node)
+        if node.attr == "driver" and isinstance(node.value, ast.Name) and node.value.id == "self":
+            node.attr = "page"
+            self.rewrites["driver->page"] += 1
+        elif node.attr == "current_url" and _is_page(node.value):
+            node.attr = "url"
+            self.rewrites["current_url -> url"] += 1
+        elif node.attr == "title" and _is_page(node.value) and isinstance(node.ctx, ast.Load):
+            self.rewrites["title -> title()"] += 1
+            return _call(node.value, "title")
+        elif (node.attr == "text" and isinstance(node.value, ast.Name)
+              and any(node.value.id in scope for scope in self._scopes)):
+            self.rewrites["text -> inner_text()"] += 1
+            return _call(node.value, "inner_text")
+        return node
+
+    @staticmethod
+    def _locator(driver: ast.expr, loc: ast.expr) -> ast.expr:
+        return _call(driver, "locator", _selector(*find_locator(loc)))
+
+
+@dataclass
+class PreConversion:
+    code: str
+    rewrites: Dict[str, int] = field(default_factory=dict)
+    leftovers: List[Tuple[int, str]] = field(default_factory=list)
+
+    @property
+    def complete(self) -> bool:
+        """Nothing Selenium-specific is left and no comment was lost: the result can be used without the LLM."""
+        return not self.leftovers
+
+
+def preconvert(code: str) -> PreConversion:
+    """
+    Applies SeleniumToPlaywright to a module. Returns the code unchanged when no
+    rule fired; otherwise the original text with the changed statements replaced
+    and unused Selenium / sleep imports dropped. When the rewrite cannot be
+    placed without losing comments, the code is returned unchanged and left to
+    the model. leftovers lists what still needs the model.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return PreConversion(code, leftovers=[(e.lineno or 0, f"syntax error: {e.msg}")])
+    original = ast.parse(code)
+    tx = SeleniumToPlaywright()
+    tree = tx.visit(tree)
+    if tx.rewrites:
+        _fill_empty_bodies(tree)
+        _drop_unused_imports(tree, tx.uses_expect)
+        spliced = _splice(code, original, tree)
+        ast.fix_missing_locations(tree)
+        rewritten = spliced if spliced is not None else ast.unparse(tree) + "\n"
+        lost = sum((_comments(code) - _comments(rewritten)).values())
+        if lost:
+            leftovers = selenium_usages(original) + _unittest_classes(original)
+            return PreConversion(code, leftovers=sorted(leftovers + [(0, f"{lost} comment(s) lost by the rewrite")]))
+        code = rewritten
+    leftovers = selenium_usages(tree) + _unittest_classes(tree)
+    return PreConversion(code, dict(tx.rewrites), sorted(leftovers))
+
+
+# splicing ---------------------------------------------------------------------
+# An edit is (first line, last line, replacement lines), 1-based and inclusive;
+# an insertion before line n is (n, n - 1, lines).
+Edit = Tuple[int, int, List[str]]
+
+
+def _splice(code: str, before: ast.Module, after: ast.Module) -> Optional[str]:
+    """
+    Writes the rewritten tree `after` back into `code` (parsed as `before`),
+    replacing only statements that changed. Statements the rules kept still
+    carry their original positions; new ones (pass, the expect import) have
+    none. None when the edits cannot be placed cleanly (several statements on
+    one line, one-line compound statements) or the result does not parse back
+    to `after`.
+    """
+    lines = code.splitlines()
+    try:
+        comments = {
+            tok.start[0]: tok.string
+            for tok in tokenize.generate_tokens(io.StringIO(code).readline)
+            if tok.type == tokenize.COMMENT and tok.line[:tok.start[1]].strip()
+        }
+    except (tokenize.TokenError, SyntaxError):
+        return None
+    edits = _splice_block(lines, comments, before.body, after.body)
+    if edits is None:
+        return None
+    out: List[str] = []
+    cursor = 1
+    for start, end, new in sorted(edits, key=lambda e: (e[0], e[1])):
+        if start < cursor:
+            return None
+        out.extend(lines[cursor - 1:start - 1])
+        out.extend(new)
+        cursor = end + 1
+    out.extend(lines[cursor - 1:])
+    spliced = "\n".join(out).lstrip("\n") + "\n"  # dropped imports leave the blank lines after them
+    try:
+        same = ast.dump(ast.parse(spliced)) == ast.dump(after)
+    except SyntaxError:
+        same = False
+    return spliced if same else None
+
+
+def _splice_block(
+    lines: List[str], comments: Dict[int, str], old: List[ast.AST], new: List[ast.AST]
+) -> Optional[List[Edit]]:
+    kept = {(n.lineno, n.col_offset): n for n in new if hasattr(n, "lineno")}
+    if not kept.keys() <= {(o.lineno, o.col_offset) for o in old}:
+        return None
+    if not kept and old:
+        return _replace_block(lines, old, new)  # e.g. a body of sleeps that became `pass`
+    edits: List[Edit] = []
+    for o in old:
+        n = kept.get((o.lineno, o.col_offset))
+        if n is None or type(n) is not type(o):
+            found = _delete(lines, o)
+        elif ast.dump(o) == ast.dump(n):
+            continue
+        else:
+            found = _splice_compound(lines, comments, o, n) or _replace(lines, o, n)
+        if found is None:
+            return None
+        edits.extend(found)
+    for i, n in enumerate(new):
+        if hasattr(n, "lineno"):
+            continue
+        text = ast.unparse(n).splitlines()
+        following = next((m for m in new[i + 1:] if hasattr(m, "lineno")), None)
+        preceding = next((m for m in reversed(new[:i]) if hasattr(m, "lineno")), None)
+        anchor = preceding or following
+        if anchor is None:
+            return None
+        first, last = _span(anchor)
+        indent = lines[first - 1][:anchor.col_offset]
+        at = last + 1 if preceding is not None else first
+        edits.append((at, at - 1, [indent + t if t else t for t in text]))
+    return edits
+
+
+def _span(node: ast.AST) -> Tuple[int, int]:
+    decorators = getattr(node, "decorator_list", None) or []
+    return min([node.lineno] + [d.lineno for d in decorators]), node.end_lineno
+
+
+def _own_lines(lines: List[str], node: ast.AST) -> Optional[Tuple[str, str]]:
+    """(indent, trailing comment) when the node has its lines to itself."""
+    first, last = _span(node)
+    indent = lines[first - 1][:node.col_offset]
+    tail = lines[last - 1].encode()[node.end_col_offset:].decode().strip()
+    if indent.strip() or (tail and not tail.startswith("#")):
+        return None
+    return indent, tail
+
+
+def _delete(lines: List[str], node: ast.AST) -> Optional[List[Edit]]:
+    own = _own_lines(lines, node)
+    if own is None:
+        return None
+    indent, tail = own
+    first, last = _span(node)
+    return [(first, last, [indent + tail] if tail else [])]
+
+
+def _replace(lines: List[str], node: ast.AST, new: ast.AST) -> Optional[List[Edit]]:
+    own = _own_lines(lines, node)
+    if own is None:
+        return None
+    indent, tail = own
+    text = _elif(lines, node, [indent + t if t else t for t in ast.unparse(new).splitlines()])
+    if tail:
+        text[-1] += "  " + tail
+    first, last = _span(node)
+    return [(first, last, text)]
+
+
+def _replace_block(lines: List[str], old: List[ast.AST], new: List[ast.AST]) -> Optional[List[Edit]]:
+    head, tail = _own_lines(lines, old[0]), _own_lines(lines, old[-1])
+    if head is None or tail is None or not new:
+        return None  # an else / finally that lost all its statements: its keyword line goes too
+    text = [head[0] + t if t else t for n in new for t in ast.unparse(n).splitlines()]
+    if tail[1]:
+        text[-1] += "  " + tail[1]
+    return [(_span(old[0])[0], _span(old[-1])[1], text)]
+
+
+def _elif(lines: List[str], node: ast.AST, text: List[str]) -> List[str]:
+    """An `elif` branch is an If node of its own; unparsed alone it reads `if`."""
+    if isinstance(node, ast.If) and lines[node.lineno - 1].lstrip().startswith("elif"):
+        indent = text[0][:len(text[0]) - len(text[0].lstrip())]
+        text[0] = indent + "el" + text[0].lstrip()
+    return text
+
+
+def _header(node: ast.AST) -> ast.AST:
+    head = copy.copy(node)
+    for name in _BLOCKS:
+        if isinstance(getattr(head, name, None), list):
+            setattr(head, name, [])
+    return head
+
+
+def _splice_compound(
+    lines: List[str], comments: Dict[int, str], old: ast.AST, new: ast.AST
+) -> Optional[List[Edit]]:
+    """A def / class / if / with ...: rewrite the header if it changed, then recurse into the bodies."""
+    names = [name for name in _BLOCKS if isinstance(getattr(old, name, None), list)]
+    if not names or not old.body:
+        return None
+    edits: List[Edit] = []
+    old_head, new_head = _header(old), _header(new)
+    if ast.dump(old_head) != ast.dump(new_head):
+        first = _span(old)[0]
+        end = _span(old.body[0])[0] - 1
+        while end > old.lineno and (not lines[end - 1].strip() or lines[end - 1].lstrip().startswith("#")):
+            end -= 1
+        indent = lines[first - 1][:old.col_offset]
+        if end < old.lineno or indent.strip():
+            return None
+        new_head.body = [ast.Pass()]
+        text = _elif(lines, old, [indent + t for t in ast.unparse(new_head).splitlines()[:-1]])
+        if end in comments:
+            text[-1] += "  " + comments[end]
+        edits.append((first, end, text))
+    for name in names:
+        inner = _splice_block(lines, comments, getattr(old, name), getattr(new, name))
+        if inner is None:
+            return None
+        edits.extend(inner)
+    return edits
+
+
+def _comments(code: str) -> Counter:
+    try:
+        return Counter(
+            tok.string for tok in tokenize.generate_tokens(io.StringIO(code).readline) if tok.type == tokenize.COMMENT
+        )
+    except (tokenize.TokenError, SyntaxError):
+        return Counter()
+
+
+def _fill_empty_bodies(tree: ast.AST) -> None:
+    """Bodies that only held sleeps are left empty by the rewrite."""
+    for node in ast.walk(tree):
+        body = getattr(node, "body", None)
+        if isinstance(body, list) and not body and not isinstance(node, ast.Module):
+            body.append(ast.Pass())
+
+
+def _drop_unused_imports(tree: ast.Module, uses_expect: bool) -> None:
+    used = {n.id for n in ast.walk(tree) if isinstance(n, ast.Name)}
+    body: List[ast.stmt] = []
+    for stmt in tree.body:
+        if isinstance(stmt, ast.ImportFrom) and (stmt.module or "").split(".")[0] in ("selenium", "time"):
+            stmt.names = [a for a in stmt.names if (a.asname or a.name) in used]
+            if not stmt.names:
+                continue
+        elif isinstance(stmt, ast.Import):
+            stmt.names = [a for a in stmt.names
+                          if a.name.split(".")[0] not in ("selenium", "time") or (a.asname or a.name.split(".")[0]) in used]
+            if not stmt.names:
+                continue
+        body.append(stmt)
+    if uses_expect:
+        at = 1 if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) else 0
+        while at < len(body) and isinstance(body[at], ast.ImportFrom) and body[at].module == "__future__":
+            at += 1
+        body.insert(at, ast.ImportFrom(module="playwright.sync_api", names=[ast.alias("expect")], level=0))
+    tree.body = body
+
+
+def _unittest_classes(tree: ast.AST) -> List[Tuple[int, str]]:
+    return [
+        (n.lineno, f"unittest class {n.name}")
+        for n in ast.walk(tree)
+        if isinstance(n, ast.ClassDef) and any(ast.unparse(b).endswith("TestCase") for b in n.bases)
+    ]
+
+
+class PreconvertStats:
+    """Totals over a run: rules fired, files done without the LLM, and how much input the model was spared."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.files = 0
+        self.complete = 0
+        self.chars_in = 0
+        self.chars_out = 0
+        self.rewrites: Counter = Counter()
+
+    def add(self, result: PreConversion, chars_in: int, complete: bool) -> None:
+        with self._lock:
+            self.files += 1
+            self.complete += 1 if complete else 0
+            self.chars_in += chars_in
+            self.chars_out += len(result.code)
+            self.rewrites.update(result.rewrites)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "files": self.files,
+                "without_llm": self.complete,
+                "rewrites": sum(self.rewrites.values()),
+                "top_rewrites": self.rewrites.most_common(5),
+                "chars_in": self.chars_in,
+                "chars_out": self.chars_out,
+            }
+
+
+preconvert_stats = PreconvertStats()
@@ -11,6 +11,7 @@ docker compose run --rm \
   -e OPENAI_MODEL_ANALYZER="gpt-5-mini" \
   -e OPENAI_MODEL_ENFORCER="gpt-5-mini" \
   -e OPENAI_MODEL_BUILDER="gpt-5" \
+  -e CONVERT_FORCE \
   playwright-agent /bin/bash -s <<'IN'
 set -euo pipefail
 
@@ -23,11 +24,11 @@ print("ALLOWED_PREFIXES:", ALLOWED_PREFIXES)
 print("HAS_ALLOWED_KEYS_TEXT:", "Allowed keys MUST start with 'pages/'" in SYS_ANALYZER)
 PY
 
-# ניקוי פלט קודם
-rm -rf tests/generated/login/*
+# אין ניקוי פלט: המניפסט (.convert_manifest.json) מדלג על קבצים שלא השתנו ומוחק פלט של מקורות שנמחקו
+# (CONVERT_FORCE=1 להמרה מלאה מחדש)
 
 # המרה בפועל
-python tools/convert_selenium_once.py --in selenium_tests/login --out tests/generated/login
+python tools/convert_selenium_once.py --in selenium_tests/login --out tests/generated/login ${CONVERT_FORCE:+--force}
 
 # הצגת קבצים
 echo "--- FILES ---"
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Tests import agents/ and utils/ the way tools/ does: from the repository root.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+from collections import Counter
+
+import pytest
+
+from utils.async_llm import AsyncLLMClient
+
+
+class _BlockingClient:
+    """Sync call_chat that blocks until released and tracks concurrency per model."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.started = threading.Semaphore(0)
+        self.finished = []
+        self._lock = threading.Lock()
+        self._now = Counter()
+        self.peak = Counter()
+
+    def call_chat(self, model, messages, **kwargs):
+        with self._lock:
+            self._now[model] += 1
+            self._now["*"] += 1
+            for k in (model, "*"):
+                self.peak[k] = max(self.peak[k], self._now[k])
+        self.started.release()
+        self.gate.wait(5)
+        with self._lock:
+            self._now[model] -= 1
+            self._now["*"] -= 1
+            self.finished.append(messages[0]["content"])
+        return f"{model}:{messages[0]['content']}"
+
+
+def _msgs(i):
+    return [{"role": "user", "content": f"q{i}"}]
+
+
+async def _started(client, n=1):
+    for _ in range(n):
+        assert await asyncio.to_thread(client.started.acquire, True, 2)
+
+
+def test_global_cap_bounds_concurrent_calls():
+    fake = _BlockingClient()
+    aclient = AsyncLLMClient(fake, max_in_flight=3, per_model_default=10)
+
+    async def main():
+        tasks = [asyncio.create_task(aclient.call_chat("m", _msgs(i))) for i in range(8)]
+        await _started(fake, 3)
+        await asyncio.sleep(0.05)
+        assert aclient.stats()["in_flight"] == 3
+        fake.gate.set()
+        return await asyncio.gather(*tasks)
+
+    results = asyncio.run(main())
+    aclient.close()
+    assert results == [f"m:q{i}" for i in range(8)]
+    assert fake.peak["*"] == 3
+    assert aclient.stats()["completed"] == 8 and aclient.stats()["in_flight"] == 0
+
+
+def test_per_model_cap_applies_within_global_cap():
+    fake = _BlockingClient()
+    aclient = AsyncLLMClient(fake, max_in_flight=8, per_model_default=3, per_model={"slow": 1})
+
+    async def main():
+        tasks = [asyncio.create_task(aclient.call_chat(m, _msgs(i))) for i in range(4) for m in ("slow", "fast")]
+        await _started(fake, 4)
+        await asyncio.sleep(0.05)
+        fake.gate.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    aclient.close()
+    assert (fake.peak["slow"], fake.peak["fast"]) == (1, 3)
+
+
+def test_cancelling_a_queued_call_never_reaches_the_client():
+    fake = _BlockingClient()
+    aclient = AsyncLLMClient(fake, max_in_flight=1)
+
+    async def main():
+        first = asyncio.create_task(aclient.call_chat("m", _msgs(1)))
+        await _started(fake)
+        queued = asyncio.create_task(aclient.call_chat("m", _msgs(2)))
+        await asyncio.sleep(0.05)
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        fake.gate.set()
+        return await first, queued.cancelled()
+
+    result, cancelled = asyncio.run(main())
+    aclient.close()
+    assert (result, cancelled) == ("m:q1", True)
+    assert fake.finished == ["q1"]
+    assert aclient.stats()["cancelled"] == 1
+
+
+def test_cancelled_in_flight_call_runs_to_completion_and_keeps_its_slot():
+    fake = _BlockingClient()
+    aclient = AsyncLLMClient(fake, max_in_flight=1)
+
+    async def main():
+        first = asyncio.create_task(aclient.call_chat("m", _msgs(1)))
+        await _started(fake)
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        assert first.cancelled()
+        # The abandoned request is still on the wire: the next call must wait for it.
+        second = asyncio.create_task(aclient.call_chat("m", _msgs(2)))
+        await asyncio.sleep(0.05)
+        assert aclient.stats()["in_flight"] == 1 and fake.peak["*"] == 1 and fake.finished == []
+        fake.gate.set()
+        return await second
+
+    assert asyncio.run(main()) == "m:q2"
+    aclient.close()
+    assert fake.finished == ["q1", "q2"]
+    assert fake.peak["*"] == 1
+    assert aclient.stats()["cancelled"] == 1 and aclient.stats()["in_flight"] == 0
+
+
+def test_analyzer_agent_async_path():
+    pytest.importorskip("loguru")
+    from agents.analyzer_agent import AnalyzerAgent
+
+    class _Client:
+        def __init__(self, reply):
+            self.reply = reply
+            self.calls = []
+
+        def call_chat(self, model, messages, **kwargs):
+            self.calls.append((model, messages, kwargs))
+            return self.reply
+
+    ok = _Client('{"status": "complete", "explanation": "passed"}')
+    agent = AnalyzerAgent(model="m", aclient=AsyncLLMClient(ok))
+    assert asyncio.run(agent.aanalyze("task", "code", "1 passed")) == {"status": "complete", "explanation": "passed"}
+    (model, messages, kwargs), = ok.calls
+    assert model == "m" and "### Execution Output:\n1 passed" in messages[0]["content"]
+    assert kwargs == {"temperature": 0.0, "max_tokens": 256}
+
+    bad = AnalyzerAgent(aclient=AsyncLLMClient(_Client("not json")))
+    assert asyncio.run(bad.aanalyze("task", "code", "out"))["status"] == "incomplete"
@@ -0,0 +1,141 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")  # openai_llm builds its singleton at import
+
+from tools import convert_selenium_once as cli  # noqa: E402
+from utils.job_queue import MAX_ATTEMPTS  # noqa: E402
+
+
+class FakeAgent:
+    """Stands in for POMConverterAgent: sleeps per file, tracks concurrency and start/end order."""
+
+    delays = {}
+    failing = set()
+
+    def __init__(self):
+        self.page_registry = False
+        self.stage_store = None
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.events = []
+        FakeAgent.last = self
+
+    def config_fingerprint(self):
+        return "cfg"
+
+    def file_fingerprint(self, src_path, out_dir, source, config=None):
+        return config or "cfg"
+
+    def convert(self, src_path, out_dir):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            self.events.append(("start", src_path.name))
+        try:
+            time.sleep(self.delays.get(src_path.name, 0.05))
+            if src_path.name in self.failing:
+                raise RuntimeError(f"{src_path.name} does not convert")
+            out = out_dir / "tests" / f"{src_path.stem}.py"
+            out.parent.mkdir(parents=True, exist_ok=True)
+            out.write_text("def test_x():\n    pass\n", encoding="utf-8")
+            return {f"tests/{src_path.stem}": out.read_text(encoding="utf-8")}
+        finally:
+            with self.lock:
+                self.running -= 1
+                self.events.append(("end", src_path.name))
+
+
+@pytest.fixture
+def run(tmp_path, monkeypatch):
+    monkeypatch.setattr(cli, "POMConverterAgent", FakeAgent)
+    monkeypatch.setattr(cli, "QUEUE_POLL_S", 0.05)
+    monkeypatch.setattr(FakeAgent, "delays", {})
+    monkeypatch.setattr(FakeAgent, "failing", set())
+    src = tmp_path / "src"
+    src.mkdir()
+
+    def _run(*args):
+        monkeypatch.setattr(sys, "argv", ["convert_selenium_once.py", "--in", str(src),
+                                          "--out", str(tmp_path / "out"), "--metrics-port", "0", *args])
+        return cli.main()
+
+    _run.src = src
+    return _run
+
+
+def _independent(src, n):
+    for i in range(n):
+        (src / f"test_{i}.py").write_text(f"def test_{i}():\n    assert {i}\n", encoding="utf-8")
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_jobs_bounds_concurrent_conversions(run, capsys, jobs):
+    _independent(run.src, 6)
+    assert run("--jobs", str(jobs)) == 0
+    agent = FakeAgent.last
+    assert agent.peak == jobs
+    assert sorted(name for kind, name in agent.events if kind == "end") == [f"test_{i}.py" for i in range(6)]
+    out = capsys.readouterr().out
+    assert "Done. Success: 6, Failed: 0 in" in out and f"with {jobs} job(s)" in out
+
+
+def test_parallel_run_is_faster_than_serial(run):
+    _independent(run.src, 6)
+    FakeAgent.delays = {f"test_{i}.py": 0.2 for i in range(6)}
+    t0 = time.monotonic()
+    assert run("-j", "6", "--force") == 0
+    assert time.monotonic() - t0 < 6 * 0.2
+
+
+def test_results_are_printed_in_input_order(run, capsys):
+    _independent(run.src, 4)
+    FakeAgent.delays = {"test_0.py": 0.3}
+    assert run("-j", "4") == 0
+    ends = [name for kind, name in FakeAgent.last.events if kind == "end"]
+    assert ends[-1] == "test_0.py"  # finished last...
+    lines = [line for line in capsys.readouterr().out.splitlines() if line.startswith("[")]
+    # ...but reported first.
+    assert [line.split()[1] for line in lines] == [f"test_{i}.py:" for i in range(4)]
+    assert [line.split()[0] for line in lines] == ["[1/4]", "[2/4]", "[3/4]", "[4/4]"]
+
+
+def test_importers_wait_for_the_page_objects_they_import(run):
+    (run.src / "login_page.py").write_text("class LoginPage:\n    pass\n", encoding="utf-8")
+    (run.src / "test_login.py").write_text("from login_page import LoginPage\n", encoding="utf-8")
+    (run.src / "test_other.py").write_text("def test_other():\n    pass\n", encoding="utf-8")
+    FakeAgent.delays = {"login_page.py": 0.3}
+
+    assert run("-j", "3") == 0
+    events = FakeAgent.last.events
+    assert events.index(("end", "login_page.py")) < events.index(("start", "test_login.py"))
+    # An independent file does not wait for the page object.
+    assert events.index(("start", "test_other.py")) < events.index(("end", "login_page.py"))
+
+
+def test_a_failing_file_is_retried_then_counted_alone(run, capsys):
+    _independent(run.src, 4)
+    FakeAgent.failing = {"test_2.py"}
+    assert run("-j", "2") == 1
+
+    starts = [name for kind, name in FakeAgent.last.events if kind == "start"]
+    assert starts.count("test_2.py") == MAX_ATTEMPTS
+    assert sorted(set(starts)) == [f"test_{i}.py" for i in range(4)]
+    out = capsys.readouterr().out
+    assert out.count("test_2.py: attempt failed") == MAX_ATTEMPTS - 1
+    assert "Conversion failed for test_2.py" in out
+    assert "Done. Success: 3, Failed: 1" in out
+
+
+def test_second_run_skips_up_to_date_files(run, capsys):
+    _independent(run.src, 3)
+    assert run("-j", "2") == 0
+    capsys.readouterr()
+    assert run("-j", "2") == 0
+    out = capsys.readouterr().out
+    assert "Up to date: 3 of 3 files" in out and "Done. Success: 0, Failed: 0" in out
@@ -0,0 +1,90 @@
+import multiprocessing
+from pathlib import Path
+
+import pytest
+
+from utils.convert_manifest import ConvertManifest, fingerprint_of, key_to_path, sha256_text, source_rel
+
+
+def _touch(out, *keys):
+    for k in keys:
+        p = key_to_path(out, k)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text("# generated\n")
+
+
+def test_fresh_needs_same_hashes_and_outputs_on_disk(tmp_path):
+    m = ConvertManifest(tmp_path)
+    _touch(tmp_path, "tests/test_a.py", "pages/a_page")
+    m.record("a.py", "sha1", "fp1", ["tests/test_a.py", "pages/a_page"])
+    assert m.is_fresh("a.py", "sha1", "fp1")
+    assert not m.is_fresh("a.py", "sha2", "fp1")
+    assert not m.is_fresh("a.py", "sha1", "fp2")
+    (tmp_path / "pages" / "a_page.py").unlink()
+    assert not m.is_fresh("a.py", "sha1", "fp1")
+
+
+def test_survives_reload_and_ignores_other_versions(tmp_path):
+    ConvertManifest(tmp_path).record("a.py", "s", "f", [])
+    assert ConvertManifest(tmp_path).is_fresh("a.py", "s", "f")
+    (tmp_path / ".convert_manifest.json").write_text('{"version": 0, "sources": {"a.py": {}}}')
+    assert ConvertManifest(tmp_path).sources == {}
+
+
+def test_dropped_keys_are_deleted_unless_another_source_claims_them(tmp_path):
+    m = ConvertManifest(tmp_path)
+    _touch(tmp_path, "tests/test_a.py", "tests/test_old.py", "pages/shared_page.py")
+    m.record("a.py", "s", "f", ["tests/test_a.py", "tests/test_old.py", "pages/shared_page.py"])
+    m.record("b.py", "s", "f", ["pages/shared_page.py"])
+    m.record("a.py", "s2", "f", ["tests/test_a.py"])
+    assert not (tmp_path / "tests/test_old.py").exists()
+    assert (tmp_path / "pages/shared_page.py").exists()
+
+    assert m.prune(["a.py"]) == ["b.py"]
+    assert not (tmp_path / "pages/shared_page.py").exists()
+    assert (tmp_path / "tests/test_a.py").exists()
+
+
+def test_seconds_per_token_from_timed_runs(tmp_path):
+    m = ConvertManifest(tmp_path)
+    assert m.seconds_per_token() is None
+    m.record("a.py", "s", "f", [], seconds=10, tokens=1000)
+    m.record("b.py", "s", "f", [], seconds=30, tokens=1000)
+    m.record("c.py", "s", "f", [])
+    assert m.seconds_per_token() == 0.02
+
+
+def test_helpers(tmp_path):
+    assert key_to_path(tmp_path, "/pages/x") == tmp_path / "pages/x.py"
+    assert source_rel(tmp_path / "sub/a.py", tmp_path) == "sub/a.py"
+    assert source_rel(Path("/elsewhere/a.py"), tmp_path) == "/elsewhere/a.py"
+    assert fingerprint_of({"a": 1, "b": 2}) == fingerprint_of({"b": 2, "a": 1})
+    assert sha256_text("") == "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855"
+
+
+def test_instances_merge_each_others_records(tmp_path):
+    a, b = ConvertManifest(tmp_path), ConvertManifest(tmp_path)
+    a.record("a.py", "s", "f", [])
+    b.record("b.py", "s", "f", [])
+    assert sorted(ConvertManifest(tmp_path).sources) == ["a.py", "b.py"]
+    assert a.is_fresh("b.py", "s", "f")  # a rereads what b wrote
+    assert a.prune(["a.py"]) == ["b.py"]
+    assert not b.is_fresh("b.py", "s", "f")
+
+
+def _record_many(out_dir, worker, n):
+    m = ConvertManifest(out_dir)
+    for i in range(n):
+        m.record(f"w{worker}/f{i}.py", "s", "f", [])
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_processes_recording_at_once_lose_nothing(tmp_path):
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_record_many, args=(tmp_path, w, 20)) for w in range(4)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join(30)
+        assert proc.exitcode == 0
+    assert len(ConvertManifest(tmp_path).sources) == 80
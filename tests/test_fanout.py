@@ -0,0 +1,136 @@
+import ast
+import json
+import os
+import re
+import textwrap
+import threading
+import time
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")  # openai_llm builds its singleton at import
+
+from agents import pom_converter_agent as pca  # noqa: E402
+from utils.llm_cache import LLMResponseCache  # noqa: E402
+
+SUITE = textwrap.dedent('''
+    import unittest
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+
+
+    class LoginTests(unittest.TestCase):
+        def setUp(self):
+            self.driver = webdriver.Chrome()
+
+        def test_first(self):
+            self.driver.find_element(By.ID, "a").click()
+
+        def test_second(self):
+            self.driver.find_element(By.ID, "b").click()
+
+        def test_third(self):
+            self.driver.find_element(By.ID, "c").click()
+
+        def test_fourth(self):
+            self.driver.find_element(By.ID, "d").click()
+''')
+
+ORDER = ["test_first", "test_second", "test_third", "test_fourth"]
+
+
+def _part(method):
+    return {
+        "pages/login_page": textwrap.dedent('''
+            from playwright.sync_api import Page
+
+
+            class LoginPage:
+                def __init__(self, page: Page):
+                    self.page = page
+
+                def click_%s(self):
+                    self.page.locator("#x").click()
+        ''' % method.removeprefix("test_")),
+        "tests/test_login": textwrap.dedent('''
+            import pytest
+            from playwright.sync_api import Page
+
+            from pages.login_page import LoginPage
+
+
+            @pytest.fixture
+            def login(page: Page) -> LoginPage:
+                return LoginPage(page)
+
+
+            def %s(login):
+                login.click_%s()
+        ''' % (method, method.removeprefix("test_"))),
+    }
+
+
+class FakeLLM:
+    """Answers each part with its own method; later parts answer first, `broken` parts fail once."""
+
+    def __init__(self, broken=()):
+        self.broken = set(broken)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def call_chat(self, model, messages, **kwargs):
+        prompt = "\n".join(m["content"] for m in messages)
+        method = re.search(r"methods in this part: (\w+)", prompt).group(1)
+        with self.lock:
+            self.calls.append(method)
+            fail = method in self.broken
+            self.broken.discard(method)
+        time.sleep(0.02 * (len(ORDER) - ORDER.index(method)))
+        if fail:
+            return json.dumps({"tests/test_login": "def broken(:\n"})
+        return json.dumps(_part(method))
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setenv("CONVERT_FANOUT_MIN_METHODS", "3")
+    monkeypatch.setattr(pca, "response_cache", LLMResponseCache(enabled=False))
+    a = pca.POMConverterAgent()
+    a.preconvert = a.page_registry = a.page_merge = False
+    a.repair_rounds = 0
+    return a
+
+
+def _convert(agent, llm, tmp_path, monkeypatch):
+    monkeypatch.setattr(pca, "llm_client", llm)
+    src = tmp_path / "test_login.py"
+    src.write_text(SUITE, encoding="utf-8")
+    return agent.convert(src, tmp_path / "out")
+
+
+def test_fan_out_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("CONVERT_FANOUT_MIN_METHODS", raising=False)
+    assert pca.POMConverterAgent().fanout_min == 0
+
+
+def test_parts_merge_into_one_module_in_source_order(agent, tmp_path, monkeypatch):
+    llm = FakeLLM()
+    mapping = _convert(agent, llm, tmp_path, monkeypatch)
+
+    assert sorted(llm.calls) == sorted(ORDER)  # one analyzer call per method, gate skipped the builder
+    tree = ast.parse(mapping["tests/test_login"])
+    functions = [n.name for n in tree.body if isinstance(n, ast.FunctionDef)]
+    assert functions == ["login"] + ORDER  # shared fixture once, tests in source order
+    page = ast.parse(mapping["pages/login_page"])
+    (cls,) = [n for n in page.body if isinstance(n, ast.ClassDef)]
+    assert [n.name for n in cls.body] == ["__init__"] + [f"click_{m.removeprefix('test_')}" for m in ORDER]
+    assert (tmp_path / "out" / "tests" / "test_login.py").read_text(encoding="utf-8") == mapping["tests/test_login"]
+
+
+def test_failed_part_is_retried_alone(agent, tmp_path, monkeypatch):
+    llm = FakeLLM(broken={"test_third"})
+    mapping = _convert(agent, llm, tmp_path, monkeypatch)
+
+    assert sorted(llm.calls) == sorted(ORDER + ["test_third"])
+    functions = [n.name for n in ast.parse(mapping["tests/test_login"]).body if isinstance(n, ast.FunctionDef)]
+    assert functions == ["login"] + ORDER
@@ -0,0 +1,103 @@
+import threading
+import time
+
+from utils.hedging import HedgedClient, maybe_hedged
+from utils.singleflight import SingleFlight
+
+
+class FakeClient:
+    """call_chat sleeps `delay`; stream_chat yields `chunks` deltas every `step` seconds."""
+
+    def __init__(self, delay=0.0, answer="plain", chunks=5, step=0.02):
+        self.delay = delay
+        self.answer = answer
+        self.chunks = chunks
+        self.step = step
+        self.inflight = SingleFlight(enabled=True)
+        self.plain_calls = 0
+        self.streams = 0
+        self.closed = threading.Event()
+
+    def call_chat(self, model, messages, **kwargs):
+        def run():
+            self.plain_calls += 1
+            time.sleep(self.delay)
+            return self.answer
+        return self.inflight.do(f"{model}:{messages[0]['content']}", run)
+
+    def stream_chat(self, model, messages, **kwargs):
+        self.streams += 1
+        try:
+            for i in range(self.chunks):
+                time.sleep(self.step)
+                yield f"s{i}"
+        finally:
+            self.closed.set()
+
+
+MESSAGES = [{"role": "user", "content": "convert"}]
+
+
+def _hedger(primary, hedge, delay=0.05):
+    return HedgedClient(primary, hedge, default_delay_s=delay, min_delay_s=0.0, max_ratio=1.0, max_workers=4)
+
+
+def test_fast_call_never_streams():
+    primary, hedge = FakeClient(), FakeClient()
+    client = _hedger(primary, hedge)
+    assert client.call_chat("m", MESSAGES, max_tokens=10) == "plain"
+    assert (primary.plain_calls, primary.streams, hedge.streams) == (1, 0, 0)
+    assert client.stats()["hedged"] == 0
+
+
+def test_slow_primary_loses_to_the_streamed_hedge():
+    primary, hedge = FakeClient(delay=0.5), FakeClient(chunks=3, step=0.01)
+    client = _hedger(primary, hedge)
+    assert client.call_chat("m", MESSAGES) == "s0s1s2"
+    assert (primary.streams, hedge.streams) == (0, 1)
+    assert client.stats()["hedge_wins"] == 1
+    time.sleep(0.6)  # the abandoned plain call finishes and its spend is counted
+    assert client.stats()["duplicate_tokens"] > 0
+
+
+def test_losing_hedge_stream_is_closed():
+    primary, hedge = FakeClient(delay=0.1), FakeClient(chunks=1000, step=0.01)
+    client = _hedger(primary, hedge)
+    assert client.call_chat("m", MESSAGES) == "plain"
+    assert hedge.closed.wait(1.0)
+    assert client.stats()["hedge_wins"] == 0
+
+
+def test_hedge_budget_caps_duplicates():
+    primary, hedge = FakeClient(delay=0.1), FakeClient(chunks=1000, step=0.01)
+    client = HedgedClient(primary, hedge, default_delay_s=0.02, max_ratio=0.0, max_workers=4)
+    assert client.call_chat("m", MESSAGES) == "plain"
+    assert hedge.streams == 0
+
+
+def test_identical_concurrent_calls_share_one_request():
+    primary = FakeClient(delay=0.1)
+    client = _hedger(primary, FakeClient(), delay=10)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.call_chat("m", MESSAGES))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert results == ["plain"] * 4
+    assert primary.plain_calls == 1
+
+
+def test_hedge_client_is_only_built_when_hedging_is_on():
+    built = []
+
+    def factory():
+        built.append(1)
+        return FakeClient()
+
+    primary = FakeClient()
+    assert maybe_hedged(primary, factory, enabled=False) is primary
+    assert built == []
+    hedged = maybe_hedged(primary, factory, enabled=True)
+    assert isinstance(hedged, HedgedClient) and built == [1]
+    assert isinstance(maybe_hedged(primary, None, enabled=True), HedgedClient)
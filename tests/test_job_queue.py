@@ -0,0 +1,106 @@
+import time
+
+import pytest
+
+from utils.job_queue import JobQueue, progress_line
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = JobQueue(tmp_path / "queue.sqlite", lease_s=60, max_attempts=2)
+    yield q
+    q.close()
+
+
+def _add(queue, tmp_path, rel="a.py", sha="s1", fp="f1"):
+    queue.enqueue(rel, tmp_path / rel, sha, fp, tokens=100)
+
+
+def test_one_lease_per_job(queue, tmp_path):
+    _add(queue, tmp_path)
+    assert queue.claim("a.py", "w1")
+    assert not queue.claim("a.py", "w2")
+    assert queue.states(["a.py"]) == {"a.py": "running"}
+    queue.complete("a.py", "w1", 1.5)
+    assert queue.states(["a.py"]) == {"a.py": "done"}
+    assert queue.stats()["tokens_done"] == 100
+
+
+def test_expired_lease_can_be_taken_over(tmp_path):
+    q = JobQueue(tmp_path / "q.sqlite", lease_s=0.05)
+    _add(q, tmp_path)
+    assert q.claim("a.py", "w1")
+    time.sleep(0.1)
+    assert q.states(["a.py"]) == {"a.py": "pending"}
+    assert q.claim("a.py", "w2")
+    q.complete("a.py", "w1", 1.0)  # the old owner lost its lease: no effect
+    assert q.states(["a.py"]) == {"a.py": "running"}
+    q.close()
+
+
+def test_heartbeat_renews_leases(tmp_path):
+    q = JobQueue(tmp_path / "q.sqlite", lease_s=0.2)
+    _add(q, tmp_path)
+    q.claim("a.py", "w1")
+    for _ in range(3):
+        time.sleep(0.1)
+        assert q.heartbeat("w1") == 1
+    assert not q.claim("a.py", "w2")
+    q.close()
+
+
+def test_failures_retry_until_max_attempts(queue, tmp_path):
+    _add(queue, tmp_path)
+    queue.claim("a.py", "w1")
+    assert queue.fail("a.py", "w1", "boom") == "pending"
+    queue.claim("a.py", "w1")
+    assert queue.fail("a.py", "w1", "boom again") == "failed"
+    assert queue.error("a.py") == "boom again"
+    assert queue.fail("a.py", "w2", "not mine") == "pending"
+
+
+def test_release_does_not_count_the_attempt(queue, tmp_path):
+    _add(queue, tmp_path)
+    queue.claim("a.py", "w1")
+    assert queue.release("w1") == 1
+    assert queue.stats()["attempts"] == 0
+    assert queue.claim("a.py", "w2")
+
+
+def test_stages_survive_requeue_until_inputs_change(queue, tmp_path):
+    src = tmp_path / "a.py"
+    _add(queue, tmp_path)
+    queue.save_stage(src, "analyzer", {"pages/x": "code"}, 2.0)
+    assert queue.stage_output(src, "analyzer") == {"pages/x": "code"}
+
+    _add(queue, tmp_path)  # same source and fingerprint: resume
+    assert queue.stage_output(src, "analyzer") == {"pages/x": "code"}
+    _add(queue, tmp_path, fp="f2")
+    assert queue.stage_output(src, "analyzer") is None
+
+    queue.save_stage(src, "analyzer", {"pages/x": "code"}, 2.0)
+    assert not queue.refingerprint("a.py", "f2")
+    assert queue.refingerprint("a.py", "f3")
+    assert queue.stage_output(src, "analyzer") is None
+
+
+def test_done_jobs_are_made_runnable_again(queue, tmp_path):
+    _add(queue, tmp_path)
+    queue.claim("a.py", "w1")
+    queue.complete("a.py", "w1", 1.0)
+    _add(queue, tmp_path)
+    assert queue.states(["a.py"]) == {"a.py": "pending"}
+
+
+def test_queue_is_shared_between_connections(queue, tmp_path):
+    _add(queue, tmp_path)
+    other = JobQueue(queue.path)
+    assert other.claim("a.py", "w2")
+    assert not queue.claim("a.py", "w1")
+    other.close()
+
+
+def test_progress_line():
+    assert progress_line(0, 10, 5.0, 0, 1000) == ""
+    assert progress_line(1, 3, 30.0, 400, 800) == "2.0 files/min, ETA 1m00s"
+    assert progress_line(3, 3, 6.0, 10, 0) == "30.0 files/min, ETA 0s"
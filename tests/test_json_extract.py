@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from utils.json_extract import extract_json_object
+
+MAPPING = {"pages/login_page": 'class P:\n    d = {"a": 1}\n    s = f"{x}"\n', "tests/test_a": "x = '}{'\n"}
+
+
+@pytest.mark.parametrize("text", [
+    json.dumps(MAPPING),
+    "```json\n" + json.dumps(MAPPING, indent=2) + "\n```",
+    "```\n" + json.dumps(MAPPING) + "\n```",
+    "Here is the conversion:\n" + json.dumps(MAPPING) + "\nLet me know if you need more.",
+    "Note {not json} first. " + json.dumps(MAPPING),
+    'The 5" screen version: ' + json.dumps(MAPPING),
+    'Note {not json} for the 5" screen: ' + json.dumps(MAPPING),
+])
+def test_object_is_found_however_it_is_wrapped(text):
+    assert extract_json_object(text) == MAPPING
+
+
+def test_quote_in_prose_before_the_object():
+    assert extract_json_object('Here is the 5" screen version: {"a": "b"}') == {"a": "b"}
+
+
+def test_longest_object_wins():
+    text = 'Example: {"a": 1}. Answer: ' + json.dumps(MAPPING)
+    assert extract_json_object(text) == MAPPING
+
+
+def test_braces_inside_strings_are_never_tried():
+    # Truncated: the only complete objects are inside a string value.
+    text = '{"tests/test_a": "d = {\\"k\\": 1}\\nprint(d)'
+    with pytest.raises(ValueError):
+        extract_json_object(text)
+
+
+@pytest.mark.parametrize("text, message", [
+    ("", "empty response"),
+    ("no braces here", "no JSON object found"),
+    ("[1, 2] {", "unbalanced JSON braces"),
+])
+def test_errors(text, message):
+    with pytest.raises(ValueError, match=message):
+        extract_json_object(text)
+
+
+def test_top_level_array_is_not_an_object():
+    with pytest.raises(ValueError):
+        extract_json_object("[1, 2]")
@@ -0,0 +1,73 @@
+import json
+import os
+import time
+
+from utils.llm_cache import LLMResponseCache, make_cache_key
+
+
+def _key(text: str) -> str:
+    return make_cache_key("gpt-test", [{"role": "user", "content": text}], 100)
+
+
+def test_key_covers_every_request_field():
+    messages = [{"role": "user", "content": "hi"}]
+    base = make_cache_key("m", messages, 10)
+    assert base == make_cache_key("m", [dict(messages[0])], 10)
+    assert base != make_cache_key("m2", messages, 10)
+    assert base != make_cache_key("m", messages, 11)
+    assert base != make_cache_key("m", messages, 10, json_mode=True)
+    assert base != make_cache_key("m", messages, 10, extra={"temperature": 0.5})
+
+
+def test_round_trip_and_stats(tmp_path):
+    cache = LLMResponseCache(root=tmp_path, ttl_s=0, max_bytes=0, enabled=True)
+    key = _key("a")
+    assert cache.get(key) is None
+    cache.put(key, '{"ok": 1}')
+    assert cache.get(key) == '{"ok": 1}'
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["writes"]) == (1, 1, 1)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_disabled_cache_never_stores(tmp_path):
+    cache = LLMResponseCache(root=tmp_path, enabled=False)
+    cache.put(_key("a"), "x")
+    assert cache.get(_key("a")) is None
+    assert not any(tmp_path.iterdir())
+
+
+def test_expired_entry_is_a_miss_and_removed(tmp_path):
+    cache = LLMResponseCache(root=tmp_path, ttl_s=60, max_bytes=0, enabled=True)
+    key = _key("a")
+    cache.put(key, "x")
+    path = cache._path(key)
+    entry = json.loads(path.read_text())
+    entry["created"] = time.time() - 120
+    path.write_text(json.dumps(entry))
+    assert cache.get(key) is None
+    assert not path.exists()
+
+
+def test_unreadable_entry_is_dropped(tmp_path):
+    cache = LLMResponseCache(root=tmp_path, ttl_s=0, max_bytes=0, enabled=True)
+    key = _key("a")
+    cache.put(key, "x")
+    cache._path(key).write_text("{not json")
+    assert cache.get(key) is None
+    assert not cache._path(key).exists()
+
+
+def test_eviction_keeps_recently_used_entries(tmp_path):
+    cache = LLMResponseCache(root=tmp_path, ttl_s=0, max_bytes=10_000, enabled=True)
+    keys = [_key(str(i)) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, "v" * 2000)
+        os.utime(cache._path(key), (1000 + i, 1000 + i))
+    cache.get(keys[0])  # LRU touch: keys[1] is now the oldest
+    for i in range(3, 6):
+        cache.put(_key(str(i)), "v" * 2000)
+    assert cache.evictions >= 1
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.stats()["size_bytes"] <= 10_000
@@ -0,0 +1,148 @@
+import json
+from datetime import timedelta
+
+import pytest
+
+import utils.local_llm as local_llm
+from utils.llm_metrics import LLMMetrics, current_tags, estimate_cost, llm_stage
+
+
+USAGE = {"prompt_tokens": 1000, "completion_tokens": 100, "prompt_tokens_details": {"cached_tokens": 400}}
+
+
+class _Response:
+    def __init__(self, body):
+        self.status_code = 200
+        self.elapsed = timedelta(milliseconds=5)
+        self._body = body
+        self.text = json.dumps(body)
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._body
+
+
+class _Session:
+    def __init__(self, content):
+        self.content = content
+        self.posts = []
+
+    def get(self, url, timeout=None):
+        return _Response({"data": []})
+
+    def post(self, url, json=None, timeout=None):
+        self.posts.append(json)
+        return _Response({"choices": [{"message": {"content": self.content}}], "usage": USAGE})
+
+
+@pytest.fixture
+def fake_llm(tmp_path, monkeypatch):
+    metrics = LLMMetrics(directory=str(tmp_path), enabled=True)
+    session = _Session('{"status": "success", "elements": []}')
+    client = local_llm.LocalLLMClient(
+        base_url="http://llm.test", session=session, retries=0,
+        endpoint_cache=local_llm._EndpointCache(path=str(tmp_path / "endpoint.json")),
+    )
+    monkeypatch.setattr(local_llm, "llm_client", client)
+    monkeypatch.setattr(local_llm, "llm_metrics", metrics)
+    return metrics, session
+
+
+def test_record_tags_tokens_and_cost(tmp_path):
+    metrics = LLMMetrics(directory=str(tmp_path), enabled=True)
+    with llm_stage("converter", "build"):
+        assert current_tags() == {"agent": "converter", "stage": "build"}
+        rec = metrics.record("openai", "gpt-4o-mini", 1.5, ttfb_s=0.2, usage=USAGE, retries=1)
+    assert current_tags() == {"agent": "unknown", "stage": "unknown"}
+
+    assert (rec["agent"], rec["stage"], rec["model"]) == ("converter", "build", "gpt-4o-mini")
+    assert (rec["prompt_tokens"], rec["cached_tokens"], rec["completion_tokens"]) == (1000, 400, 100)
+    assert rec["cost_usd"] == round(estimate_cost("gpt-4o-mini", 1000, 400, 100), 6)
+    # Cached input is billed at the cached rate, the rest at the full input rate.
+    assert estimate_cost("gpt-4o-mini", 1000, 400, 100) == pytest.approx((600 * 0.15 + 400 * 0.075 + 100 * 0.60) / 1e6)
+    assert estimate_cost("unknown-model", 1000, 0, 100) == 0.0
+
+
+def test_disabled_records_nothing(tmp_path):
+    metrics = LLMMetrics(directory=str(tmp_path), enabled=False)
+    assert metrics.record("openai", "m", 1.0, usage=USAGE) is None
+    assert metrics.summary() == []
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_summary_groups_by_stage_with_percentiles(tmp_path):
+    metrics = LLMMetrics(directory=None, enabled=True)
+    with llm_stage("converter", "build"):
+        for wall in (1.0, 2.0, 3.0, 4.0):
+            metrics.record("openai", "m", wall, ttfb_s=wall / 10, usage=USAGE)
+        metrics.record("openai", "m", 9.0, ok=False, retries=2, error="boom")
+    with llm_stage("converter", "repair"):
+        metrics.record("openai", "m", 0.5)
+
+    build, repair = metrics.summary()
+    assert (build["stage"], build["calls"], build["errors"], build["retries"]) == ("build", 5, 1, 2)
+    assert build["p50_s"] == 3.0
+    assert 4.0 < build["p95_s"] <= 9.0
+    assert build["ttfb_p50_s"] == 0.25
+    assert build["prompt_tokens"] == 4000 and build["cached_tokens"] == 1600
+    assert (repair["stage"], repair["calls"], repair["p50_s"], repair["prompt_tokens"]) == ("repair", 1, 0.5, 0)
+
+
+def test_prometheus_text_counters_and_histogram():
+    metrics = LLMMetrics(directory=None, enabled=True)
+    with llm_stage("converter", "build"):
+        metrics.record("openai", "m", 0.3, usage=USAGE)
+        metrics.record("openai", "m", 40.0, ok=False, retries=1)
+    lines = metrics.prometheus_text().splitlines()
+    labels = 'client="openai",agent="converter",stage="build",model="m"'
+
+    assert "# TYPE llm_calls_total counter" in lines
+    assert f'llm_calls_total{{{labels},outcome="ok"}} 1' in lines
+    assert f'llm_calls_total{{{labels},outcome="error"}} 1' in lines
+    assert f"llm_retries_total{{{labels}}} 1" in lines
+    assert f'llm_tokens_total{{{labels},kind="cached"}} 400' in lines
+    assert "# TYPE llm_request_seconds histogram" in lines
+    assert f'llm_request_seconds_bucket{{{labels},le="0.25"}} 0' in lines
+    assert f'llm_request_seconds_bucket{{{labels},le="0.5"}} 1' in lines
+    assert f'llm_request_seconds_bucket{{{labels},le="30"}} 1' in lines
+    assert f'llm_request_seconds_bucket{{{labels},le="+Inf"}} 2' in lines
+    assert f"llm_request_seconds_count{{{labels}}} 2" in lines
+
+
+def test_jsonl_sink_appends_one_line_per_call(tmp_path):
+    metrics = LLMMetrics(directory=str(tmp_path / "metrics"), enabled=True)
+    metrics.record("openai", "m", 1.0, usage=USAGE)
+    metrics.record("local", "m", 2.0, ok=False, error="x" * 1000)
+
+    files = list((tmp_path / "metrics").glob("run-*.jsonl"))
+    assert files == [metrics.path]
+    rows = [json.loads(line) for line in files[0].read_text(encoding="utf-8").splitlines()]
+    assert [r["client"] for r in rows] == ["openai", "local"]
+    assert rows[0]["cached_tokens"] == 400 and rows[0]["ok"] is True
+    assert rows[1]["ok"] is False and len(rows[1]["error"]) == 500
+
+
+def test_call_llm_is_recorded_under_the_callers_stage(fake_llm):
+    metrics, session = fake_llm
+    with llm_stage("dom_analyzer", "analyze"):
+        out = local_llm.call_llm(prompt="<html/>", model="dom_analyzer", temperature=0.2, system_prompt="sys")
+
+    assert out == '{"status": "success", "elements": []}'
+    assert session.posts[0]["messages"] == [
+        {"role": "system", "content": "sys"}, {"role": "user", "content": "<html/>"},
+    ]
+    (row,) = metrics.summary()
+    assert (row["client"], row["agent"], row["stage"], row["model"]) == ("local", "dom_analyzer", "analyze", "dom_analyzer")
+    assert row["prompt_tokens"] == 1000
+
+
+def test_dom_analyzer_agent_records_its_stage(fake_llm):
+    pytest.importorskip("loguru")
+    from agents.dom_analyzer_agent import DOMAnalyzerAgent
+
+    metrics, _ = fake_llm
+    assert DOMAnalyzerAgent().analyze("<form></form>") == {"status": "success", "elements": []}
+    (row,) = metrics.summary()
+    assert (row["agent"], row["stage"]) == ("dom_analyzer", "analyze")
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+from utils.llm_router import LLMRouter
+
+
+def _router(bases=("http://a", "http://b", "http://c"), probe=lambda base: True, **kwargs):
+    kwargs.setdefault("health_interval", 0)
+    kwargs.setdefault("eject_s", 60)
+    return LLMRouter(list(bases), probe=probe, **kwargs)
+
+
+def _bases(backends):
+    return [b.base for b in backends]
+
+
+def test_least_outstanding_spreads_concurrent_requests():
+    router = _router()
+    held = [router.acquire() for _ in range(6)]
+    assert sorted(_bases(held)) == ["http://a", "http://a", "http://b", "http://b", "http://c", "http://c"]
+    router.release(held[0], 0.1, True)
+    # The backend that just freed a slot has the fewest outstanding requests.
+    assert router.acquire().base == held[0].base
+
+
+def test_ties_go_to_the_lower_latency_backend():
+    router = _router(bases=("http://a", "http://b"))
+    a, b = router.acquire(), router.acquire()
+    router.release(a, 2.0, True)
+    router.release(b, 0.5, True)
+    assert [router.acquire().base for _ in range(2)] == ["http://b", "http://a"]
+
+
+def test_consecutive_failures_eject_and_traffic_moves_on():
+    router = _router(eject_after=3)
+    for _ in range(3):
+        router.release(router.backends[0], 0.1, False)
+    assert router.backends[0].ejected
+    assert "http://a" not in _bases(router.acquire() for _ in range(4))
+
+    # A success in between resets the streak.
+    b = router.backends[1]
+    router.release(b, 0.1, False)
+    router.release(b, 0.1, False)
+    router.release(b, 0.1, True)
+    router.release(b, 0.1, False)
+    assert not b.ejected
+
+
+def test_slow_backend_is_ejected_against_its_peers():
+    router = _router(slow_factor=3.0)
+    a, b, c = router.backends
+    for _ in range(3):
+        router.release(b, 0.1, True)
+        router.release(c, 0.1, True)
+        router.release(a, 1.0, True)
+    assert a.ejected and not b.ejected and not c.ejected
+
+
+def test_single_backend_is_never_ejected():
+    router = _router(bases=("http://a",), eject_after=1)
+    router.release(router.backends[0], 0.1, False)
+    assert not router.backends[0].ejected
+    assert router.acquire().base == "http://a"
+
+
+def test_everything_ejected_uses_the_soonest_to_return():
+    router = _router(bases=("http://a", "http://b"), eject_after=1)
+    router.release(router.backends[1], 0.1, False)
+    router.backends[1].retry_at -= 10
+    router.backends[0].ejected = True
+    router.backends[0].retry_at = time.time() + 60
+    assert router.acquire().base == "http://b"
+
+
+def test_readmitted_without_health_thread_once_eject_time_passed():
+    router = _router(bases=("http://a", "http://b"), eject_after=1, eject_s=0.1)
+    a, b = router.backends
+    for _ in range(3):
+        router.release(b, 0.2, True)
+    router.release(a, 0.1, False)
+    assert a.ejected
+    time.sleep(0.15)
+    router.acquire()
+    assert not a.ejected
+    assert a.ewma_s == pytest.approx(b.ewma_s)  # slow history forgotten: starts at the peers' median
+
+
+def test_health_loop_ejects_failing_backends_and_readmits_them_when_they_answer():
+    healthy = {"http://a": True, "http://b": True}
+    probed = threading.Event()
+
+    def probe(base):
+        probed.set()
+        return healthy[base]
+
+    router = _router(bases=healthy, probe=probe, health_interval=0.02, eject_s=0.05)
+    try:
+        healthy["http://a"] = False
+        _wait(lambda: router.backends[0].ejected)
+        assert {s["base"]: s["ejected"] for s in router.stats()} == {"http://a": True, "http://b": False}
+
+        time.sleep(0.1)
+        assert router.backends[0].ejected  # eject time passed, but it still fails the probe
+
+        healthy["http://a"] = True
+        _wait(lambda: not router.backends[0].ejected)
+    finally:
+        router.close()
+    assert probed.is_set()
+
+
+def test_down_backends_start_ejected():
+    router = _router(down=["http://b"])
+    assert [s["ejected"] for s in router.stats()] == [False, True, False]
+
+
+def _wait(cond, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
@@ -0,0 +1,139 @@
+import json
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+import requests
+
+from utils import local_llm
+from utils.llm_metrics import LLMMetrics
+from utils.local_llm import LocalLLMClient, _EndpointCache
+
+
+class _Response:
+    def __init__(self, body, status=200):
+        self.status_code = status
+        self.elapsed = timedelta(milliseconds=1)
+        self._body = body
+        self.text = json.dumps(body)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code}", response=self)
+
+    def json(self):
+        return self._body
+
+
+class FakeHosts:
+    """requests.Session stand-in: each base URL is 'ok', 'slow' (answers after 0.3 s) or 'dead'."""
+
+    def __init__(self, **hosts):
+        self.hosts = {f"http://{name}": kind for name, kind in hosts.items()}
+        self.probed = []
+        self.posted = []
+        self._lock = threading.Lock()
+
+    def _kind(self, url):
+        base = url.split("/v1/", 1)[0]
+        return base, self.hosts[base]
+
+    def get(self, url, timeout=None):
+        base, kind = self._kind(url)
+        with self._lock:
+            self.probed.append(base)
+        if kind == "dead":
+            raise requests.ConnectionError(f"{base} refused")
+        if kind == "slow":
+            time.sleep(0.3)
+        return _Response({"data": [{"id": "m"}]})
+
+    def post(self, url, json=None, timeout=None):
+        base, kind = self._kind(url)
+        self.posted.append(base)
+        if kind == "dead":
+            raise requests.ConnectionError(f"{base} refused")
+        return _Response({"choices": [{"message": {"content": f"from {base}"}}]})
+
+
+def _client(session, cache, *names, **kwargs):
+    return LocalLLMClient(
+        base_url=",".join(f"http://{n}" for n in names), session=session, endpoint_cache=cache, **kwargs
+    )
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return _EndpointCache(path=str(tmp_path / "endpoint.json"), ttl=60, dead_ttl=60)
+
+
+@pytest.fixture(autouse=True)
+def _no_metrics(monkeypatch):
+    monkeypatch.setattr(local_llm, "llm_metrics", LLMMetrics(directory=None, enabled=False))
+
+
+def test_probes_concurrently_and_takes_the_first_healthy_host(cache):
+    hosts = FakeHosts(a="slow", b="slow", c="ok")
+    t0 = time.monotonic()
+    assert _client(hosts, cache, "a", "b", "c")._ensure_base_url() == "http://c"
+    assert time.monotonic() - t0 < 0.25  # did not wait for the slow hosts in turn
+    assert sorted(hosts.probed) == ["http://a", "http://b", "http://c"]
+
+
+def test_resolved_url_is_shared_through_the_cache_file_until_its_ttl(tmp_path):
+    path = str(tmp_path / "endpoint.json")
+    first = FakeHosts(a="ok")
+    _client(first, _EndpointCache(path=path, ttl=0.2), "a")._ensure_base_url()
+
+    second = FakeHosts(a="ok")
+    assert _client(second, _EndpointCache(path=path, ttl=0.2), "a")._ensure_base_url() == "http://a"
+    assert second.probed == []  # another process skips discovery
+
+    time.sleep(0.25)
+    third = FakeHosts(a="ok")
+    _client(third, _EndpointCache(path=path, ttl=0.2), "a")._ensure_base_url()
+    assert third.probed == ["http://a"]
+
+
+def test_dead_hosts_expire_after_their_ttl(tmp_path):
+    cache = _EndpointCache(path=str(tmp_path / "endpoint.json"), dead_ttl=0.2)
+    cache.update("cfg", None, ["http://a", "http://b"])
+    assert sorted(cache.dead()) == ["http://a", "http://b"]
+    cache.update("cfg", "http://b", [])  # a host that answers again is no longer dead
+    assert cache.dead() == ["http://a"]
+    time.sleep(0.25)
+    assert cache.dead() == []
+
+
+def test_recently_dead_hosts_are_skipped_unless_nothing_else_is_left(cache):
+    cache.update("other", None, ["http://a"])
+    hosts = FakeHosts(a="ok", b="ok")
+    assert _client(hosts, cache, "a", "b")._ensure_base_url() == "http://b"
+    assert hosts.probed == ["http://b"]
+
+    only_dead = FakeHosts(a="ok")
+    assert _client(only_dead, cache, "a")._ensure_base_url() == "http://a"
+    assert only_dead.probed == ["http://a"]
+
+
+def test_no_healthy_host_marks_all_dead_and_raises(cache):
+    hosts = FakeHosts(a="dead", b="dead")
+    with pytest.raises(ConnectionError, match="Could not resolve"):
+        _client(hosts, cache, "a", "b")._ensure_base_url()
+    assert sorted(cache.dead()) == ["http://a", "http://b"]
+
+
+def test_connection_error_drops_the_url_and_resolves_again(cache, monkeypatch):
+    hosts = FakeHosts(a="ok", b="slow")
+    client = _client(hosts, cache, "a", "b", retries=1)
+    monkeypatch.setattr(client, "_sleep_backoff", lambda attempt: None)
+    assert client._ensure_base_url() == "http://a"
+
+    hosts.hosts["http://a"] = "dead"  # goes away after it was resolved
+    answer = client.call_chat("m", [{"role": "user", "content": "hi"}])
+
+    assert answer == "from http://b"
+    assert hosts.posted == ["http://a", "http://b"]
+    assert "http://a" in cache.dead()
+    assert cache.resolved(client._config_key()) == "http://b"
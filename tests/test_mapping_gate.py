@@ -0,0 +1,119 @@
+import ast
+import textwrap
+
+from utils import mapping_gate
+from utils.mapping_gate import GateStats, broken_modules, check_mapping, selenium_usages
+
+PAGE = textwrap.dedent('''
+    from playwright.sync_api import Page
+
+
+    class LoginPage:
+        def __init__(self, page: Page):
+            self.page = page
+''')
+
+TEST = textwrap.dedent('''
+    import json
+
+    import pytest
+    from pages.login_page import LoginPage
+
+
+    def test_login(page):
+        LoginPage(page)
+''')
+
+
+def test_clean_mapping_passes():
+    assert check_mapping({"pages/login_page": PAGE, "tests/test_login": TEST}) == []
+
+
+def test_missing_page_module_and_name():
+    assert check_mapping({"tests/test_login": TEST}) == [
+        "tests/test_login: import pages.login_page does not resolve (line 5)",
+    ]
+    other = PAGE.replace("class LoginPage", "class SignInPage")
+    assert check_mapping({"pages/login_page": other, "tests/test_login": TEST}) == [
+        "tests/test_login: pages.login_page has no LoginPage (line 5)",
+    ]
+
+
+def test_page_module_on_disk_resolves(tmp_path):
+    (tmp_path / "pages").mkdir()
+    (tmp_path / "pages/login_page.py").write_text(PAGE)
+    assert check_mapping({"tests/test_login": TEST}, out_dir=tmp_path) == []
+
+
+def test_from_package_import_submodule(tmp_path):
+    test = "from pages import login_page\n\n\ndef test_login(page):\n    login_page.LoginPage(page)\n"
+    assert check_mapping({"pages/login_page": PAGE, "tests/test_login": test}) == []
+    assert broken_modules({"pages/login_page": PAGE, "tests/test_login": test}) == {}
+
+    (tmp_path / "pages").mkdir()
+    (tmp_path / "pages/login_page.py").write_text(PAGE)
+    assert check_mapping({"tests/test_login": test}, out_dir=tmp_path) == []
+
+    assert check_mapping({"tests/test_login": test}) == [
+        "tests/test_login: import pages does not resolve (line 1)",
+    ]
+    both = "from pages import login_page, signup_page\n"
+    assert check_mapping({"pages/login_page": PAGE, "tests/test_login": both}) == [
+        "tests/test_login: pages has no signup_page (line 1)",
+    ]
+
+
+def test_third_party_imports_need_the_allowlist_or_the_project(tmp_path, monkeypatch):
+    mapping = {"tests/test_names": "import names\nimport pytest\n"}
+    assert check_mapping(mapping) == ["tests/test_names: unknown package names"]
+
+    (tmp_path / "names").mkdir()
+    assert check_mapping(mapping, out_dir=tmp_path) == []
+
+    monkeypatch.setattr(mapping_gate, "ALLOWED_PACKAGES", mapping_gate.ALLOWED_PACKAGES | {"names"})
+    assert check_mapping(mapping) == []
+
+
+def test_installed_packages_are_not_trusted():
+    # Installed here (pytest runs this), but not a dependency of converted code.
+    assert check_mapping({"tests/test_x": "import _pytest\n"}) == ["tests/test_x: unknown package _pytest"]
+
+
+def test_bad_keys_syntax_and_leftover_selenium():
+    problems = check_mapping({
+        "../evil": "x = 1\n",
+        "tests/test_a": "def f(:\n",
+        "tests/test_b": "from selenium.webdriver.common.by import By\nimport time\ntime.sleep(1)\n",
+    })
+    assert any(p.startswith("key ../evil") for p in problems)
+    assert "tests/test_a: syntax error line 1: invalid syntax" in problems
+    assert "tests/test_b: imports selenium.webdriver.common.by (line 1)" in problems
+    assert "tests/test_b: .sleep (line 3)" in problems
+
+
+def test_selenium_usages():
+    code = "driver.find_element_by_id('x').send_keys('a')\nWebDriverWait(d, 3)\nsleep(2)\n"
+    found = {what for _, what in selenium_usages(ast.parse(code))}
+    assert found == {"Selenium API .find_element_by_id", "Selenium API .send_keys", "Selenium name WebDriverWait",
+                     "sleep()"}
+
+
+def test_broken_modules_reports_only_load_failures():
+    broken = broken_modules({
+        "pages/login_page": PAGE,
+        "tests/test_login": TEST,
+        "tests/test_bad": "def f(:\n",
+        "tests/test_names": "import names\nfrom pages.missing import X\n",
+    })
+    assert set(broken) == {"tests/test_bad", "tests/test_names"}
+    assert broken["tests/test_bad"][0].startswith("SyntaxError line 1")
+    assert broken["tests/test_names"] == ["import pages.missing does not resolve (line 2)"]
+
+
+def test_gate_stats_reasons():
+    stats = GateStats()
+    stats.add([])
+    stats.add(["tests/x: Selenium API .send_keys (line 3)", "tests/y: Selenium API .send_keys (line 9)"])
+    snap = stats.snapshot()
+    assert (snap["checked"], snap["builder_skipped"], snap["skip_rate"]) == (2, 1, 0.5)
+    assert snap["top_reasons"] == [("Selenium API .send_keys", 2)]
@@ -0,0 +1,90 @@
+import ast
+import textwrap
+
+from utils.module_merge import merge_mappings, merge_modules
+
+
+def _src(text):
+    return textwrap.dedent(text).lstrip("\n")
+
+
+BASE = _src('''
+    from playwright.sync_api import Page
+
+
+    class LoginPage:
+        def __init__(self, page: Page):
+            self.page = page
+            self.user = page.locator("#user")
+
+        def open(self):
+            self.page.goto("/login")
+''')
+
+EXTRA = _src('''
+    import re
+    from playwright.sync_api import Page
+
+
+    class LoginPage:
+        def __init__(self, page: Page):
+            self.page = page
+            self.password = page.locator("#password")
+
+        def open(self):
+            self.page.goto("/login")
+
+        def submit(self):
+            self.page.click("button")
+
+
+    def helper():
+        return 1
+''')
+
+
+def _class_members(code, name):
+    cls = next(n for n in ast.parse(code).body if isinstance(n, ast.ClassDef) and n.name == name)
+    return [n.name for n in cls.body if isinstance(n, ast.FunctionDef)]
+
+
+def test_union_of_imports_methods_locators_and_functions():
+    merged, conflicts = merge_modules(BASE, EXTRA)
+    assert conflicts == []
+    ast.parse(merged)
+    assert merged.count("from playwright.sync_api import Page") == 1
+    assert "import re" in merged
+    assert _class_members(merged, "LoginPage") == ["__init__", "open", "submit"]
+    assert 'self.user = page.locator("#user")' in merged
+    assert 'self.password = page.locator("#password")' in merged
+    assert "def helper" in merged
+
+
+def test_conflicts_keep_the_base_definition():
+    other = BASE.replace('"#user"', '"#login"').replace('goto("/login")', 'goto("/signin")')
+    merged, conflicts = merge_modules(BASE, other)
+    assert sorted(conflicts) == ["LoginPage.__init__.user", "LoginPage.open"]
+    assert merged == BASE
+
+
+def test_init_with_different_arguments_clashes_whole():
+    other = BASE.replace("def __init__(self, page: Page):", "def __init__(self, page: Page, timeout=5):")
+    _, conflicts = merge_modules(BASE, other)
+    assert conflicts == ["LoginPage.__init__"]
+
+
+def test_same_module_merges_to_itself():
+    assert merge_modules(BASE, BASE) == (BASE, [])
+
+
+def test_merge_mappings_reports_per_key_and_survives_bad_code():
+    merged, conflicts = merge_mappings([
+        {"pages/login_page.py": BASE, "tests/test_a.py": "x = 1\n"},
+        {"pages/login_page.py": EXTRA, "tests/test_a.py": "x = 2\n"},
+        {"tests/test_b.py": "y = 1\n", "pages/login_page.py": "def broken(:\n"},
+    ])
+    assert set(merged) == {"pages/login_page.py", "tests/test_a.py", "tests/test_b.py"}
+    assert "def submit" in merged["pages/login_page.py"]
+    assert merged["tests/test_a.py"] == "x = 1\n"
+    assert conflicts["tests/test_a.py"] == ["x"]
+    assert conflicts["pages/login_page.py"] == ["<unparseable>"]
@@ -0,0 +1,168 @@
+import gzip
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")  # openai_llm builds its singleton at import
+
+from utils import openai_llm  # noqa: E402
+from utils.llm_metrics import LLMMetrics, estimate_cost  # noqa: E402
+from utils.rate_limiter import RateLimiter  # noqa: E402
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.lock = threading.Lock()
+        self.connections = set()
+        self.requests = []
+        self.usage = {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        payload = json.loads(body)
+        with self.server.lock:
+            self.server.connections.add(self.client_address)
+            self.server.requests.append((dict(self.headers), payload))
+        text = "echo:" + payload["messages"][-1]["content"]
+        if payload.get("stream"):
+            events = [{"choices": [{"delta": {"content": part}}]} for part in (text[:3], text[3:])]
+            events.append({"choices": [], "usage": self.server.usage})
+            data = "".join(f"data: {json.dumps(e)}\n\n" for e in events).encode() + b"data: [DONE]\n\n"
+            content_type = "text/event-stream"
+        else:
+            data = json.dumps({"choices": [{"message": {"content": text}}], "usage": self.server.usage}).encode()
+            content_type = "application/json"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    srv = _Server()
+    threading.Thread(target=srv.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def fresh(monkeypatch):
+    """A new process-wide session and zeroed counters, so tests don't see each other's traffic."""
+    monkeypatch.setattr(openai_llm, "_SESSION", None)
+    monkeypatch.setattr(openai_llm, "POOL_STATS", openai_llm._PoolStats())
+    monkeypatch.setattr(openai_llm, "USAGE_STATS", openai_llm._UsageStats())
+    metrics = LLMMetrics(directory=None, enabled=True)
+    monkeypatch.setattr(openai_llm, "llm_metrics", metrics)
+    return metrics
+
+
+def _client(server):
+    return openai_llm.OpenAIClient(
+        base=f"http://127.0.0.1:{server.server_address[1]}/v1",
+        limiter=RateLimiter(state_file="", enabled=False),
+    )
+
+
+def _ask(client, text):
+    return client.call_chat("gpt-4o-mini", [{"role": "user", "content": text}], retries=1)
+
+
+def test_clients_share_one_process_wide_session(fresh, server):
+    a, b = _client(server), _client(server)
+    assert a._session is b._session is openai_llm.get_session()
+    assert openai_llm.pool_stats()["transport"] == "requests"
+
+
+def test_sequential_calls_reuse_one_connection(fresh, server):
+    a, b = _client(server), _client(server)
+    for i in range(3):
+        assert _ask(a, f"a{i}") == f"echo:a{i}"
+        assert _ask(b, f"b{i}") == f"echo:b{i}"
+
+    stats = openai_llm.pool_stats()
+    assert (stats["requests"], stats["new_connections"], stats["reused_connections"]) == (6, 1, 5)
+    assert len(server.connections) == 1
+    assert server.requests[0][0]["Connection"] == "keep-alive"
+
+
+def test_concurrent_calls_count_every_new_connection(fresh, server):
+    client = _client(server)
+    start = threading.Barrier(4)
+
+    def worker(n):
+        start.wait()
+        for i in range(3):
+            _ask(client, f"t{n}-{i}")
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+
+    stats = openai_llm.pool_stats()
+    assert stats["requests"] == 12
+    assert stats["new_connections"] == len(server.connections) <= 4
+    assert stats["reused_connections"] == 12 - stats["new_connections"]
+
+
+def test_large_bodies_are_gzipped(fresh, server, monkeypatch):
+    monkeypatch.setattr(openai_llm, "GZIP_MIN_BYTES", 200)
+    client = _client(server)
+    _ask(client, "short")
+    _ask(client, "x" * 2000)
+
+    (small_headers, _), (big_headers, big_payload) = server.requests
+    assert "Content-Encoding" not in small_headers
+    assert big_headers["Content-Encoding"] == "gzip"
+    assert big_payload["messages"][0]["content"] == "x" * 2000
+    stats = openai_llm.pool_stats()
+    assert stats["bytes_sent"] < stats["bytes_raw"]
+
+
+def test_usage_stats_accumulate_cached_tokens():
+    stats = openai_llm._UsageStats()
+    stats.add({"prompt_tokens": 1000, "completion_tokens": 50, "prompt_tokens_details": {"cached_tokens": 768}})
+    stats.add({"prompt_tokens": 200, "completion_tokens": 10})  # no details: nothing cached
+    stats.add(None)
+    assert stats.snapshot() == {
+        "responses": 2, "prompt_tokens": 1200, "cached_tokens": 768, "cached_ratio": 0.64, "completion_tokens": 60,
+    }
+    assert openai_llm._UsageStats().snapshot()["cached_ratio"] == 0.0
+
+
+def test_cached_tokens_are_counted_for_plain_and_streamed_calls(fresh, server):
+    server.usage = {"prompt_tokens": 2048, "completion_tokens": 20, "total_tokens": 2068,
+                    "prompt_tokens_details": {"cached_tokens": 1024}}
+    client = _client(server)
+    assert _ask(client, "plain") == "echo:plain"
+    streamed = "".join(client.stream_chat("gpt-4o-mini", [{"role": "user", "content": "streamed"}], retries=1))
+    assert streamed == "echo:streamed"
+    assert server.requests[1][1]["stream_options"] == {"include_usage": True}
+
+    usage = openai_llm.usage_stats()
+    assert (usage["responses"], usage["prompt_tokens"], usage["cached_tokens"]) == (2, 4096, 2048)
+    assert usage["cached_ratio"] == 0.5
+
+    metrics = fresh
+    (row,) = metrics.summary()
+    assert (row["calls"], row["prompt_tokens"], row["cached_tokens"]) == (2, 4096, 2048)
+    assert row["cost_usd"] == round(2 * estimate_cost("gpt-4o-mini", 2048, 1024, 20), 4)
@@ -0,0 +1,88 @@
+import ast
+import threading
+
+from utils.page_merge import PARTS_DIR, PageMerge
+
+A = '''class LoginPage:
+    def __init__(self, page):
+        self.page = page
+        self.user = page.locator("#user")
+
+    def open(self):
+        self.page.goto("/login")
+'''
+
+B = '''class LoginPage:
+    def __init__(self, page):
+        self.page = page
+        self.password = page.locator("#password")
+
+    def open(self):
+        self.page.goto("/signin")
+
+    def submit(self):
+        self.page.click("button")
+'''
+
+
+def _methods(code):
+    cls = ast.parse(code).body[0]
+    return [n.name for n in cls.body if isinstance(n, ast.FunctionDef)]
+
+
+def test_parts_from_several_sources_are_merged(tmp_path):
+    pm = PageMerge()
+    pm.write(tmp_path, "pages/login_page", tmp_path / "src/a_test.py", A)
+    code = pm.write(tmp_path, "pages/login_page", tmp_path / "src/b_test.py", B)
+    assert (tmp_path / "pages/login_page.py").read_text() == code
+    assert _methods(code) == ["__init__", "open", "submit"]
+    assert '"#user"' in code and '"#password"' in code
+    assert 'goto("/login")' in code  # a_test.py sorts first, so its open() is kept
+    assert pm.stats()["conflicts"] == 1
+
+
+def test_result_does_not_depend_on_write_order(tmp_path):
+    first, second = PageMerge(), PageMerge()
+    a, b = tmp_path / "src/a_test.py", tmp_path / "src/b_test.py"
+    first.write(tmp_path / "x", "pages/p", a, A)
+    one = first.write(tmp_path / "x", "pages/p", b, B)
+    second.write(tmp_path / "y", "pages/p", b, B)
+    two = second.write(tmp_path / "y", "pages/p", a, A)
+    assert one == two
+
+
+def test_reconverting_a_source_replaces_only_its_part(tmp_path):
+    pm = PageMerge()
+    a, b = tmp_path / "a.py", tmp_path / "b.py"
+    pm.write(tmp_path, "pages/p", a, A)
+    pm.write(tmp_path, "pages/p", b, B)
+    code = pm.write(tmp_path, "pages/p", b, B.replace("def submit", "def send"))
+    assert _methods(code) == ["__init__", "open", "send"]
+
+
+def test_retain_drops_parts_and_recomposes(tmp_path):
+    pm = PageMerge()
+    a, b = tmp_path / "a.py", tmp_path / "b.py"
+    pm.write(tmp_path, "pages/p", a, A)
+    pm.write(tmp_path, "pages/p", b, B)
+    pm.write(tmp_path, "pages/only_b", b, B)
+    assert pm.retain(tmp_path, b, ["pages/only_b.py"]) == ["pages/p"]
+    assert (tmp_path / "pages/p.py").read_text() == A
+    assert pm.retain(tmp_path, b, []) == ["pages/only_b"]
+    assert not any((tmp_path / PARTS_DIR / "pages/only_b").glob("*.json"))
+
+
+def test_concurrent_writers_lose_nothing(tmp_path):
+    pm = PageMerge()
+    threads = [
+        threading.Thread(target=pm.write, args=(
+            tmp_path, "pages/p", tmp_path / f"src_{i:02d}.py",
+            f"class P:\n    def m{i}(self):\n        return {i}\n",
+        ))
+        for i in range(20)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    assert sorted(_methods((tmp_path / "pages/p.py").read_text())) == sorted(f"m{i}" for i in range(20))
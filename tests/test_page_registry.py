@@ -0,0 +1,108 @@
+import multiprocessing
+import textwrap
+
+import pytest
+
+from utils.page_registry import PageRegistry, class_signatures, imported_modules, is_page_source
+
+PAGE = textwrap.dedent('''
+    class LoginPage(BasePage):
+        def __init__(self, page):
+            self.page = page
+
+        def login(self, user: str, password: str) -> None:
+            pass
+
+        async def wait_ready(self):
+            pass
+
+        def _helper(self):
+            pass
+''')
+
+TEST = "from login.LoginPage import LoginPage\n\ndef test_login(page):\n    LoginPage(page)\n"
+
+
+def test_page_source_detection():
+    assert is_page_source(PAGE)
+    assert not is_page_source(TEST)
+    assert not is_page_source("import unittest\nclass T(unittest.TestCase):\n    pass\n")
+    assert not is_page_source("def broken(:\n")
+
+
+def test_signatures_keep_the_public_api():
+    assert class_signatures(PAGE) == {"LoginPage": [
+        "class LoginPage(BasePage):",
+        "def __init__(self, page)",
+        "def login(self, user: str, password: str) -> None",
+        "async def wait_ready(self)",
+    ]}
+
+
+def test_imported_modules():
+    assert imported_modules(TEST) == (["LoginPage"], ["LoginPage"])
+    assert imported_modules("import a.b.c\n") == (["c"], [])
+
+
+def test_context_reaches_importers_only(tmp_path):
+    reg = PageRegistry(tmp_path)
+    page_src = tmp_path / "src/login/LoginPage.py"
+    reg.register(page_src, {"pages/login_page": PAGE, "tests/test_x": "x = 1\n"})
+    context = reg.context_for(tmp_path / "src/login/test_login.py", TEST)
+    assert context.startswith("# pages/login_page (from LoginPage.py)\nclass LoginPage(BasePage):")
+    assert "def login(self, user: str, password: str) -> None" in context
+    assert reg.context_for(page_src, TEST) == ""  # not its own context
+    assert reg.context_for(tmp_path / "other.py", "import os\n") == ""
+    assert reg.stats()["contexts_given"] == 1
+    reg.context_for(tmp_path / "t.py", TEST, count=False)
+    assert reg.stats()["contexts_given"] == 1
+
+
+def test_protect_keeps_other_sources_off_owned_keys(tmp_path):
+    reg = PageRegistry(tmp_path)
+    reg.register(tmp_path / "LoginPage.py", {"pages/login_page": PAGE})
+    kept = reg.protect(tmp_path / "test_login.py", {"pages/login_page": "x = 1\n", "tests/test_login": TEST})
+    assert list(kept) == ["tests/test_login"]
+    assert reg.protect(tmp_path / "LoginPage.py", {"pages/login_page": PAGE}) == {"pages/login_page": PAGE}
+    assert reg.stats()["keys_protected"] == 1
+
+
+def test_forget_and_reload(tmp_path):
+    src = tmp_path / "LoginPage.py"
+    PageRegistry(tmp_path).register(src, {"pages/login_page": PAGE})
+    reg = PageRegistry(tmp_path)  # loaded from .page_registry.json
+    assert reg.stats()["pages"] == 1
+    assert reg.forget(src) is True
+    assert reg.forget(src) is False
+    assert PageRegistry(tmp_path).stats()["pages"] == 0
+    assert reg.protect(tmp_path / "t.py", {"pages/login_page": "x = 1\n"}) == {"pages/login_page": "x = 1\n"}
+
+
+def test_registries_of_one_output_see_each_other(tmp_path):
+    a, b = PageRegistry(tmp_path), PageRegistry(tmp_path)
+    a.register(tmp_path / "LoginPage.py", {"pages/login_page": PAGE})
+    b.register(tmp_path / "HomePage.py", {"pages/home_page": "class HomePage:\n    pass\n"})
+    assert a.stats()["pages"] == b.stats()["pages"] == 2
+    # b did not load LoginPage.py at start, but protects its keys and hands out its signatures.
+    assert b.protect(tmp_path / "test_login.py", {"pages/login_page": "x = 1\n"}) == {}
+    assert "class LoginPage(BasePage):" in b.context_for(tmp_path / "test_login.py", TEST)
+    assert b.forget(tmp_path / "LoginPage.py") is True
+    assert a.stats()["pages"] == 1
+
+
+def _register_many(out_dir, worker, n):
+    reg = PageRegistry(out_dir)
+    for i in range(n):
+        reg.register(out_dir / f"W{worker}Page{i}.py", {f"pages/w{worker}_page{i}": PAGE})
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_processes_registering_at_once_lose_nothing(tmp_path):
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_register_many, args=(tmp_path, w, 15)) for w in range(4)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join(30)
+        assert proc.exitcode == 0
+    assert PageRegistry(tmp_path).stats()["pages"] == 60
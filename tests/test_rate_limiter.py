@@ -0,0 +1,85 @@
+import pytest
+
+from utils import rate_limiter as rl
+from utils.rate_limiter import RateLimiter, estimate_tokens, parse_duration, retry_after_seconds
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Records sleeps and advances the limiter's clock by them instead of waiting."""
+    clock = {"now": 1_000.0}
+    slept = []
+
+    def fake_sleep(s):
+        slept.append(s)
+        clock["now"] += s
+
+    monkeypatch.setattr(rl.time, "time", lambda: clock["now"])
+    monkeypatch.setattr(rl.time, "sleep", fake_sleep)
+    return slept
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("1s", 1.0), ("6m0s", 360.0), ("20ms", 0.02), ("1h2m3.5s", 3723.5), ("2.5", 2.5),
+    ("", None), (None, None), ("soon", None),
+])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == seconds
+
+
+def test_retry_after_prefers_milliseconds():
+    assert retry_after_seconds({"retry-after-ms": "250", "retry-after": "9"}) == 0.25
+    assert retry_after_seconds({"retry-after": "3"}) == 3.0
+    assert retry_after_seconds({}) is None
+
+
+def test_estimate_tokens_counts_prompt_and_budget():
+    assert estimate_tokens([{"content": "x" * 400}, {"content": None}], 100) == 200
+
+
+def test_unknown_quota_never_blocks(sleeps):
+    limiter = RateLimiter(rpm=0, tpm=0, state_file="", enabled=True)
+    for _ in range(100):
+        assert limiter.acquire("m", 10_000) == 0.0
+    assert sleeps == []
+
+
+def test_request_bucket_waits_for_refill(sleeps):
+    limiter = RateLimiter(rpm=60, tpm=0, state_file="", enabled=True)
+    for _ in range(60):
+        limiter.acquire("m", 1)
+    assert sleeps == []
+    assert limiter.acquire("m", 1) == pytest.approx(1.0)
+
+
+def test_headers_teach_and_clamp_quota(sleeps):
+    limiter = RateLimiter(rpm=0, tpm=0, state_file="", enabled=True)
+    limiter.update_from_headers("m", {
+        "x-ratelimit-limit-requests": "60", "x-ratelimit-limit-tokens": "1000",
+        "x-ratelimit-remaining-tokens": "0",
+    })
+    assert limiter.stats()["models"]["m"] == {"rpm": 60.0, "tpm": 1000.0}
+    assert limiter.acquire("m", 500) == pytest.approx(30.0, abs=0.1)
+
+
+def test_429_blocks_until_retry_after(sleeps):
+    limiter = RateLimiter(rpm=0, tpm=0, state_file="", enabled=True)
+    assert limiter.on_429("m", {"retry-after": "4"}, fallback_s=1.0) == 4.0
+    assert limiter.acquire("m", 1) == pytest.approx(4.0)
+    assert limiter.throttled_429 == 1
+
+
+def test_settle_refunds_unused_tokens(sleeps):
+    limiter = RateLimiter(rpm=0, tpm=100, state_file="", enabled=True)
+    limiter.acquire("m", 100)
+    limiter.settle("m", estimated=100, actual=40)
+    assert limiter.acquire("m", 60) == 0.0
+
+
+def test_state_file_is_shared_between_limiters(tmp_path, sleeps):
+    state = tmp_path / "limits.json"
+    first = RateLimiter(rpm=2, tpm=0, state_file=str(state), enabled=True)
+    second = RateLimiter(rpm=2, tpm=0, state_file=str(state), enabled=True)
+    first.acquire("m", 1)
+    first.acquire("m", 1)
+    assert second.acquire("m", 1) > 0
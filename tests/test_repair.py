@@ -0,0 +1,121 @@
+import json
+import os
+import re
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")  # openai_llm builds its singleton at import
+
+from agents import pom_converter_agent as pca  # noqa: E402
+from utils.llm_cache import LLMResponseCache  # noqa: E402
+from utils.mapping_gate import RepairStats  # noqa: E402
+
+PAGE = '''from playwright.sync_api import Page
+
+
+class LoginPage:
+    def __init__(self, page: Page):
+        self.page = page
+
+    def login(self, user: str) -> None:
+        self.page.locator("#user").fill(user)
+'''
+
+TEST = '''from pages.login_page import LoginPage
+
+
+def test_login(page):
+    LoginPage(page).login("me")
+'''
+
+
+class FakeLLM:
+    """Answers repair prompts from a script; records which files (and errors) each prompt asked about."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.asked = []
+
+    def call_chat(self, model, messages, **kwargs):
+        prompt = messages[1]["content"]  # system, user (, JSON-mode reminder)
+        files = re.search(r"=== BROKEN FILES \(JSON: key -> errors, code\) ===\n(.*)\n=== END ===", prompt, re.S)
+        self.asked.append(json.loads(files.group(1)))
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return json.dumps(reply)
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setattr(pca, "response_cache", LLMResponseCache(enabled=False))
+    monkeypatch.setattr(pca, "repair_stats", RepairStats())
+    a = pca.POMConverterAgent()
+    a.repair_rounds = 2
+    return a
+
+
+def _repair(agent, llm, mapping, tmp_path, monkeypatch):
+    monkeypatch.setattr(pca, "llm_client", llm)
+    return agent.repaired(tmp_path / "test_login.py", tmp_path / "out", mapping)
+
+
+def test_only_broken_files_go_back_with_their_errors(agent, tmp_path, monkeypatch):
+    llm = FakeLLM({"tests/test_login": TEST, "pages/login_page": "junk = ("})
+    mapping = _repair(agent, llm, {"pages/login_page": PAGE, "tests/test_login": "def test_login(page:\n"},
+                      tmp_path, monkeypatch)
+
+    (asked,) = llm.asked
+    assert list(asked) == ["tests/test_login"]
+    assert asked["tests/test_login"]["code"] == "def test_login(page:\n"
+    assert asked["tests/test_login"]["errors"][0].startswith("SyntaxError")
+    # The fixed file is taken; keys the repair was not asked for are ignored.
+    assert mapping == {"pages/login_page": PAGE, "tests/test_login": TEST}
+    assert pca.repair_stats.snapshot()["broken_files"] == 1
+    assert pca.repair_stats.snapshot()["repaired_files"] == 1
+    assert pca.repair_stats.snapshot()["rounds"] == 1
+
+
+def test_each_round_sees_the_errors_of_the_previous_answer(agent, tmp_path, monkeypatch):
+    llm = FakeLLM(
+        {"tests/test_login": "from pages.login_page import LogInPage\n"},
+        {"tests/test_login": TEST},
+    )
+    mapping = _repair(agent, llm, {"pages/login_page": PAGE, "tests/test_login": "def test_login(page:\n"},
+                      tmp_path, monkeypatch)
+
+    assert [a["tests/test_login"]["code"] for a in llm.asked] == [
+        "def test_login(page:\n", "from pages.login_page import LogInPage\n"
+    ]
+    assert "LogInPage" in " ".join(llm.asked[1]["tests/test_login"]["errors"])
+    assert mapping["tests/test_login"] == TEST
+    assert pca.repair_stats.snapshot()["rounds"] == 2
+
+
+def test_rounds_stop_at_the_limit_and_the_file_is_kept_as_is(agent, tmp_path, monkeypatch):
+    agent.repair_rounds = 3
+    still = {"tests/test_login": "def test_login(page:\n"}
+    llm = FakeLLM(RuntimeError("backend down"), still, still, still)
+    mapping = _repair(agent, llm, {"pages/login_page": PAGE, **still}, tmp_path, monkeypatch)
+
+    assert len(llm.asked) == 3 and llm.replies == [still]  # a failed call uses up its round
+    assert mapping["tests/test_login"] == still["tests/test_login"]
+    snap = pca.repair_stats.snapshot()
+    assert (snap["broken_files"], snap["repaired_files"], snap["rounds"]) == (1, 0, 3)
+
+
+def test_no_rounds_means_no_check_and_no_call(agent, tmp_path, monkeypatch):
+    agent.repair_rounds = 0
+    llm = FakeLLM()
+    mapping = {"tests/test_login": "def test_login(page:\n"}
+    assert _repair(agent, llm, dict(mapping), tmp_path, monkeypatch) == mapping
+    assert llm.asked == []
+    assert pca.repair_stats.snapshot()["broken_files"] == 0
+
+
+def test_sound_mapping_makes_no_call(agent, tmp_path, monkeypatch):
+    llm = FakeLLM()
+    mapping = {"pages/login_page": PAGE, "tests/test_login": TEST}
+    assert _repair(agent, llm, dict(mapping), tmp_path, monkeypatch) == mapping
+    assert llm.asked == []
+    assert pca.repair_stats.snapshot()["checked"] == 1
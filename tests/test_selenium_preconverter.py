@@ -0,0 +1,193 @@
+import textwrap
+
+from agents.selenium_preconverter import preconvert
+
+
+def _pre(code):
+    return preconvert(textwrap.dedent(code).lstrip("\n"))
+
+
+def test_locators_input_and_navigation():
+    result = _pre('''
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.common.keys import Keys
+
+
+        def test_search(driver):
+            driver.get("https://example.test")
+            box = driver.find_element(By.NAME, "q")
+            box.clear()
+            box.send_keys("playwright")
+            box.send_keys(Keys.ENTER)
+            assert "Results" in driver.title
+            assert driver.find_element(By.ID, "stats").is_displayed()
+    ''')
+    assert result.code == textwrap.dedent('''\
+        def test_search(page):
+            page.goto('https://example.test')
+            box = page.locator('[name="q"]')
+            box.fill('playwright')
+            box.press('Enter')
+            assert 'Results' in page.title()
+            assert page.locator('#stats').is_visible()
+    ''')
+    assert result.complete
+    assert result.rewrites["find_element"] == 2
+    assert result.rewrites["send_keys -> press"] == 1
+    assert result.rewrites["clear + send_keys -> fill"] == 1
+
+
+def test_send_keys_without_clear_appends_and_is_left_for_the_model():
+    result = _pre('''
+        def test_append(driver):
+            box = driver.find_element(By.ID, "q")
+            box.send_keys("more")
+            box.clear()
+            box.send_keys(Keys.ENTER)
+            other = driver.find_element(By.ID, "o")
+            box.clear()
+            other.send_keys("x")
+    ''')
+    assert result.code.splitlines()[2:] == [
+        '    box.send_keys("more")',
+        "    box.clear()",
+        "    box.press('Enter')",
+        "    other = page.locator('#o')",
+        "    box.clear()",
+        '    other.send_keys("x")',
+    ]
+    assert "clear + send_keys -> fill" not in result.rewrites
+    assert not result.complete
+    assert {what for _, what in result.leftovers} >= {"Selenium API .send_keys"}
+
+
+def test_comments_and_layout_outside_changed_statements_are_kept():
+    result = _pre('''
+        # Login flow.
+        import time
+
+
+        def test_login(driver):  # uses the driver fixture
+            # open the form
+            driver.get("https://x.test")  # home
+            time.sleep(1)  # let it settle
+
+            if driver.title == "x":
+                pass
+            elif driver.current_url:  # moved
+                time.sleep(2)
+            assert "Welcome" in driver.title  # greeting
+    ''')
+    assert result.code == textwrap.dedent('''\
+        # Login flow.
+
+
+        def test_login(page):  # uses the driver fixture
+            # open the form
+            page.goto('https://x.test')  # home
+            # let it settle
+
+            if page.title() == 'x':
+                pass
+            elif page.url:  # moved
+                pass
+            assert 'Welcome' in page.title()  # greeting
+    ''')
+    assert result.complete
+
+
+def test_a_rewrite_that_would_drop_comments_is_left_to_the_model():
+    code = 'def test_x(driver):\n    # two on one line\n    driver.get("x"); driver.refresh()\n'
+    result = preconvert(code)
+    assert result.code == code and result.rewrites == {}
+    assert not result.complete
+    assert (0, "1 comment(s) lost by the rewrite") in result.leftovers
+
+
+def test_selector_templates():
+    result = _pre('''
+        def test_x(driver):
+            driver.find_element(By.ID, "1st")
+            driver.find_element(By.XPATH, "//a")
+            driver.find_element(By.CLASS_NAME, "btn")
+            driver.find_element(By.LINK_TEXT, 'Say "hi"')
+            driver.find_elements(By.CSS_SELECTOR, "li")
+            driver.find_element(By.ID, f"row-{n}")
+    ''')
+    lines = result.code.splitlines()[1:]
+    assert lines == [
+        "    page.locator('[id=\"1st\"]')",
+        "    page.locator('xpath=//a')",
+        "    page.locator('.btn')",
+        "    page.locator('a:text-is(\"Say \\\\\"hi\\\\\"\")')",
+        "    page.locator('li').all()",
+        "    page.locator(f'[id=\"row-{n}\"]')",
+    ]
+
+
+def test_waits_become_locator_waits_and_sleeps_go():
+    result = _pre('''
+        import time
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.common.by import By
+
+
+        class LoginPage:
+            def __init__(self, driver):
+                self.driver = driver
+
+            def wait_ready(self):
+                WebDriverWait(self.driver, 5).until(EC.visibility_of_element_located((By.ID, "form")))
+                time.sleep(2)
+                WebDriverWait(self.driver, 10).until(EC.url_contains("/home"))
+
+            def banner(self):
+                return WebDriverWait(self.driver, 3).until(EC.element_to_be_clickable((By.CSS_SELECTOR, ".b")))
+
+            def pause(self):
+                time.sleep(1)
+    ''')
+    code = result.code
+    assert "import" not in code
+    assert "self.page.locator('#form').wait_for(state='visible', timeout=5000)" in code
+    assert "self.page.wait_for_url(lambda url: '/home' in url, timeout=10000)" in code
+    assert "return self.page.locator('.b')" in code
+    assert "def pause(self):\n        pass" in code
+    assert result.complete
+
+
+def test_text_wait_imports_expect():
+    result = _pre('''
+        """Checks the greeting."""
+        from selenium.webdriver.common.by import By
+
+
+        def test_greeting(driver, wait):
+            WebDriverWait(driver, 2).until(EC.text_to_be_present_in_element((By.ID, "hi"), "Hello"))
+    ''')
+    assert result.code.splitlines()[:2] == ['"""Checks the greeting."""', "from playwright.sync_api import expect"]
+    assert "expect(page.locator('#hi')).to_contain_text('Hello', timeout=2000)" in result.code
+
+
+def test_untouched_and_leftover_code():
+    plain = "# nothing to do\nx = 1\n"
+    assert _pre(plain).code == plain and _pre(plain).rewrites == {}
+
+    result = _pre('''
+        import unittest
+
+
+        class T(unittest.TestCase):
+            def test_a(self):
+                self.driver.execute_script("return 1")
+    ''')
+    assert "self.page.execute_script" in result.code
+    assert not result.complete
+    assert {what for _, what in result.leftovers} == {"Selenium API .execute_script", "unittest class T"}
+
+
+def test_syntax_error_is_reported_not_raised():
+    result = _pre("def broken(:\n")
+    assert result.code == "def broken(:\n"
+    assert result.leftovers[0][1].startswith("syntax error")
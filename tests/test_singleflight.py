@@ -0,0 +1,114 @@
+import asyncio
+import threading
+
+import pytest
+
+from utils.singleflight import SingleFlight, request_key
+
+
+def test_request_key_ignores_transport_knobs():
+    messages = [{"role": "user", "content": "hi"}]
+    key = request_key("m", messages, max_tokens=10)
+    assert key == request_key("m", messages, max_tokens=10, timeout_s=5, retries=3)
+    assert key != request_key("m", messages, max_tokens=10, temperature=0.2)
+    assert key != request_key("m", messages, max_tokens=10, json_mode=True)
+
+
+def _run_concurrently(flight, key, fn, n):
+    results, errors = [], []
+    start = threading.Barrier(n)
+
+    def worker():
+        start.wait()
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    return results, errors
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight(enabled=True)
+    release = threading.Event()
+    runs = []
+
+    def fn():
+        runs.append(1)
+        release.wait(5)
+        return "answer"
+
+    threading.Timer(0.2, release.set).start()
+    results, errors = _run_concurrently(flight, "k", fn, 8)
+    assert (results, errors, len(runs)) == (["answer"] * 8, [], 1)
+    stats = flight.stats()
+    assert (stats["calls"], stats["coalesced"], stats["in_flight"]) == (1, 7, 0)
+
+
+def test_waiters_get_the_leaders_exception():
+    flight = SingleFlight(enabled=True)
+    release = threading.Event()
+
+    def fn():
+        release.wait(5)
+        raise RuntimeError("upstream 500")
+
+    threading.Timer(0.2, release.set).start()
+    results, errors = _run_concurrently(flight, "k", fn, 4)
+    assert results == [] and len(errors) == 4
+    assert all(str(e) == "upstream 500" for e in errors)
+
+
+def test_nothing_is_remembered_after_completion():
+    flight = SingleFlight(enabled=True)
+    assert flight.do("k", lambda: 1) == 1
+    assert flight.do("k", lambda: 2) == 2
+    assert flight.stats()["coalesced"] == 0
+
+
+def test_async_callers_share_one_task():
+    flight = SingleFlight(enabled=True)
+    runs = []
+
+    async def call():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*(flight.ado("k", call) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["answer"] * 5
+    assert len(runs) == 1
+
+
+def test_shared_task_survives_until_the_last_caller_cancels():
+    flight = SingleFlight(enabled=True)
+    finished = []
+
+    async def call():
+        await asyncio.sleep(0.1)
+        finished.append(1)
+        return "answer"
+
+    async def main():
+        first = asyncio.ensure_future(flight.ado("k", call))
+        second = asyncio.ensure_future(flight.ado("k", call))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "answer"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+        third = asyncio.ensure_future(flight.ado("k2", call))
+        await asyncio.sleep(0.01)
+        third.cancel()
+        await asyncio.sleep(0.15)
+
+    asyncio.run(main())
+    assert finished == [1]  # k2's call was cancelled with its only caller
@@ -0,0 +1,73 @@
+import ast
+import textwrap
+
+from utils.source_chunker import count_tokens, split_source
+
+SUITE = textwrap.dedent('''
+    import unittest
+    from selenium import webdriver
+
+    BASE_URL = "https://example.test"
+
+
+    class LoginTests(unittest.TestCase):
+        def setUp(self):
+            self.driver = webdriver.Chrome()
+
+        def _login(self, user):
+            self.driver.get(BASE_URL + "/login?u=" + user)
+
+        def test_valid(self):
+            self._login("alice")
+
+        def test_invalid(self):
+            self._login("mallory")
+
+        @unittest.skip("flaky")
+        def test_locked(self):
+            self._login("bob")
+''')
+
+
+def test_small_file_is_one_chunk():
+    chunks = split_source(SUITE, max_tokens=10_000)
+    assert len(chunks) == 1
+    assert chunks[0].code == SUITE
+    assert chunks[0].tokens == count_tokens(SUITE)
+
+
+def test_fan_out_gives_one_test_per_chunk_with_shared_members():
+    chunks = split_source(SUITE, max_tokens=10_000, fanout_min=3)
+    assert [c.units for c in chunks] == [["test_valid"], ["test_invalid"], ["test_locked"]]
+    for c in chunks:
+        ast.parse(c.code)  # each chunk is a self-contained module
+        assert (c.index, c.total) == (chunks.index(c), 3)
+        assert "BASE_URL =" in c.code and "def setUp" in c.code and "def _login" in c.code
+    assert '@unittest.skip("flaky")' in chunks[2].code
+
+
+def test_fan_out_threshold_not_reached():
+    assert len(split_source(SUITE, max_tokens=10_000, fanout_min=4)) == 1
+
+
+def test_token_budget_groups_methods():
+    base = split_source(SUITE, max_tokens=1)
+    assert [c.units for c in base] == [["test_valid"], ["test_invalid"], ["test_locked"]]
+    roomy = split_source(SUITE, max_tokens=count_tokens(SUITE) - 1)
+    assert sum((c.units for c in roomy), []) == ["test_valid", "test_invalid", "test_locked"]
+
+
+def test_unparsable_source_is_not_split():
+    code = "def broken(:\n" + "x = 1\n" * 500
+    chunks = split_source(code, max_tokens=10)
+    assert len(chunks) == 1 and chunks[0].code == code
+
+
+def test_page_objects_split_on_public_methods():
+    page = "class Page:\n" + "".join(
+        f"    def action_{i}(self):\n        return {i}\n\n    def _helper_{i}(self):\n        pass\n\n"
+        for i in range(3)
+    )
+    chunks = split_source(page, max_tokens=1)
+    assert [c.units for c in chunks] == [["action_0"], ["action_1"], ["action_2"]]
+    assert all("_helper_2" in c.code for c in chunks)
@@ -0,0 +1,133 @@
+import json
+import subprocess
+import sys
+import threading
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+from tools import bench_convert
+from tools.llm_standin_server import Faults, Recordings, make_server
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SOURCE = '''class LoginPage:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def login(self, user):
+        pass
+'''
+
+ANALYZER = {
+    "model": "standin",
+    "messages": [{"role": "user", "content": f"Filename: login_page.py\n=== INPUT CODE START ===\n{SOURCE}\n=== INPUT CODE END ===\n"}],
+}
+
+
+@pytest.fixture
+def standin():
+    servers = []
+
+    def start(**kwargs):
+        srv = make_server("127.0.0.1", 0, batch_delay_s=0.0, **kwargs)
+        threading.Thread(target=srv.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        servers.append(srv)
+        return f"http://127.0.0.1:{srv.server_address[1]}/v1"
+
+    yield start
+    for srv in servers:
+        srv.shutdown()
+        srv.server_close()
+
+
+def _post(base, body):
+    req = urllib.request.Request(f"{base}/chat/completions", data=json.dumps(body).encode(),
+                                 headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=10) as r:
+            return r.status, dict(r.headers), r.read().decode()
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers), e.read().decode()
+
+
+def _content(raw):
+    return json.loads(raw)["choices"][0]["message"]["content"]
+
+
+def test_analyzer_prompt_gets_a_deterministic_file_map(standin):
+    base = standin()
+    status, _, raw = _post(base, ANALYZER)
+    assert status == 200
+    mapping = json.loads(_content(raw))
+    assert any(k.startswith("pages/") for k in mapping)
+    assert "class LoginPage" in "".join(mapping.values()) and "def login" in "".join(mapping.values())
+    assert _content(_post(base, ANALYZER)[2]) == _content(raw)
+    assert json.loads(raw)["usage"]["prompt_tokens"] > 0
+
+
+def test_stream_reassembles_to_the_plain_answer_with_usage(standin):
+    base = standin()
+    plain = _content(_post(base, ANALYZER)[2])
+    status, headers, raw = _post(base, {**ANALYZER, "stream": True, "stream_options": {"include_usage": True}})
+    assert status == 200 and headers["Content-Type"] == "text/event-stream"
+    events = [json.loads(line[6:]) for line in raw.splitlines() if line.startswith("data: {")]
+    assert "".join(e["choices"][0]["delta"].get("content", "") for e in events if e["choices"]) == plain
+    assert events[-1]["usage"]["completion_tokens"] > 0
+    assert raw.rstrip().endswith("data: [DONE]")
+
+
+@pytest.mark.parametrize("faults, status", [(Faults(error_rate=1.0), 500), (Faults(rate_429=1.0), 429)])
+def test_fault_injection(standin, faults, status):
+    code, headers, _ = _post(standin(faults=faults), ANALYZER)
+    assert code == status
+    if status == 429:
+        assert headers["Retry-After"] == "1"
+
+
+def test_record_then_strict_replay(standin, tmp_path):
+    path = str(tmp_path / "rec.jsonl")
+    upstream = standin()
+    recorder = standin(record=Recordings(path), upstream=upstream)
+    recorded = _content(_post(recorder, ANALYZER)[2])
+    assert len(Path(path).read_text(encoding="utf-8").splitlines()) == 1
+
+    replay = standin(replay=Recordings(path), strict_replay=True)
+    assert _content(_post(replay, ANALYZER)[2]) == recorded
+    other = {**ANALYZER, "model": "other"}
+    assert _post(replay, other)[0] == 404
+
+
+def test_summarize_reports_throughput_tokens_and_stage_percentiles():
+    records = [
+        {"agent": "pom_converter", "stage": "analyzer", "wall_s": w, "ok": True, "prompt_tokens": 100, "completion_tokens": 50}
+        for w in (1.0, 2.0, 3.0)
+    ] + [{"agent": "pom_converter", "stage": "builder", "wall_s": 4.0, "ok": False, "prompt_tokens": 0, "completion_tokens": 0}]
+    summary = bench_convert.summarize(records, files=3, wall_s=30.0)
+    assert (summary["files_per_min"], summary["llm_calls"], summary["llm_errors"]) == (6.0, 4, 1)
+    assert summary["tokens_per_file"] == 150.0
+    assert summary["stages"]["pom_converter/analyzer"] == {"calls": 3, "p50_s": 2.0, "p95_s": 2.9}
+    assert summary["stages"]["pom_converter/builder"]["calls"] == 1
+
+
+def test_make_corpus_pairs_pages_with_tests(tmp_path):
+    paths = bench_convert.make_corpus(tmp_path, files=4, methods=3)
+    assert sorted(p.name for p in paths) == ["Screen0Page.py", "Screen1Page.py", "test_screen0.py", "test_screen1.py"]
+    assert (tmp_path / "test_screen1.py").read_text(encoding="utf-8").count("def test_") == 3
+
+
+def test_bench_smoke(tmp_path):
+    out = tmp_path / "bench.json"
+    proc = subprocess.run(
+        [sys.executable, str(ROOT / "tools" / "bench_convert.py"), "--files", "2", "--methods", "2",
+         "--latency-ms", "0", "--jitter-ms", "0", "--json", str(out)],
+        cwd=ROOT, capture_output=True, text=True, timeout=120,
+    )
+    assert proc.returncode == 0, proc.stdout[-2000:] + proc.stderr[-2000:]
+    (run,) = json.loads(out.read_text(encoding="utf-8"))["runs"]
+    assert (run["files"], run["failed_files"], run["llm_errors"]) == (2, 0, 0)
+    assert run["llm_calls"] >= 2 and run["files_per_min"] > 0 and run["tokens_per_file"] > 0
+    assert "pom_converter/analyzer" in run["stages"]
+    assert "files/min" in proc.stdout
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from utils.streaming import FileMapStreamParser, StreamAborted, delta_content, iter_sse_data
+
+FILE_MAP = {
+    "pages/login_page.py": 'class LoginPage:\n    URL = "https://x/\\"q\\""\n',
+    "tests/test_login.py": "def test_login(page):\n\tpass  # é \\ {}\n",
+}
+
+
+def _feed(text, size, **callbacks):
+    parser = FileMapStreamParser(**callbacks)
+    for i in range(0, len(text), size):
+        parser.feed(text[i:i + size])
+    return parser
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 10_000])
+def test_any_chunking_gives_the_json_result(size):
+    text = "```json\n" + json.dumps(FILE_MAP, indent=1) + "\n```"
+    assert _feed(text, size).close() == FILE_MAP
+
+
+def test_entries_fire_as_soon_as_each_value_closes():
+    seen = []
+    text = json.dumps(FILE_MAP)
+    cut = text.index('", "tests/') + 1
+    parser = FileMapStreamParser(on_entry=lambda k, v: seen.append(k))
+    parser.feed(text[:cut])
+    assert seen == ["pages/login_page.py"]
+    parser.feed(text[cut:])
+    assert seen == list(FILE_MAP)
+
+
+def test_on_key_can_abort_before_the_value_arrives():
+    def on_key(key):
+        if key.startswith("/"):
+            raise StreamAborted(key)
+
+    parser = FileMapStreamParser(on_key=on_key)
+    with pytest.raises(StreamAborted):
+        parser.feed('{"/etc/passwd": "')
+    assert parser.result == {}
+
+
+@pytest.mark.parametrize("text", ['{"a": 1}', '{"a" "x"}', '{"a": "x" "b"}', "{3: 4}"])
+def test_non_string_maps_are_rejected(text):
+    with pytest.raises(ValueError):
+        _feed(text, 1)
+
+
+def test_truncated_stream_does_not_close():
+    parser = _feed('{"a": "x", "b": "y', 4)
+    assert parser.result == {"a": "x"}
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+def test_sse_lines_until_done():
+    lines = [
+        b'data: {"choices": [{"delta": {"content": "{\\"a\\""}}]}',
+        "",
+        ": keep-alive",
+        "data: not json",
+        'data: {"choices": [{"delta": {}}]}',
+        "data: [DONE]",
+        'data: {"choices": [{"delta": {"content": "late"}}]}',
+    ]
+    assert [delta_content(e) for e in iter_sse_data(lines)] == ['{"a"', ""]
@@ -0,0 +1,84 @@
+from pathlib import Path
+
+import pytest
+
+from utils.suite_graph import SuiteGraph
+
+
+def _suite(root: Path, files: dict) -> dict:
+    paths = {}
+    for rel, code in files.items():
+        p = root / rel
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(code)
+        paths[rel] = p
+    return paths
+
+
+@pytest.fixture
+def suite(tmp_path):
+    return tmp_path, _suite(tmp_path, {
+        "pages/base.py": "import os\nclass Base:\n    pass\n" + "x = 1\n" * 200,
+        "pages/login.py": "from pages.base import Base\nclass Login(Base):\n    pass\n",
+        "flows/checkout.py": "from . import helpers\nimport LoginPage\n",
+        "flows/helpers.py": "import selenium\n",
+        "copied/LoginPage.py": "class LoginPage:\n    pass\n",
+        "tests/test_login.py": "from pages import login\nfrom flows.checkout import run\n",
+        "tests/test_misc.py": "import json\nimport pytest\n",
+    })
+
+
+def test_imports_resolve_by_path_suffix_and_stem(suite):
+    root, p = suite
+    g = SuiteGraph.build(p.values(), root)
+    assert g.deps[p["pages/login.py"]] == {p["pages/base.py"]}
+    assert g.deps[p["flows/checkout.py"]] == {p["flows/helpers.py"], p["copied/LoginPage.py"]}
+    assert g.deps[p["tests/test_login.py"]] == {p["pages/login.py"], p["flows/checkout.py"]}
+    assert g.deps[p["tests/test_misc.py"]] == set()
+    assert g.edges() == 5
+
+
+def test_order_respects_imports_and_starts_with_the_longest_chain(suite):
+    root, p = suite
+    g = SuiteGraph.build(p.values(), root)
+    order = g.order()
+    assert sorted(order) == sorted(p.values())
+    for f, deps in g.deps.items():
+        assert all(order.index(d) < order.index(f) for d in deps)
+    assert order[0] == p["pages/base.py"]  # heads the most expensive chain
+    path, seconds = g.critical_path()
+    assert path == [p["pages/base.py"], p["pages/login.py"], p["tests/test_login.py"]]
+    assert seconds == pytest.approx(sum(g.cost(f) for f in path))
+
+
+def test_ready_and_downstream(suite):
+    root, p = suite
+    g = SuiteGraph.build(p.values(), root)
+    done = {p["pages/base.py"]}
+    ready = g.ready(done, started=done)
+    assert p["pages/login.py"] in ready and p["tests/test_login.py"] not in ready
+    assert g.downstream([p["pages/base.py"]]) == {p["pages/login.py"], p["tests/test_login.py"]}
+    assert g.downstream([p["tests/test_misc.py"]]) == set()
+
+
+def test_estimate_with_more_workers(suite):
+    root, p = suite
+    g = SuiteGraph.build(p.values(), root, s_per_token=0.01)
+    one, many = g.estimate(1), g.estimate(8)
+    assert one == pytest.approx(sum(g.cost(f) for f in g.files))
+    assert many == pytest.approx(g.critical_path()[1])
+    assert many < one
+
+
+def test_cycles_are_broken(tmp_path):
+    p = _suite(tmp_path, {"a.py": "import b\n", "b.py": "import c\n", "c.py": "import a\n"})
+    g = SuiteGraph.build(p.values(), tmp_path)
+    assert g.cycles == [(p["c.py"], p["a.py"])]
+    assert len(g.order()) == 3
+
+
+def test_unparsable_file_has_no_deps(tmp_path):
+    p = _suite(tmp_path, {"a.py": "def broken(:\n", "b.py": "import a\n"})
+    g = SuiteGraph.build(p.values(), tmp_path)
+    assert g.deps[p["a.py"]] == set()
+    assert g.order() == [p["a.py"], p["b.py"]]
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+End-to-end conversion benchmark that needs no live model.
+
+Generates a synthetic Selenium corpus (page objects + tests), starts
+tools/llm_standin_server.py with the requested latency / fault profile, runs
+tools/convert_selenium_once.py over the corpus and reports files per minute,
+tokens per file and p50/p95 latency per LLM stage (from the run's
+utils.llm_metrics JSONL).
+
+    python tools/bench_convert.py --files 20 --methods 8 --latency-ms 400 --jitter-ms 200 --ms-per-token 2
+    python tools/bench_convert.py --replay recordings.jsonl --in selenium_tests/login
+    python tools/bench_convert.py --files 40 --json bench.json -- --no-cache
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PAGE_TEMPLATE = '''from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+
+class {cls}:
+    URL = "https://example.test/{slug}"
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.wait = WebDriverWait(driver, 10)
+
+    def open(self):
+        self.driver.get(self.URL)
+{methods}
+'''
+
+PAGE_METHOD = '''
+    def {name}(self, value="{name}"):
+        field = self.wait.until(EC.visibility_of_element_located((By.ID, "{slug}-{i}")))
+        field.clear()
+        field.send_keys(value)
+        self.driver.find_element(By.CSS_SELECTOR, "button[data-test='{slug}-{i}']").click()
+        return self.driver.find_element(By.CLASS_NAME, "status-{i}").text
+'''
+
+TEST_TEMPLATE = '''import time
+import unittest
+
+from selenium import webdriver
+
+from {module} import {cls}
+
+
+class Test{cls}(unittest.TestCase):
+    def setUp(self):
+        self.driver = webdriver.Chrome()
+        self.page = {cls}(self.driver)
+        self.page.open()
+
+    def tearDown(self):
+        self.driver.quit()
+{methods}
+'''
+
+TEST_METHOD = '''
+    def test_{name}(self):
+        status = self.page.{name}("value-{i}")
+        time.sleep(1)
+        self.assertIn("ok", status.lower())
+        self.assertTrue(self.driver.find_element_by_id("{slug}-{i}").is_displayed())
+'''
+
+
+def make_corpus(root: Path, files: int, methods: int) -> List[Path]:
+    """files/2 page objects and as many tests (one per page), each with `methods` methods."""
+    root.mkdir(parents=True, exist_ok=True)
+    out: List[Path] = []
+    for n in range(max(1, files // 2)):
+        cls, slug, module = f"Screen{n}Page", f"screen{n}", f"Screen{n}Page"
+        names = [f"fill_section_{i}" for i in range(methods)]
+        page = PAGE_TEMPLATE.format(cls=cls, slug=slug, methods="".join(
+            PAGE_METHOD.format(name=nm, slug=slug, i=i) for i, nm in enumerate(names)))
+        test = TEST_TEMPLATE.format(module=module, cls=cls, methods="".join(
+            TEST_METHOD.format(name=nm, slug=slug, i=i) for i, nm in enumerate(names)))
+        for path, text in ((root / f"{module}.py", page), (root / f"test_{slug}.py", test)):
+            path.write_text(text, encoding="utf-8")
+            out.append(path)
+    return out[:files] if files > 1 else out[:1]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, timeout_s: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while True:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except Exception:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"stand-in server did not come up at {url}")
+            time.sleep(0.1)
+
+
+def _pct(values: List[float], q: int) -> Optional[float]:
+    if not values:
+        return None
+    if len(values) == 1:
+        return round(values[0], 3)
+    return round(statistics.quantiles(values, n=100, method="inclusive")[q - 1], 3)
+
+
+def summarize(records: List[Dict[str, Any]], files: int, wall_s: float) -> Dict[str, Any]:
+    stages: Dict[str, List[float]] = {}
+    for r in records:
+        stages.setdefault(f"{r['agent']}/{r['stage']}", []).append(r["wall_s"])
+    tokens = sum(r["prompt_tokens"] + r["completion_tokens"] for r in records)
+    return {
+        "files": files,
+        "wall_s": round(wall_s, 2),
+        "files_per_min": round(files / wall_s * 60, 2) if wall_s else None,
+        "llm_calls": len(records),
+        "llm_errors": sum(1 for r in records if not r["ok"]),
+        "tokens_per_file": round(tokens / files, 1) if files else None,
+        "stages": {
+            name: {"calls": len(v), "p50_s": _pct(v, 50), "p95_s": _pct(v, 95)}
+            for name, v in sorted(stages.items())
+        },
+    }
+
+
+def run_once(args: argparse.Namespace, corpus: Path, files: int, work: Path, run: int) -> Dict[str, Any]:
+    port = _free_port()
+    server_cmd = [
+        sys.executable, str(ROOT / "tools" / "llm_standin_server.py"), "--port", str(port),
+        "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+        "--ms-per-token", str(args.ms_per_token), "--error-rate", str(args.error_rate),
+        "--429-rate", str(args.rate_429), "--seed", str(args.seed + run),
+    ]
+    if args.replay:
+        server_cmd += ["--replay", args.replay]
+    metrics_dir = work / f"metrics-{run}"
+    out_dir = work / f"out-{run}"
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(ROOT) + os.pathsep + os.environ.get("PYTHONPATH", ""),
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{port}/v1",
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY") or "bench",
+        "LLM_CACHE": "0",
+        "LLM_METRICS": "1",
+        "LLM_METRICS_DIR": str(metrics_dir),
+        "OPENAI_RATE_LIMIT_FILE": "",
+    }
+    server = subprocess.Popen(server_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_ready(f"http://127.0.0.1:{port}/v1/models")
+        cmd = [sys.executable, str(ROOT / "tools" / "convert_selenium_once.py"),
+               "--in", str(corpus), "--out", str(out_dir), *args.converter_args]
+        t0 = time.monotonic()
+        proc = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True)
+        wall = time.monotonic() - t0
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    if proc.returncode not in (0, 1):
+        sys.stderr.write(proc.stdout[-4000:] + proc.stderr[-4000:])
+        raise RuntimeError(f"converter exited with {proc.returncode}")
+    records = [json.loads(line) for p in sorted(metrics_dir.glob("*.jsonl"))
+               for line in p.read_text(encoding="utf-8").splitlines() if line.strip()]
+    result = summarize(records, files, wall)
+    result["failed_files"] = proc.stdout.count("Conversion failed")
+    return result
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark convert_selenium_once.py against the LLM stand-in")
+    ap.add_argument("--in", dest="in_path", help="Existing corpus; default: generate a synthetic one")
+    ap.add_argument("--files", type=int, default=10, help="Synthetic corpus size (files)")
+    ap.add_argument("--methods", type=int, default=6, help="Methods per synthetic page / test class")
+    ap.add_argument("--runs", type=int, default=1)
+    ap.add_argument("--latency-ms", type=float, default=300.0)
+    ap.add_argument("--jitter-ms", type=float, default=100.0)
+    ap.add_argument("--ms-per-token", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--429-rate", dest="rate_429", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--replay", help="Recorded responses for the stand-in (see llm_standin_server --record)")
+    ap.add_argument("--json", dest="json_out", help="Also write the results to this file")
+    ap.add_argument("converter_args", nargs="*", help="Extra convert_selenium_once.py arguments (after --)")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_convert_") as tmp:
+        work = Path(tmp)
+        if args.in_path:
+            corpus = Path(args.in_path).resolve()
+            files = len(list(corpus.rglob("*.py"))) if corpus.is_dir() else 1
+        else:
+            corpus = work / "corpus"
+            files = len(make_corpus(corpus, args.files, args.methods))
+
+        results = [run_once(args, corpus, files, work, run) for run in range(args.runs)]
+
+    for i, r in enumerate(results):
+        print(f"run {i + 1}: {r['files']} files in {r['wall_s']}s -> {r['files_per_min']} files/min, "
+              f"{r['tokens_per_file']} tokens/file, {r['llm_calls']} LLM calls "
+              f"({r['llm_errors']} failed), {r['failed_files']} files failed")
+        for name, st in r["stages"].items():
+            print(f"    {name:<32} calls={st['calls']:<4} p50={st['p50_s']}s p95={st['p95_s']}s")
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps({"args": vars(args), "runs": results}, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
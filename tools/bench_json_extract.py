@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Fuzz and microbenchmark for utils.json_extract.extract_json_object.
+
+Builds file-map responses of realistic shape (Playwright modules full of
+f-strings, dict literals and quotes) up to several hundred KB, wraps them the
+ways models do (bare, fenced, prose before/after with stray braces) and checks
+that the extractor returns exactly the original mapping. Mutated / truncated
+responses must either yield a dict or raise ValueError – nothing else – and
+should not yield a fragment of generated code.
+The previous brace-counting extractor is timed alongside for comparison.
+
+    python tools/bench_json_extract.py
+    python tools/bench_json_extract.py --sizes 50 200 800 --cases 2000 --seed 7
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.json_extract import extract_json_object  # noqa: E402
+
+MODULE_SNIPPETS = [
+    'def test_{n}(page: Page) -> None:\n    page.goto(f"{{BASE}}/item/{{item_id}}")\n'
+    '    expect(page.locator("#row-{n}")).to_have_text("ok")\n',
+    "DATA_{n} = {{\"user\": \"u{n}\", \"roles\": [\"a\", \"b\"], \"meta\": {{\"k\": {{}}}}}}\n",
+    "class Page{n}:\n    def __init__(self, page: Page) -> None:\n        self.page = page\n"
+    "        self.sel = {{'ok': \"[data-test='{n}']\", 'bad': '}}{{'}}\n",
+    'def helper_{n}(x):\n    return f"{{x!r:>{{10}}}} \\\\ \\"quoted\\" {{{{literal}}}}"\n',
+    "# שלום {n} – unicode and a lone brace }} in a comment\n",
+]
+
+
+def make_mapping(rng: random.Random, target_kb: int) -> Dict[str, str]:
+    mapping: Dict[str, str] = {}
+    size = 0
+    n = 0
+    while size < target_kb * 1024:
+        key = f"{rng.choice(['pages', 'tests'])}/module_{n}"
+        body = "".join(rng.choice(MODULE_SNIPPETS).format(n=n * 100 + i) for i in range(rng.randint(5, 40)))
+        mapping[key] = "from playwright.sync_api import Page, expect\n\n" + body
+        size += len(json.dumps({key: mapping[key]}))
+        n += 1
+    return mapping
+
+
+WRAPPERS: List[Tuple[str, Callable[[str], str]]] = [
+    ("bare", lambda j: j),
+    ("fenced", lambda j: f"```json\n{j}\n```"),
+    ("prose", lambda j: f"Here is the mapping {{as requested}}:\n{j}\nLet me know if you need {{more}}."),
+    ("prose+stray", lambda j: f"Note: use {{page}} fixtures }} {{\n{j}\n}} end"),
+    ("pretty", lambda j: json.dumps(json.loads(j), indent=2, ensure_ascii=False)),
+]
+
+
+def legacy_parse(text: str) -> Dict[str, Any]:
+    """The brace-counting extractor this replaced (kept here for comparison)."""
+    if not text:
+        raise ValueError("empty response")
+    s = text.strip()
+    if s.startswith("```"):
+        s = re.sub(r"^```(?:json)?\s*", "", s, flags=re.I)
+        s = re.sub(r"\s*```$", "", s)
+    if s.startswith("{") and s.endswith("}"):
+        return json.loads(s)
+    start = s.find("{")
+    if start == -1:
+        raise ValueError("no JSON object found")
+    best = None
+    depth = 0
+    cand_start = start
+    for i in range(start, len(s)):
+        c = s[i]
+        if c == "{":
+            if depth == 0:
+                cand_start = i
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                best = s[cand_start:i + 1]
+    if not best:
+        raise ValueError("unbalanced JSON braces")
+    return json.loads(best)
+
+
+def _time(fn: Callable[[str], Any], text: str, repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        try:
+            fn(text)
+        except ValueError:
+            pass
+    return (time.perf_counter() - t0) / repeat
+
+
+def bench(sizes: List[int], repeat: int, seed: int) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    rows = []
+    for kb in sizes:
+        mapping = make_mapping(rng, kb)
+        raw = json.dumps(mapping, ensure_ascii=False)
+        for name, wrap in WRAPPERS:
+            text = wrap(raw)
+            new_s = _time(extract_json_object, text, repeat)
+            correct = extract_json_object(text) == mapping
+            old_s = _time(legacy_parse, text, repeat)
+            try:
+                old_correct = legacy_parse(text) == mapping
+            except ValueError:
+                old_correct = False
+            rows.append({
+                "kb": len(text) // 1024, "wrapper": name,
+                "new_ms": round(new_s * 1000, 2), "old_ms": round(old_s * 1000, 2),
+                "new_ok": correct, "old_ok": old_correct,
+            })
+    return rows
+
+
+def mutate(rng: random.Random, text: str) -> str:
+    kind = rng.randrange(6)
+    i = rng.randrange(len(text) + 1)
+    if kind == 0:
+        return text[:i]  # truncated stream
+    if kind == 1:
+        return text[:i] + rng.choice("{}[]\"\\:,") + text[i:]
+    if kind == 2:
+        return text[:i] + text[i + rng.randint(1, 20):]
+    if kind == 3:
+        return rng.choice(["Sure! ", "```json\n", "{", "}"]) + text
+    if kind == 4:
+        return text + rng.choice(["\n```", " }", " {", "\nThanks!"])
+    return text.replace('"', "'", rng.randint(1, 3))
+
+
+def fuzz(cases: int, seed: int) -> Dict[str, int]:
+    """
+    Unmutated responses must come back exactly ("wrong" otherwise). For mutated ones a
+    dict whose keys are all file keys of the original is fine (the mutation hit a value);
+    any other dict – typically a fragment of generated code – counts as "fragment".
+    """
+    rng = random.Random(seed)
+    counts = {"cases": cases, "exact": 0, "mutated_ok": 0, "value_error": 0, "fragment": 0, "wrong": 0, "crash": 0}
+    for _ in range(cases):
+        mapping = make_mapping(rng, rng.choice([1, 4, 16]))
+        raw = rng.choice(WRAPPERS)[1](json.dumps(mapping, ensure_ascii=False))
+        mutated = rng.random() < 0.7
+        text = mutate(rng, raw) if mutated else raw
+        try:
+            out = extract_json_object(text)
+        except ValueError:
+            counts["wrong" if not mutated else "value_error"] += 1
+            continue
+        except Exception as e:  # anything else is a bug
+            counts["crash"] += 1
+            print(f"crash: {type(e).__name__}: {e}", file=sys.stderr)
+            continue
+        if out == mapping:
+            counts["exact"] += 1
+        elif not mutated:
+            counts["wrong"] += 1
+        elif out and set(out) <= set(mapping):
+            counts["mutated_ok"] += 1
+        else:
+            counts["fragment"] += 1
+    return counts
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Fuzz and benchmark JSON extraction from model responses")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500], help="Response sizes in KB")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--cases", type=int, default=500, help="Fuzz cases")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    print(f"{'KB':>5} {'wrapper':<12} {'new ms':>9} {'old ms':>9}  new_ok old_ok")
+    for r in bench(args.sizes, args.repeat, args.seed):
+        print(f"{r['kb']:>5} {r['wrapper']:<12} {r['new_ms']:>9} {r['old_ms']:>9}  {r['new_ok']!s:<6} {r['old_ok']}")
+    counts = fuzz(args.cases, args.seed)
+    print("fuzz: " + ", ".join(f"{k}={v}" for k, v in counts.items()))
+    return 1 if counts["crash"] or counts["wrong"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,10 +3,27 @@ from __future__ import annotations
 
 import argparse
 import logging
+import os
 import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
+from typing import Any, Dict, Optional, Set, Tuple
 
 from agents.pom_converter_agent import POMConverterAgent
+from agents.pom_converter_agent import llm_client as pom_llm_client
+from agents.selenium_preconverter import preconvert_stats
+from utils.convert_manifest import ConvertManifest, sha256_text, source_rel
+from utils.hedging import HedgedClient
+from utils.job_queue import QUEUE_NAME, Heartbeat, JobQueue, progress_line, worker_id
+from utils.llm_cache import response_cache
+from utils.llm_metrics import METRICS_PORT, llm_metrics
+from utils.mapping_gate import gate_stats, repair_stats
+from utils.page_merge import page_merge
+from utils.page_registry import registry_for, registry_stats
+from utils.openai_llm import llm_client, pool_stats, usage_stats
+from utils.rate_limiter import rate_limiter
+from utils.suite_graph import SuiteGraph
 
 log = logging.getLogger(__name__)
 logging.basicConfig(
@@ -14,6 +31,8 @@ logging.basicConfig(
     format="%(asctime)s | %(levelname)-8s | %(name)s:%(lineno)d - %(message)s",
 )
 
+QUEUE_POLL_S = 2.0
+
 def iter_py_files(p: Path):
     if p.is_file() and p.suffix == ".py":
         yield p
@@ -27,8 +46,25 @@ def main() -> int:
     ap = argparse.ArgumentParser(description="Convert Selenium → Playwright (single run)")
     ap.add_argument("--in", dest="in_path", required=True, help="Input .py file or directory with .py files")
     ap.add_argument("--out", dest="out_dir", required=True, help="Output root directory (will contain pages/, tests/)")
+    ap.add_argument("--no-cache", action="store_true", help="Bypass the on-disk LLM response cache (LLM_CACHE_DIR)")
+    ap.add_argument("--batch", action="store_true",
+                    help="Use the Batch API (analyzer batch, then builder batch); re-run to resume")
+    ap.add_argument("--batch-poll", type=float, default=30.0, help="Seconds between batch status polls")
+    ap.add_argument("--force", action="store_true", help="Reconvert every file, ignoring the output manifest")
+    ap.add_argument("--jobs", "-j", type=int, default=int(os.getenv("CONVERT_JOBS", "1")),
+                    help="Files converted in parallel (CONVERT_JOBS)")
+    ap.add_argument("--queue", default=None,
+                    help=f"SQLite job queue (default <out>/{QUEUE_NAME}); a re-run resumes from it, "
+                         "and several processes may share it")
+    ap.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                    help="Serve Prometheus metrics on this port during the run (0 = off; LLM_METRICS_PORT)")
     args = ap.parse_args()
 
+    if args.no_cache:
+        response_cache.enabled = False
+    if args.metrics_port:
+        llm_metrics.serve(args.metrics_port)
+
     in_path = Path(args.in_path).resolve()
     out_dir = Path(args.out_dir).resolve()
     out_dir.mkdir(parents=True, exist_ok=True)
@@ -38,19 +74,229 @@ def main() -> int:
     ok = 0
     bad = 0
 
-    for src in iter_py_files(in_path):
-        print(f"Converting {src.name}...")
+    # Incremental runs: skip sources whose content, prompts and models are unchanged,
+    # and whose imported page objects still have the signatures they were converted against.
+    manifest = ConvertManifest(out_dir)
+    fingerprint = conv.config_fingerprint()
+    all_files = list(iter_py_files(in_path))
+    rels = {src: source_rel(src, in_path) for src in all_files}
+    texts = {src: src.read_text(encoding="utf-8") for src in all_files}
+    shas = {src: sha256_text(text) for src, text in texts.items()}
+    if in_path.is_dir():
+        for rel in manifest.prune(rels.values()):
+            page_merge.retain(out_dir, in_path / rel, [])
+            if conv.page_registry:
+                registry_for(out_dir).forget(in_path / rel)
+            print(f"Pruned outputs of deleted source {rel}")
+    root = in_path if in_path.is_dir() else in_path.parent
+
+    def file_fingerprint(src: Path) -> str:
+        return conv.file_fingerprint(src, out_dir, texts[src], fingerprint)
+
+    fps = {src: file_fingerprint(src) for src in all_files}
+    stale = [src for src in all_files if args.force or not manifest.is_fresh(rels[src], shas[src], fps[src])]
+    # Importers of a stale page object are checked again once it is converted (its API may change).
+    recheck: Set[Path] = set()
+    if stale and len(stale) < len(all_files) and conv.page_registry and not args.batch:
+        recheck = SuiteGraph.build(all_files, root).downstream(stale) - set(stale)
+    files = [src for src in all_files if src in recheck or src in stale]
+    skipped = len(all_files) - len(stale)
+    if skipped:
+        more = f"; {len(recheck)} of them rechecked after the page objects they import" if recheck else ""
+        print(f"Up to date: {skipped} of {len(all_files)} files (use --force to reconvert){more}")
+
+    def remember(src: Path, mapping: Dict[str, Any], took: Optional[float] = None, tokens: Optional[int] = None) -> None:
+        manifest.record(rels[src], shas[src], fps[src], mapping.keys(), took, tokens)
+
+    if args.batch:
+        from agents.batch_converter import BatchConverter
+
+        batch = BatchConverter(conv, out_dir, poll_s=args.batch_poll)
+        results = batch.convert_all(files)
+        for src, err in results.items():
+            if err is None:
+                ok += 1
+                remember(src, batch.mappings[src])
+            else:
+                bad += 1
+                print(f"❌ Conversion failed for {src.name}: {err}")
+        print(f"Done. Success: {ok}, Failed: {bad}")
+        _print_stats()
+        return 0 if bad == 0 else 1
+
+    jobs = max(1, args.jobs)
+    graph = SuiteGraph.build(files, root, manifest.seconds_per_token())
+    eta = graph.estimate(jobs)
+    if files:
+        path, path_s = graph.critical_path()
+        print(f"Plan: {len(files)} files, {graph.edges()} imports between them; critical path "
+              f"{' -> '.join(p.name for p in path)} (~{path_s:.0f}s); estimated {eta:.0f}s with {jobs} job(s)")
+
+    # Durable per-file state: leases, attempts and the output of every finished LLM stage.
+    queue = JobQueue(Path(args.queue) if args.queue else out_dir / QUEUE_NAME)
+    owner = worker_id()
+    for src in files:
+        queue.enqueue(rels[src], src, shas[src], fps[src], graph.tokens[src], reset=args.force)
+    conv.stage_store = queue
+    qs = queue.stats(rels[src] for src in files)
+    if qs["stages"] or qs["running"]:
+        print(f"Resuming: {qs['stages']} stored stage outputs, {qs['running']} files leased by other workers")
+
+    def convert_one(src: Path) -> Tuple[Optional[Exception], float, bool]:
+        """(error, seconds, converted); converted is False for a rechecked file that is still up to date."""
+        t0 = time.monotonic()
         try:
-            conv.convert(src_path=src, out_dir=out_dir)
-            ok += 1
+            fps[src] = file_fingerprint(src)  # the page objects it imports are converted by now
+            if src in recheck and manifest.is_fresh(rels[src], shas[src], fps[src]):
+                queue.complete(rels[src], owner, 0.0)
+                return None, 0.0, False
+            queue.refingerprint(rels[src], fps[src])
+            mapping = conv.convert(src_path=src, out_dir=out_dir)
+            took = time.monotonic() - t0
+            remember(src, mapping, took, graph.tokens[src])
+            queue.complete(rels[src], owner, took)
+            return None, took, True
         except Exception as e:
-            bad += 1
             log.exception("❌ Exception during conversion for %s", src.name)
-            # לא כותבים status.py/error.py כדי לא ללכלך את הפלט – נשאיר נקי לפי המדיניות
-            print(f"❌ Conversion failed for {src.name}")
+            return e, time.monotonic() - t0, True
+
+    # A file starts once the suite modules it imports are done, so it gets their signatures;
+    # only as many are claimed as there are free workers, longest remaining chain first.
+    # Failed attempts go back to the queue until CONVERT_MAX_ATTEMPTS. Results are reported in input
+    # order: a finished file's line waits until every file before it has finished.
+    t_start = time.monotonic()
+    finished: Set[Path] = set()
+    reports: Dict[Path, str] = {}
+    reported = 0
+    tokens_done = 0
+    unchanged = 0
 
-    print(f"Done. Success: {ok}, Failed: {bad}")
+    def report(busy: Set[Path]) -> None:
+        """Prints the finished prefix of files; files finished by other workers are passed over."""
+        nonlocal reported
+        while reported < len(files) and files[reported] in finished and files[reported] not in busy:
+            line = reports.pop(files[reported], None)
+            reported += 1
+            if line is not None:
+                print(f"[{reported}/{len(files)}] {line}")
+
+    try:
+        with Heartbeat(queue, owner), ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="convert") as ex:
+            running: Dict[Future, Path] = {}
+            while True:
+                states = queue.states(rels[src] for src in files)
+                finished = {src for src in files if states.get(rels[src]) in ("done", "failed")}
+                if len(finished) == len(files) and not running:
+                    report(set())
+                    break
+                mine = set(running.values())
+                elsewhere = {src for src in files if states.get(rels[src]) == "running"} - mine
+                for src in graph.ready(finished, finished | mine | elsewhere)[:jobs - len(running)]:
+                    if queue.claim(rels[src], owner):
+                        running[ex.submit(convert_one, src)] = src
+                if not running:
+                    time.sleep(QUEUE_POLL_S)  # what is left is leased by other workers, or waits on it
+                    continue
+                for fut in wait(running, timeout=QUEUE_POLL_S, return_when=FIRST_COMPLETED)[0]:
+                    src = running.pop(fut)
+                    err, took, converted = fut.result()
+                    if err is None and not converted:
+                        unchanged += 1
+                        finished.add(src)
+                    elif err is None:
+                        ok += 1
+                        finished.add(src)
+                        tokens_done += graph.tokens[src]
+                    elif queue.fail(rels[src], owner, f"{type(err).__name__}: {err}") == "failed":
+                        bad += 1
+                        finished.add(src)
+                    else:
+                        print(f"{src.name}: attempt failed ({took:.1f}s), queued again")
+                        continue
+                    left = sum(graph.tokens[f] for f in files if f not in finished)
+                    speed = progress_line(len(finished), len(files), time.monotonic() - t_start, tokens_done, left)
+                    speed = f" | {speed}" if speed else ""
+                    if err is None and not converted:
+                        reports[src] = f"{src.name}: up to date (imported page objects unchanged)"
+                    elif err is None:
+                        reports[src] = f"{src.name}: ok ({took:.1f}s){speed}"
+                    else:
+                        # לא כותבים status.py/error.py כדי לא ללכלך את הפלט – נשאיר נקי לפי המדיניות
+                        reports[src] = f"❌ Conversion failed for {src.name} ({took:.1f}s){speed}"
+                report(set(running.values()))
+    except KeyboardInterrupt:
+        print(f"Interrupted; {queue.release(owner)} files handed back to the queue, re-run to resume")
+        raise
+
+    wall = time.monotonic() - t_start
+    rate = f", {len(files) / wall * 60:.1f} files/min" if wall > 0 and files else ""
+    others = len(files) - ok - bad - unchanged
+    by_others = f" ({others} converted by other workers)" if others else ""
+    by_others += f" ({unchanged} rechecked and still up to date)" if unchanged else ""
+    print(f"Done. Success: {ok}, Failed: {bad}{by_others} in {wall:.1f}s with {jobs} job(s){rate} "
+          f"(estimated {eta:.0f}s)")
+    qs = queue.stats(rels[src] for src in files)
+    print(f"Queue: {queue.path.name} done={qs['done']} failed={qs['failed']} attempts={qs['attempts']} "
+          f"stored stages={qs['stages']}")
+    queue.close()
+    _print_stats()
     return 0 if bad == 0 else 1
 
+def _print_stats() -> None:
+    if response_cache.enabled:
+        st = response_cache.stats()
+        print(f"LLM cache: hits={st['hits']} misses={st['misses']} hit_rate={st['hit_rate']} evictions={st['evictions']}")
+    ps = pool_stats()
+    print(f"HTTP pool ({ps['transport']}): requests={ps['requests']} new_connections={ps['new_connections']} "
+          f"reused={ps['reused_connections']} bytes_sent={ps['bytes_sent']}/{ps['bytes_raw']}")
+    rows = llm_metrics.summary()
+    if rows:
+        print("LLM calls by stage:")
+        for r in rows:
+            print(f"  {r['agent']}/{r['stage']} [{r['model']}]: calls={r['calls']} errors={r['errors']} "
+                  f"retries={r['retries']} p50={r['p50_s']}s p95={r['p95_s']}s ttfb_p50={r['ttfb_p50_s']}s "
+                  f"tokens={r['prompt_tokens']}+{r['completion_tokens']} cost=${r['cost_usd']}")
+        if llm_metrics.path:
+            print(f"  records: {llm_metrics.path}")
+    us = usage_stats()
+    if us["responses"]:
+        print(f"Tokens: prompt={us['prompt_tokens']} (cached={us['cached_tokens']}, {us['cached_ratio']:.0%}) "
+              f"completion={us['completion_tokens']}")
+    hedger = pom_llm_client if isinstance(pom_llm_client, HedgedClient) else None
+    if hedger is not None:
+        hs = hedger.stats()
+        print(f"Hedging: hedged={hs['hedged']}/{hs['calls']} wins={hs['hedge_wins']} "
+              f"duplicate_tokens~{hs['duplicate_tokens']}")
+    pc = preconvert_stats.snapshot()
+    if pc["files"]:
+        kinds = ", ".join(f"{k} x{n}" for k, n in pc["top_rewrites"])
+        print(f"Pre-converter: {pc['rewrites']} rewrites in {pc['files']} files, {pc['without_llm']} without LLM, "
+              f"input {pc['chars_in']} -> {pc['chars_out']} chars" + (f" ({kinds})" if kinds else ""))
+    pr = registry_stats()
+    if pr and (pr["contexts_given"] or pr["keys_protected"]):
+        print(f"Page registry: {pr['pages']} page objects, {pr['contexts_given']} files given their signatures, "
+              f"{pr['keys_protected']} page keys kept from being overwritten")
+    pm = page_merge.stats()
+    if pm["merged_writes"]:
+        clashes = ", ".join(f"{c} x{n}" for c, n in pm["top_conflicts"])
+        print(f"Page merge: {pm['merged_writes']} writes merged other sources' page modules, "
+              f"{pm['conflicts']} conflicting definitions" + (f" ({clashes})" if clashes else ""))
+    gs = gate_stats.snapshot()
+    if gs["checked"]:
+        reasons = ", ".join(f"{r} x{n}" for r, n in gs["top_reasons"])
+        print(f"Builder gate: skipped={gs['builder_skipped']}/{gs['checked']} ({gs['skip_rate']:.0%})"
+              + (f"; builder needed for: {reasons}" if reasons else ""))
+    rs = repair_stats.snapshot()
+    if rs["broken_files"]:
+        reasons = ", ".join(f"{r} x{n}" for r, n in rs["top_reasons"])
+        print(f"Repair: {rs['repaired_files']}/{rs['broken_files']} broken files fixed in {rs['rounds']} round(s) "
+              f"({reasons})")
+    fl = llm_client.inflight.stats()
+    if fl["coalesced"]:
+        print(f"Coalesced LLM calls: {fl['coalesced']} saved of {fl['calls'] + fl['coalesced']}")
+    rl = rate_limiter.stats()
+    if rl["waited_s"] or rl["throttled_429"]:
+        print(f"Rate limiter: waited={rl['waited_s']}s 429s={rl['throttled_429']} shared={rl['shared']}")
+
 if __name__ == "__main__":
     sys.exit(main())
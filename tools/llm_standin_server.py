@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible stand-in for offline runs of the converter.
+
+Serves /v1/models, /v1/chat/completions (plain and SSE streaming), /v1/files and
+/v1/batches with deterministic answers: analyzer prompts get a file map derived
+from the input's classes and methods, builder prompts get their CURRENT MAPPING
+echoed back, repair prompts get each broken file minus the lines its errors name.
+
+    python tools/llm_standin_server.py --port 8089 &
+    OPENAI_BASE_URL=http://localhost:8089/v1 OPENAI_API_KEY=dummy \\
+        python tools/convert_selenium_once.py --batch --batch-poll 1 --in selenium_tests/login --out /tmp/out
+
+Record / replay: --record FILE --upstream URL proxies chat completions to a real
+endpoint (the caller's Authorization header is forwarded) and appends each answer
+to FILE; --replay FILE answers from such recordings and falls back to the
+deterministic answer on a miss (or 404 with --strict-replay).
+
+Fault injection for benchmarks: --latency-ms / --jitter-ms per request,
+--ms-per-token for generation speed, --error-rate (HTTP 500) and --429-rate
+(HTTP 429 with Retry-After), reproducible with --seed.
+"""
+from __future__ import annotations
+
+import argparse
+import ast
+import hashlib
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from dataclasses import dataclass
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)-8s | %(name)s:%(lineno)d - %(message)s",
+)
+
+_CODE_RE = re.compile(r"=== INPUT CODE START ===\n(.*?)\n=== INPUT CODE END ===", re.S)
+_MAPPING_RE = re.compile(r"=== CURRENT MAPPING \(JSON\) ===\n(.*?)\n=== END ===", re.S)
+_FILENAME_RE = re.compile(r"Filename: (\S+)")
+_BROKEN_RE = re.compile(r"=== BROKEN FILES \(JSON: key -> errors, code\) ===\n(.*?)\n=== END ===", re.S)
+_ERROR_LINE_RE = re.compile(r"line (\d+)")
+
+
+def _snake(name: str) -> str:
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower().strip("_")
+
+
+def _stub_file_map(code: str, filename: str) -> Dict[str, str]:
+    """Valid Playwright-shaped modules with the same classes and methods as the input."""
+    stem = re.sub(r"\W", "_", filename.rsplit(".", 1)[0]) or "module"
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        tree = ast.Module(body=[], type_ignores=[])
+    pages: List[str] = []
+    tests: List[str] = []
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        methods = [n.name for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+        test_methods = [m for m in methods if m.startswith("test")]
+        if test_methods:
+            tests.extend(test_methods)
+            continue
+        body = ["    def __init__(self, page: Page) -> None:", "        self.page = page", ""]
+        for m in methods:
+            if m.startswith("_"):
+                continue
+            body += [f"    def {m}(self, *args, **kwargs) -> None:", "        pass", ""]
+        pages.append(f"class {node.name}:\n" + "\n".join(body))
+
+    out: Dict[str, str] = {}
+    if pages:
+        out[f"pages/{_snake(stem)}"] = "from playwright.sync_api import Page\n\n\n" + "\n\n".join(pages)
+    test_key = stem if stem.startswith("test") else f"test_{_snake(stem)}"
+    fns = tests or ["test_smoke"]
+    out[f"tests/{test_key}"] = "from playwright.sync_api import Page\n\n\n" + "\n\n".join(
+        f"def {t}(page: Page) -> None:\n    pass\n" for t in fns
+    )
+    return out
+
+
+def _drop_error_lines(files: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+    """Repair answer: each broken file without the lines its errors point at."""
+    out: Dict[str, str] = {}
+    for key, item in files.items():
+        bad = {int(n) for e in item.get("errors", []) for n in _ERROR_LINE_RE.findall(e)}
+        lines = [ln for i, ln in enumerate(str(item.get("code", "")).splitlines(), 1) if i not in bad]
+        out[key] = "\n".join(lines) + "\n"
+    return out
+
+
+def answer_chat(body: Dict[str, Any]) -> str:
+    """Deterministic completion text for a chat request."""
+    messages = body.get("messages") or []
+    user = "\n".join(str(m.get("content") or "") for m in messages if m.get("role") == "user")
+    m = _BROKEN_RE.search(user)
+    if m:
+        try:
+            return json.dumps(_drop_error_lines(json.loads(m.group(1))), ensure_ascii=False)
+        except ValueError:
+            pass
+    m = _MAPPING_RE.search(user)
+    if m:
+        try:
+            return json.dumps(json.loads(m.group(1)), ensure_ascii=False)
+        except ValueError:
+            pass
+    m = _CODE_RE.search(user)
+    if m:
+        fn = _FILENAME_RE.search(user)
+        return json.dumps(_stub_file_map(m.group(1), fn.group(1) if fn else "module.py"), ensure_ascii=False)
+    return json.dumps({"tests/test_standin": "def test_standin():\n    pass\n"})
+
+
+def _usage(body: Dict[str, Any], content: str) -> Dict[str, Any]:
+    prompt_chars = sum(len(str(m.get("content") or "")) for m in body.get("messages") or [])
+    prompt_tokens, completion_tokens = prompt_chars // 4 + 1, len(content) // 4 + 1
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": 0}}
+
+
+def request_key(body: Dict[str, Any]) -> str:
+    """Recording key: everything that shapes the answer (not stream flags or transport)."""
+    relevant = {k: v for k, v in body.items() if k not in ("stream", "stream_options", "user")}
+    blob = json.dumps(relevant, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class Recordings:
+    """JSONL of {"key", "model", "content", "usage"} lines; shared by --record and --replay."""
+
+    def __init__(self, path: Optional[str]) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        if path:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            item = json.loads(line)
+                            self.items[item["key"]] = item
+            except FileNotFoundError:
+                pass
+            log.info("Loaded %s recorded responses from %s", len(self.items), path)
+
+    def get(self, body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        item = self.items.get(request_key(body))
+        with self.lock:
+            if item is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return item
+
+    def add(self, body: Dict[str, Any], content: str, usage: Optional[Dict[str, Any]]) -> None:
+        item = {"key": request_key(body), "model": body.get("model"), "content": content, "usage": usage}
+        with self.lock:
+            self.items[item["key"]] = item
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+
+@dataclass
+class Faults:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    ms_per_token: float = 0.0
+    error_rate: float = 0.0
+    rate_429: float = 0.0
+    seed: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        self.rng = random.Random(self.seed)
+        self.lock = threading.Lock()
+
+    def roll(self) -> Tuple[float, Optional[int]]:
+        """(seconds before the first byte, injected HTTP status or None)."""
+        with self.lock:
+            delay = max(0.0, self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            r = self.rng.random()
+        if r < self.error_rate:
+            return delay, 500
+        if r < self.error_rate + self.rate_429:
+            return delay, 429
+        return delay, None
+
+
+def completion_body(body: Dict[str, Any], content: str, usage: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "standin"),
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": usage or _usage(body, content),
+    }
+
+
+def stream_chunks(body: Dict[str, Any], content: str, usage: Optional[Dict[str, Any]] = None,
+                  piece_chars: int = 16) -> List[Dict[str, Any]]:
+    """chat.completion.chunk events for content, plus a usage event when stream_options ask for it."""
+    cid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    base = {"id": cid, "object": "chat.completion.chunk", "created": int(time.time()),
+            "model": body.get("model", "standin")}
+    events = [{**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}}]}]
+    for i in range(0, len(content), piece_chars):
+        events.append({**base, "choices": [{"index": 0, "delta": {"content": content[i:i + piece_chars]}}]})
+    events.append({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+    if (body.get("stream_options") or {}).get("include_usage"):
+        events.append({**base, "choices": [], "usage": usage or _usage(body, content)})
+    return events
+
+
+class StandinState:
+    def __init__(
+        self,
+        batch_delay_s: float,
+        faults: Optional[Faults] = None,
+        replay: Optional[Recordings] = None,
+        record: Optional[Recordings] = None,
+        upstream: str = "",
+        strict_replay: bool = False,
+    ) -> None:
+        self.batch_delay_s = batch_delay_s
+        self.faults = faults or Faults()
+        self.replay = replay
+        self.record = record
+        self.upstream = upstream.rstrip("/")
+        self.strict_replay = strict_replay
+        self.lock = threading.Lock()
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+
+    def add_file(self, data: bytes) -> str:
+        fid = f"file-{uuid.uuid4().hex[:16]}"
+        with self.lock:
+            self.files[fid] = data
+        return fid
+
+    def create_batch(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        bid = f"batch_{uuid.uuid4().hex[:16]}"
+        batch = {
+            "id": bid, "object": "batch", "endpoint": req.get("endpoint"),
+            "input_file_id": req.get("input_file_id"), "completion_window": req.get("completion_window"),
+            "status": "validating", "created_at": int(time.time()), "metadata": req.get("metadata") or {},
+            "output_file_id": None, "error_file_id": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        }
+        with self.lock:
+            self.batches[bid] = batch
+        threading.Thread(target=self._run_batch, args=(bid,), daemon=True).start()
+        return dict(batch)
+
+    def _run_batch(self, bid: str) -> None:
+        batch = self.batches[bid]
+        lines = self.files.get(batch["input_file_id"], b"").decode("utf-8").splitlines()
+        batch["request_counts"]["total"] = len(lines)
+        time.sleep(self.batch_delay_s / 2)
+        batch["status"] = "in_progress"
+        out: List[str] = []
+        for line in lines:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            body = item.get("body") or {}
+            recorded = self.replay.get(body) if self.replay else None
+            resp = (completion_body(body, recorded["content"], recorded.get("usage")) if recorded
+                    else completion_body(body, answer_chat(body)))
+            out.append(json.dumps({
+                "id": f"batch_req_{uuid.uuid4().hex[:12]}", "custom_id": item.get("custom_id"),
+                "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": resp}, "error": None,
+            }, ensure_ascii=False))
+            batch["request_counts"]["completed"] += 1
+        time.sleep(self.batch_delay_s / 2)
+        batch["output_file_id"] = self.add_file(("\n".join(out) + "\n").encode("utf-8"))
+        batch["status"] = "completed"
+        log.info("Batch %s completed (%s requests)", bid, len(out))
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: StandinState
+
+    def log_message(self, fmt: str, *args: Any) -> None:
+        log.debug(fmt, *args)
+
+    # routing --------------------------------------------------------------
+    def _route(self) -> Tuple[str, List[str]]:
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path.startswith("/v1"):
+            path = path[3:]
+        return path, [p for p in path.split("/") if p]
+
+    def do_GET(self) -> None:
+        path, parts = self._route()
+        if path == "/models":
+            return self._json(200, {"object": "list", "data": [{"id": "standin", "object": "model"}]})
+        if len(parts) == 2 and parts[0] == "batches":
+            batch = self.state.batches.get(parts[1])
+            return self._json(200, batch) if batch else self._json(404, {"error": {"message": "no such batch"}})
+        if len(parts) == 3 and parts[0] == "files" and parts[2] == "content":
+            data = self.state.files.get(parts[1])
+            if data is None:
+                return self._json(404, {"error": {"message": "no such file"}})
+            return self._send(200, data, "application/jsonl")
+        self._json(404, {"error": {"message": f"unknown route {path}"}})
+
+    def do_POST(self) -> None:
+        path, _ = self._route()
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if path == "/chat/completions":
+            return self._chat(json.loads(raw or b"{}"))
+        if path == "/files":
+            data = self._multipart_file(raw)
+            if data is None:
+                return self._json(400, {"error": {"message": "multipart 'file' field required"}})
+            fid = self.state.add_file(data)
+            return self._json(200, {"id": fid, "object": "file", "bytes": len(data), "purpose": "batch"})
+        if path == "/batches":
+            return self._json(200, self.state.create_batch(json.loads(raw or b"{}")))
+        self._json(404, {"error": {"message": f"unknown route {path}"}})
+
+    # chat -----------------------------------------------------------------
+    def _chat(self, body: Dict[str, Any]) -> None:
+        st = self.state
+        delay, fault = st.faults.roll()
+        time.sleep(delay)
+        if fault == 429:
+            return self._json(429, {"error": {"message": "stand-in rate limit", "type": "rate_limit"}},
+                              {"Retry-After": "1"})
+        if fault:
+            return self._json(fault, {"error": {"message": "stand-in injected failure", "type": "server_error"}})
+
+        usage: Optional[Dict[str, Any]] = None
+        recorded = st.replay.get(body) if st.replay else None
+        if recorded is not None:
+            content, usage = recorded["content"], recorded.get("usage")
+        elif st.upstream:
+            try:
+                content, usage = self._proxy(body)
+            except urllib.error.HTTPError as e:
+                return self._send(e.code, e.read(), "application/json")
+            st.record.add(body, content, usage)  # type: ignore[union-attr]
+        elif st.replay and st.strict_replay:
+            return self._json(404, {"error": {"message": "no recorded response for this request"}})
+        else:
+            content = answer_chat(body)
+
+        per_token_s = st.faults.ms_per_token / 1000
+        if not body.get("stream"):
+            time.sleep(per_token_s * (len(content) // 4))
+            return self._json(200, completion_body(body, content, usage))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for event in stream_chunks(body, content, usage):
+                self.wfile.write(b"data: " + json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n\n")
+                self.wfile.flush()
+                time.sleep(per_token_s * 4)  # one chunk ~ 16 chars ~ 4 tokens
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            log.debug("Client closed the stream early")
+
+    def _proxy(self, body: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+        upstream_body = {k: v for k, v in body.items() if k not in ("stream", "stream_options")}
+        req = urllib.request.Request(
+            f"{self.state.upstream}/chat/completions",
+            data=json.dumps(upstream_body).encode("utf-8"),
+            headers={"Content-Type": "application/json", "Authorization": self.headers.get("Authorization", "")},
+        )
+        with urllib.request.urlopen(req, timeout=600) as r:
+            data = json.loads(r.read())
+        msg = data["choices"][0]["message"]
+        content = json.dumps(msg["parsed"], ensure_ascii=False) if msg.get("parsed") is not None else msg.get("content") or ""
+        return content, data.get("usage")
+
+    # helpers --------------------------------------------------------------
+    def _multipart_file(self, raw: bytes) -> Optional[bytes]:
+        ctype = self.headers.get("Content-Type", "")
+        msg = BytesParser().parsebytes(b"Content-Type: " + ctype.encode() + b"\r\n\r\n" + raw)
+        if not msg.is_multipart():
+            return None
+        for part in msg.get_payload():
+            if part.get_param("name", header="content-disposition") == "file":
+                return part.get_payload(decode=True)
+        return None
+
+    def _json(self, status: int, obj: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        self._send(status, json.dumps(obj, ensure_ascii=False).encode("utf-8"), "application/json", headers)
+
+    def _send(self, status: int, data: bytes, ctype: str, headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def make_server(host: str, port: int, batch_delay_s: float = 1.0, **state_kwargs: Any) -> ThreadingHTTPServer:
+    handler = type("Handler", (StandinHandler,), {"state": StandinState(batch_delay_s, **state_kwargs)})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="OpenAI-compatible stand-in server (offline runs)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--batch-delay", type=float, default=1.0, help="Seconds a batch job takes to 'run'")
+    ap.add_argument("--replay", help="Answer from recorded responses (JSONL written by --record)")
+    ap.add_argument("--strict-replay", action="store_true", help="404 on a replay miss instead of the stub answer")
+    ap.add_argument("--record", help="Append upstream answers to this JSONL (needs --upstream)")
+    ap.add_argument("--upstream", default="", help="Real OpenAI-compatible base URL to proxy to, e.g. https://api.openai.com/v1")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="Delay before each chat response")
+    ap.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +/- jitter on --latency-ms")
+    ap.add_argument("--ms-per-token", type=float, default=0.0, help="Simulated generation time per completion token")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="Fraction of chat requests answered with HTTP 500")
+    ap.add_argument("--429-rate", dest="rate_429", type=float, default=0.0,
+                    help="Fraction of chat requests answered with HTTP 429 + Retry-After")
+    ap.add_argument("--seed", type=int, default=None, help="Seed for latency / fault injection")
+    args = ap.parse_args()
+    if args.upstream and not args.record:
+        ap.error("--upstream needs --record")
+
+    faults = Faults(args.latency_ms, args.jitter_ms, args.ms_per_token, args.error_rate, args.rate_429, args.seed)
+    server = make_server(
+        args.host, args.port, args.batch_delay,
+        faults=faults,
+        replay=Recordings(args.replay) if args.replay else None,
+        record=Recordings(args.record) if args.record else None,
+        upstream=args.upstream,
+        strict_replay=args.strict_replay,
+    )
+    log.info("Stand-in LLM server on http://%s:%s/v1", args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.singleflight import SingleFlight, request_key
+
+log = logging.getLogger(__name__)
+
+MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+MAX_IN_FLIGHT_PER_MODEL = int(os.getenv("LLM_MAX_IN_FLIGHT_PER_MODEL", "4"))
+
+
+class AsyncLLMClient:
+    """
+    asyncio counterpart of OpenAIClient / LocalLLMClient.
+    - Wraps a blocking client; each call runs on a bounded worker pool, so retries,
+      JSON mode and Structured Outputs behave exactly like the sync call_chat.
+    - max_in_flight caps concurrent upstream requests; per-model semaphores keep a
+      single model within its own limit (per_model overrides, else per_model_default).
+    - Cancelling a caller drops queued work immediately. In-flight calls cannot be
+      cancelled: the blocking call_chat is already running on a worker thread and
+      asyncio has no way to interrupt it, so the request runs to completion (and is
+      billed) with its result discarded. It keeps its slot until it returns, so the
+      provider never sees more than max_in_flight requests.
+    """
+
+    def __init__(
+        self,
+        client: Any = None,
+        max_in_flight: int = MAX_IN_FLIGHT,
+        per_model_default: int = MAX_IN_FLIGHT_PER_MODEL,
+        per_model: Optional[Dict[str, int]] = None,
+    ) -> None:
+        if client is None:
+            from utils.openai_llm import llm_client as client
+        self._client = client
+        self.max_in_flight = max(1, max_in_flight)
+        self.per_model_default = max(1, per_model_default)
+        self.per_model = dict(per_model or {})
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_in_flight, thread_name_prefix="llm"
+        )
+        # Semaphores belong to one event loop; rebuilt if the client is reused under a new loop.
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._global: Optional[asyncio.Semaphore] = None
+        self._models: Dict[str, asyncio.Semaphore] = {}
+        self.in_flight = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.inflight = SingleFlight()
+
+    def _semaphores(self, model: str) -> Tuple[asyncio.Semaphore, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._global = asyncio.Semaphore(self.max_in_flight)
+            self._models = {}
+        sem = self._models.get(model)
+        if sem is None:
+            sem = asyncio.Semaphore(self.per_model.get(model, self.per_model_default))
+            self._models[model] = sem
+        return self._global, sem  # type: ignore[return-value]
+
+    async def call_chat(self, model: str, messages: List[Dict[str, Any]], **kwargs: Any) -> Any:
+        """
+        Same arguments and return value as the wrapped client's call_chat. Identical
+        concurrent requests are coalesced before they take a concurrency slot.
+        """
+        key = request_key(model, messages, **kwargs)
+        return await self.inflight.ado(key, lambda: self._call_chat(model, messages, **kwargs))
+
+    async def _call_chat(self, model: str, messages: List[Dict[str, Any]], **kwargs: Any) -> Any:
+        gsem, msem = self._semaphores(model)
+        try:
+            await msem.acquire()
+            try:
+                await gsem.acquire()
+            except BaseException:
+                msem.release()
+                raise
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            log.debug("LLM call cancelled while queued (model=%s)", model)
+            raise
+
+        loop = asyncio.get_running_loop()
+
+        def _release() -> None:
+            self.in_flight -= 1
+            gsem.release()
+            msem.release()
+
+        self.in_flight += 1
+        # copy_context: stage tags (utils.llm_metrics) follow the call onto the worker thread.
+        ctx = contextvars.copy_context()
+        cf = self._executor.submit(ctx.run, self._client.call_chat, model=model, messages=messages, **kwargs)
+        try:
+            result = await asyncio.wrap_future(cf)
+            self.completed += 1
+            return result
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            log.debug("LLM call cancelled (model=%s, started=%s)", model, cf.running() or cf.done())
+            raise
+        finally:
+            if cf.done():
+                _release()
+            else:
+                def _late_release(_f: Any) -> None:
+                    try:
+                        loop.call_soon_threadsafe(_release)
+                    except RuntimeError:
+                        pass  # loop already closed; nothing left to protect
+                cf.add_done_callback(_late_release)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "max_in_flight": self.max_in_flight,
+            "coalesced": self.inflight.coalesced,
+        }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from utils.shared_json import SharedJSONFile
+
+log = logging.getLogger(__name__)
+
+MANIFEST_NAME = ".convert_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def key_to_path(out_dir: Path, key: str) -> Path:
+    key = key.strip().lstrip("/")
+    return out_dir / (key if key.endswith(".py") else f"{key}.py")
+
+
+class ConvertManifest:
+    """
+    Record of what the last runs produced, stored next to the output
+    (<out>/.convert_manifest.json):
+        sources[rel] = {"sha256", "fingerprint", "keys", "ts"[, "seconds", "tokens"]}
+    where fingerprint covers prompts, models and limits (seconds and tokens, when
+    timed, calibrate later runs' time estimates). A source is fresh when both
+    hashes match and every key it produced is still on disk. Outputs are only
+    deleted when no remaining source claims their key (pages/* modules are
+    often shared). Processes converting into the same output each record
+    their own sources: every write is merged into the file as it is on disk.
+    """
+
+    def __init__(self, out_dir: Path) -> None:
+        self.out_dir = Path(out_dir)
+        self.path = self.out_dir / MANIFEST_NAME
+        self._lock = threading.Lock()
+        self._file = SharedJSONFile(self.path)
+        self.sources: Dict[str, Dict[str, Any]] = self._parse(self._file.read())
+
+    def is_fresh(self, rel: str, sha: str, fingerprint: str) -> bool:
+        with self._lock:
+            self._refresh()
+            entry = self.sources.get(rel)
+        if not entry or entry.get("sha256") != sha or entry.get("fingerprint") != fingerprint:
+            return False
+        return all(key_to_path(self.out_dir, k).exists() for k in entry.get("keys", []))
+
+    def record(
+        self, rel: str, sha: str, fingerprint: str, keys: Iterable[str],
+        seconds: Optional[float] = None, tokens: Optional[int] = None,
+    ) -> None:
+        """Stores a successful conversion and removes outputs the source no longer produces."""
+        new_keys = sorted(set(keys))
+        entry: Dict[str, Any] = {"sha256": sha, "fingerprint": fingerprint, "keys": new_keys, "ts": int(time.time())}
+        if seconds is not None and tokens:
+            entry.update(seconds=round(seconds, 2), tokens=tokens)
+        with self._lock, self._update() as sources:
+            old = sources.get(rel, {}).get("keys", [])
+            sources[rel] = entry
+            self._delete_orphans(sources, set(old) - set(new_keys))
+
+    def seconds_per_token(self) -> Optional[float]:
+        """Average conversion time per source token over the recorded runs (None before any was timed)."""
+        with self._lock:
+            self._refresh()
+            timed = [e for e in self.sources.values() if e.get("tokens") and e.get("seconds") is not None]
+        if not timed:
+            return None
+        return sum(e["seconds"] for e in timed) / sum(e["tokens"] for e in timed)
+
+    def prune(self, current: Iterable[str]) -> List[str]:
+        """Drops entries (and orphaned outputs) of sources that no longer exist. Returns their names."""
+        keep = set(current)
+        with self._lock:
+            self._refresh()
+            if all(rel in keep for rel in self.sources):
+                return []
+            with self._update() as sources:
+                gone = [rel for rel in sources if rel not in keep]
+                keys: Set[str] = set()
+                for rel in gone:
+                    keys.update(sources.pop(rel).get("keys", []))
+                self._delete_orphans(sources, keys)
+        return gone
+
+    # private --------------------------------------------------------------
+    def _delete_orphans(self, sources: Dict[str, Dict[str, Any]], keys: Set[str]) -> None:
+        claimed = {k for e in sources.values() for k in e.get("keys", [])}
+        for key in sorted(keys - claimed):
+            path = key_to_path(self.out_dir, key)
+            try:
+                path.unlink()
+                log.info("Removed stale output: %s", path)
+            except FileNotFoundError:
+                pass
+
+    def _parse(self, data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        if data and data.get("version") != MANIFEST_VERSION:
+            log.info("Ignoring manifest with version %s", data.get("version"))
+            return {}
+        return data.get("sources", {})
+
+    def _refresh(self) -> None:
+        """Picks up what other processes recorded since this one last read or wrote."""
+        if self._file.changed():
+            self.sources = self._parse(self._file.read())
+
+    @contextmanager
+    def _update(self) -> Iterator[Dict[str, Dict[str, Any]]]:
+        """The sources as they are on disk, under the file lock; written back after the block."""
+        with self._file.update() as data:
+            sources = self._parse(data)
+            yield sources
+            data.clear()
+            data.update(version=MANIFEST_VERSION, sources=sources)
+        self.sources = sources
+
+
+def source_rel(src: Path, in_path: Path) -> str:
+    """Manifest key of a source: its path relative to the input root (or its name for a single file)."""
+    try:
+        return src.relative_to(in_path).as_posix() if in_path.is_dir() else src.name
+    except ValueError:
+        return src.as_posix()
+
+
+def fingerprint_of(parts: Dict[str, Any]) -> str:
+    return sha256_text(json.dumps(parts, sort_keys=True, ensure_ascii=False))
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from utils.llm_metrics import current_tags, llm_stage
+from utils.rate_limiter import estimate_tokens
+from utils.singleflight import request_key
+
+log = logging.getLogger(__name__)
+
+HEDGE_ENABLED = os.getenv("LLM_HEDGE", "0") == "1"
+HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_SEC", "30"))
+HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY_SEC", "2"))
+HEDGE_MAX_RATIO = float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1"))
+HEDGE_MODEL = os.getenv("LLM_HEDGE_MODEL", "")
+HEDGE_BASE_URL = os.getenv("LLM_HEDGE_BASE_URL", "").strip().rstrip("/")
+HEDGE_MIN_SAMPLES = 20
+
+
+class HedgeCancelled(Exception):
+    """The other attempt won; this one was abandoned."""
+
+
+class HedgedClient:
+    """
+    Tail-latency hedging around an OpenAIClient / LocalLLMClient.
+    - call_chat starts the request; if it has not finished after the hedge delay
+      (the `percentile` of recent latencies for that model, default_delay_s until
+      enough samples exist) a duplicate goes to hedge_client / hedge_model and the
+      first successful answer wins.
+    - The first attempt is a plain call_chat; only the duplicate streams, so a
+      losing duplicate is cancelled by closing its response at the next delta. A
+      losing first attempt cannot be interrupted and finishes in the background.
+    - At most max_ratio of calls are hedged, so a slow provider is not hit with
+      double load. Duplicate spend (prompt + completion of losers) is counted in
+      stats(); the duplicate's metrics records are tagged "<stage>:hedge".
+    Everything else (stream_chat, stats of the wrapped client, ...) is delegated.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        hedge_client: Any = None,
+        hedge_model: str = HEDGE_MODEL,
+        percentile: float = HEDGE_PERCENTILE,
+        default_delay_s: float = HEDGE_DEFAULT_DELAY,
+        min_delay_s: float = HEDGE_MIN_DELAY,
+        max_ratio: float = HEDGE_MAX_RATIO,
+        max_workers: int = 32,
+    ) -> None:
+        self._client = client
+        self._hedge_client = hedge_client or client
+        self.hedge_model = hedge_model
+        self.percentile = percentile
+        self.default_delay_s = default_delay_s
+        self.min_delay_s = min_delay_s
+        self.max_ratio = max_ratio
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        self._lock = threading.Lock()
+        self._latency: Dict[str, Deque[float]] = {}
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.duplicate_tokens = 0
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+    def hedge_delay(self, model: str) -> float:
+        with self._lock:
+            samples = sorted(self._latency.get(model, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return self.default_delay_s
+        idx = min(len(samples) - 1, int(len(samples) * self.percentile / 100))
+        return max(self.min_delay_s, samples[idx])
+
+    def call_chat(self, model: str, messages: List[Dict[str, Any]], **kwargs: Any) -> Any:
+        if kwargs.get("return_json"):
+            return self._client.call_chat(model=model, messages=messages, **kwargs)
+        inflight = getattr(self._client, "inflight", None)
+        if inflight is not None:
+            # Hedge streams are not coalesced by the client, so keep single-flight semantics here.
+            # Own key space: the first attempt's call_chat coalesces on the plain request key.
+            key = "hedge:" + request_key(model, messages, **kwargs)
+            return inflight.do(key, lambda: self._hedged_call(model, messages, kwargs))
+        return self._hedged_call(model, messages, kwargs)
+
+    def _hedged_call(self, model: str, messages: List[Dict[str, Any]], kwargs: Dict[str, Any]) -> str:
+        with self._lock:
+            self.calls += 1
+        delay = self.hedge_delay(model)
+        primary = _Attempt(self, self._client, model, messages, kwargs, hedge=False)
+        done, _ = wait([primary.future], timeout=delay)
+        if done or not self._take_budget():
+            return primary.result()
+
+        hedge_model = self.hedge_model or model
+        log.info("Hedging %s call after %.1fs (duplicate to %s)", model, delay, hedge_model)
+        hedge = _Attempt(self, self._hedge_client, hedge_model, messages, kwargs, hedge=True)
+        attempts = [primary, hedge]
+        errors: List[BaseException] = []
+        pending = {a.future: a for a in attempts}
+        while pending:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for f in done:
+                attempt = pending.pop(f)
+                if f.exception() is not None:
+                    errors.append(f.exception())
+                    continue
+                for loser in pending.values():
+                    loser.cancel()
+                if attempt.hedge:
+                    with self._lock:
+                        self.hedge_wins += 1
+                return f.result()
+        raise errors[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "duplicate_tokens": self.duplicate_tokens,
+            }
+
+    # private --------------------------------------------------------------
+    def _take_budget(self) -> bool:
+        with self._lock:
+            if self.hedged + 1 > self.max_ratio * self.calls:
+                return False
+            self.hedged += 1
+            return True
+
+    def _observe(self, model: str, elapsed_s: float) -> None:
+        with self._lock:
+            self._latency.setdefault(model, deque(maxlen=200)).append(elapsed_s)
+
+    def _charge(self, messages: List[Dict[str, Any]], completion_chars: int) -> None:
+        with self._lock:
+            self.duplicate_tokens += estimate_tokens(messages, 0) + completion_chars // 4
+
+
+class _Attempt:
+    """
+    One request on the hedge pool. The duplicate (hedge=True) streams and cancel()
+    makes it stop at the next delta; the first attempt is a plain call_chat, so
+    cancel() only arranges for its spend to be counted once it finishes.
+    """
+
+    def __init__(self, owner: HedgedClient, client: Any, model: str, messages: List[Dict[str, Any]],
+                 kwargs: Dict[str, Any], hedge: bool) -> None:
+        self.owner = owner
+        self.model = model
+        self.messages = messages
+        self.hedge = hedge
+        self._cancel = threading.Event()
+        self._chars = 0
+        ctx = contextvars.copy_context()
+        self.future: Future = owner._pool.submit(ctx.run, self._run, client, kwargs)
+
+    def cancel(self) -> None:
+        self._cancel.set()
+        if not self.hedge:
+            self.future.add_done_callback(self._charge_abandoned)
+
+    def result(self) -> Any:
+        return self.future.result()
+
+    def _run(self, client: Any, kwargs: Dict[str, Any]) -> str:
+        if self.hedge:
+            tags = current_tags()
+            with llm_stage(tags["agent"], f"{tags['stage']}:hedge"):
+                return self._stream(client, kwargs)
+        t0 = time.monotonic()
+        text = client.call_chat(model=self.model, messages=self.messages, **kwargs)
+        self.owner._observe(self.model, time.monotonic() - t0)
+        return text
+
+    def _charge_abandoned(self, future: Future) -> None:
+        if not future.cancelled() and future.exception() is None:
+            self.owner._charge(self.messages, len(future.result()))
+
+    def _stream(self, client: Any, kwargs: Dict[str, Any]) -> str:
+        t0 = time.monotonic()
+        parts: List[str] = []
+        stream = client.stream_chat(model=self.model, messages=self.messages, **kwargs)
+        try:
+            for delta in stream:
+                if self._cancel.is_set():
+                    break
+                parts.append(delta)
+                self._chars += len(delta)
+        finally:
+            stream.close()
+        if self._cancel.is_set():
+            self.owner._charge(self.messages, self._chars)
+            raise HedgeCancelled(f"{self.model} attempt lost the hedge race")
+        self.owner._observe(self.model, time.monotonic() - t0)
+        return "".join(parts)
+
+
+def maybe_hedged(
+    client: Any, hedge_factory: Optional[Callable[[], Any]] = None, enabled: bool = HEDGE_ENABLED
+) -> Any:
+    """
+    Wraps client in a HedgedClient when LLM_HEDGE=1; returns it unchanged otherwise.
+    hedge_factory builds the duplicate's client, and is only called when hedging is on.
+    """
+    if not enabled:
+        return client
+    return HedgedClient(client, hedge_factory() if hedge_factory is not None else None)
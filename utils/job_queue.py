@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Durable conversion job queue in SQLite (<out>/.convert_queue.sqlite by default).
+Each source file is a job with its state, attempts, lease, timings and the
+output of every LLM stage it finished, so a run that crashed or was killed
+resumes where it stopped: finished files are not redone, and a half-converted
+file replays its stored stages instead of calling the model again.
+
+Workers claim a job by taking a lease (owner + expiry) in one UPDATE; leases
+are renewed by a heartbeat, and a job whose lease ran out (its worker died) can
+be claimed again. Several processes may share one queue (and output directory:
+the output manifest and page registry merge their writes under a file lock).
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+log = logging.getLogger(__name__)
+
+QUEUE_NAME = ".convert_queue.sqlite"
+SCHEMA_VERSION = 1
+LEASE_S = float(os.getenv("CONVERT_LEASE_S", "60"))
+MAX_ATTEMPTS = int(os.getenv("CONVERT_MAX_ATTEMPTS", "3"))
+PROMPT_TOKENS = 600  # system prompt + instructions every conversion call carries
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    rel         TEXT PRIMARY KEY,
+    src         TEXT NOT NULL,
+    sha256      TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    tokens      INTEGER NOT NULL DEFAULT 0,
+    state       TEXT NOT NULL DEFAULT 'pending',  -- pending | running | done | failed
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_until REAL,
+    error       TEXT,
+    enqueued    REAL,
+    started     REAL,
+    finished    REAL,
+    seconds     REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_src ON jobs (src);
+CREATE TABLE IF NOT EXISTS stages (
+    rel     TEXT NOT NULL,
+    stage   TEXT NOT NULL,
+    output  TEXT NOT NULL,
+    seconds REAL,
+    ts      REAL,
+    PRIMARY KEY (rel, stage)
+);
+"""
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobQueue:
+    def __init__(self, path: Path, lease_s: float = LEASE_S, max_attempts: int = MAX_ATTEMPTS) -> None:
+        self.path = Path(path)
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # One connection guarded by _lock; autocommit, with explicit transactions where it matters.
+        self._db = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            version = self._db.execute("PRAGMA user_version").fetchone()[0]
+            if version not in (0, SCHEMA_VERSION):
+                log.info("Recreating job queue with schema version %s", version)
+                self._db.executescript("DROP TABLE IF EXISTS jobs; DROP TABLE IF EXISTS stages;")
+            self._db.executescript(_SCHEMA)
+            self._db.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def enqueue(
+        self, rel: str, src: Path, sha: str, fingerprint: str, tokens: int = 0, reset: bool = False
+    ) -> None:
+        """
+        Adds a job, or makes an existing one runnable again. Stored stages are
+        kept while source and fingerprint are unchanged (reset=True drops them).
+        """
+        src_s = Path(src).resolve().as_posix()
+        now = time.time()
+        with self._lock, self._tx():
+            row = self._db.execute("SELECT sha256, fingerprint, state FROM jobs WHERE rel=?", (rel,)).fetchone()
+            same = row is not None and row["sha256"] == sha and row["fingerprint"] == fingerprint
+            if row is None or not same or reset:
+                self._db.execute("DELETE FROM stages WHERE rel=?", (rel,))
+                self._db.execute(
+                    "INSERT OR REPLACE INTO jobs (rel, src, sha256, fingerprint, tokens, state, attempts, enqueued)"
+                    " VALUES (?, ?, ?, ?, ?, 'pending', 0, ?)",
+                    (rel, src_s, sha, fingerprint, tokens, now),
+                )
+            elif row["state"] in ("done", "failed"):
+                self._db.execute(
+                    "UPDATE jobs SET state='pending', attempts=0, error=NULL, src=?, enqueued=? WHERE rel=?",
+                    (src_s, now, rel),
+                )
+            else:
+                # Running under a lease this host's dead (or restarted, same pid) process left behind:
+                # take it back now instead of waiting for the lease to run out.
+                self._db.execute(
+                    "UPDATE jobs SET state='pending', attempts=MAX(attempts-1, 0), lease_owner=NULL, lease_until=NULL"
+                    " WHERE rel=? AND state='running' AND lease_owner=?",
+                    (rel, _dead_local_owner(self._db, rel)),
+                )
+
+    def refingerprint(self, rel: str, fingerprint: str) -> bool:
+        """
+        Updates the fingerprint of a job once its inputs are final (the page objects
+        it imports are converted). Stored stages of the old one are dropped. Returns
+        whether it changed.
+        """
+        with self._lock, self._tx():
+            row = self._db.execute("SELECT fingerprint FROM jobs WHERE rel=?", (rel,)).fetchone()
+            if row is None or row["fingerprint"] == fingerprint:
+                return False
+            self._db.execute("DELETE FROM stages WHERE rel=?", (rel,))
+            self._db.execute("UPDATE jobs SET fingerprint=? WHERE rel=?", (fingerprint, rel))
+            return True
+
+    def claim(self, rel: str, owner: str) -> bool:
+        """Takes the lease on a pending job (or one whose lease expired). False if someone else has it."""
+        now = time.time()
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE jobs SET state='running', attempts=attempts+1, lease_owner=?, lease_until=?, started=?"
+                " WHERE rel=? AND (state='pending' OR (state='running' AND lease_until < ?))",
+                (owner, now + self.lease_s, now, rel, now),
+            )
+            return cur.rowcount == 1
+
+    def heartbeat(self, owner: str) -> int:
+        """Renews every lease owner holds; returns how many."""
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE jobs SET lease_until=? WHERE state='running' AND lease_owner=?",
+                (time.time() + self.lease_s, owner),
+            )
+            return cur.rowcount
+
+    def complete(self, rel: str, owner: str, seconds: float) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET state='done', lease_owner=NULL, lease_until=NULL, error=NULL, finished=?, seconds=?"
+                " WHERE rel=? AND lease_owner=?",
+                (time.time(), round(seconds, 3), rel, owner),
+            )
+
+    def fail(self, rel: str, owner: str, error: str) -> str:
+        """Records a failed attempt. Returns the new state: 'pending' (will be retried) or 'failed'."""
+        with self._lock, self._tx():
+            row = self._db.execute("SELECT attempts FROM jobs WHERE rel=? AND lease_owner=?", (rel, owner)).fetchone()
+            if row is None:
+                return "pending"  # lease lost meanwhile; whoever holds it now decides
+            state = "failed" if row["attempts"] >= self.max_attempts else "pending"
+            self._db.execute(
+                "UPDATE jobs SET state=?, lease_owner=NULL, lease_until=NULL, error=?, finished=? WHERE rel=?",
+                (state, error[:2000], time.time(), rel),
+            )
+            return state
+
+    def release(self, owner: str) -> int:
+        """Hands owner's running jobs back (clean shutdown), without counting the attempt."""
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE jobs SET state='pending', attempts=MAX(attempts-1, 0), lease_owner=NULL, lease_until=NULL"
+                " WHERE state='running' AND lease_owner=?",
+                (owner,),
+            )
+            return cur.rowcount
+
+    def states(self, rels: Iterable[str]) -> Dict[str, str]:
+        """Current state per job; a running job whose lease expired reads as pending."""
+        wanted = set(rels)
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT rel, CASE WHEN state='running' AND lease_until < ? THEN 'pending' ELSE state END AS state"
+                " FROM jobs",
+                (now,),
+            ).fetchall()
+        return {r["rel"]: r["state"] for r in rows if r["rel"] in wanted}
+
+    def error(self, rel: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT error FROM jobs WHERE rel=?", (rel,)).fetchone()
+        return row["error"] if row else None
+
+    # Stage outputs, keyed by source path (the agent only knows the file it converts).
+    def stage_output(self, src_path: Path, stage: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT s.output FROM stages s JOIN jobs j ON j.rel = s.rel WHERE j.src=? AND s.stage=?",
+                (Path(src_path).resolve().as_posix(), stage),
+            ).fetchone()
+        return json.loads(row["output"]) if row else None
+
+    def save_stage(self, src_path: Path, stage: str, output: Dict[str, Any], seconds: float) -> None:
+        src_s = Path(src_path).resolve().as_posix()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO stages (rel, stage, output, seconds, ts)"
+                " SELECT rel, ?, ?, ?, ? FROM jobs WHERE src=?",
+                (stage, json.dumps(output, ensure_ascii=False), round(seconds, 3), time.time(), src_s),
+            )
+
+    def stats(self, rels: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Counts per state, attempts, stored stages and tokens done / left, over rels (default: all jobs)."""
+        with self._lock:
+            jobs = self._db.execute("SELECT rel, state, attempts, tokens, seconds FROM jobs").fetchall()
+            stages = self._db.execute("SELECT rel, COUNT(*) AS n FROM stages GROUP BY rel").fetchall()
+        wanted = set(rels) if rels is not None else {j["rel"] for j in jobs}
+        jobs = [j for j in jobs if j["rel"] in wanted]
+        counts = {s: 0 for s in ("pending", "running", "done", "failed")}
+        for j in jobs:
+            counts[j["state"]] = counts.get(j["state"], 0) + 1
+        return {
+            **counts,
+            "jobs": len(jobs),
+            "attempts": sum(j["attempts"] for j in jobs),
+            "stages": sum(s["n"] for s in stages if s["rel"] in wanted),
+            "tokens_done": sum(j["tokens"] for j in jobs if j["state"] == "done"),
+            "tokens_left": sum(j["tokens"] for j in jobs if j["state"] in ("pending", "running")),
+            "seconds": round(sum(j["seconds"] or 0 for j in jobs if j["state"] == "done"), 1),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    # private --------------------------------------------------------------
+    def _tx(self) -> "_Transaction":
+        return _Transaction(self._db)
+
+
+def _dead_local_owner(db: sqlite3.Connection, rel: str) -> Optional[str]:
+    """Lease owner of rel if it is a process of this host that is gone (or this very process, before it claimed)."""
+    row = db.execute("SELECT lease_owner FROM jobs WHERE rel=?", (rel,)).fetchone()
+    owner = row[0] if row else None
+    host, _, pid = (owner or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return None
+    if owner == worker_id():
+        return owner
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return owner
+    except OSError:
+        return None
+    try:  # killed but not yet reaped
+        return owner if Path(f"/proc/{pid}/stat").read_text().rsplit(") ", 1)[-1].startswith("Z") else None
+    except OSError:
+        return None
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT (ROLLBACK on error): read-then-write without another process in between."""
+
+    def __init__(self, db: sqlite3.Connection) -> None:
+        self.db = db
+
+    def __enter__(self) -> None:
+        self.db.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+class Heartbeat:
+    """Daemon thread renewing owner's leases every lease_s / 3 until stopped."""
+
+    def __init__(self, queue: JobQueue, owner: str) -> None:
+        self.queue = queue
+        self.owner = owner
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="queue-heartbeat", daemon=True)
+
+    def __enter__(self) -> "Heartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.queue.lease_s / 3):
+            try:
+                self.queue.heartbeat(self.owner)
+            except sqlite3.Error as e:
+                log.warning("Lease heartbeat failed: %s", e)
+
+
+def progress_line(done: int, total: int, elapsed: float, tokens_done: int, tokens_left: int) -> str:
+    """
+    '12.0 files/min, ETA 3m20s': throughput of this run, and the ETA from the
+    tokens still to convert (each file also counts the fixed prompt it is sent with).
+    """
+    if not done or elapsed <= 0:
+        return ""
+    rate = done / elapsed * 60
+    eta = (tokens_left + PROMPT_TOKENS * (total - done)) * elapsed / (tokens_done + PROMPT_TOKENS * done)
+    m, s = divmod(int(eta), 60)
+    return f"{rate:.1f} files/min, ETA {m}m{s:02d}s" if m else f"{rate:.1f} files/min, ETA {s}s"
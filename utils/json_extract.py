@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Pulls the JSON object out of a model response that may be fenced or wrapped
+in prose. Benchmarked and fuzzed by tools/bench_json_extract.py.
+"""
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, Dict, Optional
+
+_JSON_DECODER = json.JSONDecoder()
+# A JSON string literal (unrolled loop: no per-character alternation), and what the scan stops at.
+_STRING_RE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+_OPEN_RE = re.compile(r'[{"]')
+_BRACE_RE = re.compile(r'[{}"]')
+
+
+def _strip_fence(s: str) -> str:
+    if s.startswith("```"):
+        nl = s.find("\n")
+        first = s[3:nl if nl != -1 else len(s)].strip().lower()
+        if first in ("", "json"):
+            s = s[nl + 1:] if nl != -1 else ""
+        if s.rstrip().endswith("```"):
+            s = s.rstrip()[:-3]
+        s = s.strip()
+    return s
+
+
+def extract_json_object(text: str) -> Dict[str, Any]:
+    """
+    The JSON object in a model response: the whole text when it is one, otherwise the
+    longest object that decodes with raw_decode, trying each '{' outside string
+    literals. Within a '{' that does not decode, quoted text is skipped in one regex
+    step, so braces inside its strings (f-strings and dict literals in generated code)
+    are never tried, and a truncated response raises instead of yielding a fragment of
+    one of its values. Quotes in the prose around objects (5" screen) are not strings.
+    """
+    if not text:
+        raise ValueError("empty response")
+    s = _strip_fence(text.strip())
+    if s.startswith("{") and s.endswith("}"):
+        try:
+            obj = json.loads(s)
+            if isinstance(obj, dict):
+                return obj
+        except ValueError:
+            pass
+    if s.find("{") == -1:
+        raise ValueError("no JSON object found")
+    best: Optional[Dict[str, Any]] = None
+    best_len = 0
+    pos = 0
+    candidate_end = 0  # end of the failed object being looked into; past it is prose
+    while True:
+        m = _OPEN_RE.search(s, pos)
+        if m is None:
+            break
+        i = m.start()
+        if s[i] == '"':
+            if i >= candidate_end:
+                pos = i + 1
+                continue
+            quoted = _STRING_RE.match(s, i)
+            if quoted is None:
+                break  # unterminated: the rest of a truncated response is inside this string
+            pos = quoted.end()
+            continue
+        try:
+            obj, end = _JSON_DECODER.raw_decode(s, i)
+        except ValueError:
+            if i >= candidate_end:
+                candidate_end = _object_end(s, i)
+            pos = i + 1
+            continue
+        if isinstance(obj, dict) and end - i > best_len:
+            best, best_len = obj, end - i
+        pos = end
+    if best is None:
+        raise ValueError("unbalanced JSON braces")
+    return best
+
+
+def _object_end(s: str, start: int) -> int:
+    """Index past the '}' closing the '{' at start, skipping string literals; len(s) if it never closes."""
+    depth = 0
+    pos = start
+    while True:
+        m = _BRACE_RE.search(s, pos)
+        if m is None:
+            return len(s)
+        i = m.start()
+        if s[i] == '"':
+            quoted = _STRING_RE.match(s, i)
+            if quoted is None:
+                return len(s)
+            pos = quoted.end()
+            continue
+        depth += 1 if s[i] == "{" else -1
+        if depth == 0:
+            return i + 1
+        pos = i + 1
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+CACHE_ENABLED = os.getenv("LLM_CACHE", "1") != "0"
+CACHE_DIR = os.getenv("LLM_CACHE_DIR", ".llm_cache")
+CACHE_TTL_SEC = float(os.getenv("LLM_CACHE_TTL_SEC", str(7 * 24 * 3600)))
+CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "256"))
+
+
+def make_cache_key(
+    model: str,
+    messages: List[Dict[str, Any]],
+    max_tokens: int,
+    json_mode: bool = False,
+    json_schema: Optional[Dict[str, Any]] = None,
+    extra: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Content address of a chat request: sha256 over a canonical JSON dump of
+    everything that can change the completion.
+    """
+    blob = json.dumps(
+        {
+            "model": model,
+            "messages": messages,
+            "max_tokens": int(max_tokens),
+            "json_mode": bool(json_mode),
+            "json_schema": json_schema,
+            "extra": extra or {},
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Persistent on-disk cache of raw completion strings.
+    - One file per key under <root>/<key[:2]>/<key>.json (atomic writes).
+    - Entries older than ttl_s are treated as misses and removed.
+    - Size-bounded LRU: mtime is bumped on every hit, oldest files go first.
+    """
+
+    def __init__(
+        self,
+        root: str | Path = CACHE_DIR,
+        ttl_s: float = CACHE_TTL_SEC,
+        max_bytes: int = int(CACHE_MAX_MB * 1024 * 1024),
+        enabled: bool = CACHE_ENABLED,
+    ) -> None:
+        self.root = Path(root)
+        self.ttl_s = ttl_s
+        self.max_bytes = max(0, max_bytes)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None  # lazily computed on first put
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        with self._lock:
+            try:
+                entry = json.loads(path.read_text(encoding="utf-8"))
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            except Exception as e:
+                log.debug("Dropping unreadable cache entry %s: %s", path, e)
+                self._remove(path)
+                self.misses += 1
+                return None
+
+            if self.ttl_s > 0 and time.time() - float(entry.get("created", 0)) > self.ttl_s:
+                self._remove(path)
+                self.misses += 1
+                return None
+
+            try:
+                os.utime(path, None)  # LRU touch
+            except OSError:
+                pass
+            self.hits += 1
+            return entry.get("value")
+
+    def put(self, key: str, value: str, meta: Optional[Dict[str, Any]] = None) -> None:
+        if not self.enabled:
+            return
+        path = self._path(key)
+        data = json.dumps(
+            {"created": time.time(), "meta": meta or {}, "value": value},
+            ensure_ascii=False,
+        ).encode("utf-8")
+        with self._lock:
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                old = path.stat().st_size if path.exists() else 0
+                tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+                tmp.write_bytes(data)
+                os.replace(tmp, path)
+            except OSError as e:
+                log.warning("LLM cache write failed for %s: %s", path, e)
+                return
+            self.writes += 1
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data) - old
+            if self.max_bytes and self._size > self.max_bytes:
+                self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            for p in self._entries():
+                self._remove(p)
+            self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "size_bytes": self._size,
+        }
+
+    # private --------------------------------------------------------------
+    def _entries(self) -> List[Path]:
+        if not self.root.is_dir():
+            return []
+        return list(self.root.glob("*/*.json"))
+
+    def _scan_size(self) -> int:
+        total = 0
+        for p in self._entries():
+            try:
+                total += p.stat().st_size
+            except OSError:
+                pass
+        return total
+
+    def _remove(self, path: Path) -> None:
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except OSError:
+            return
+        if self._size is not None:
+            self._size -= size
+
+    def _evict(self) -> None:
+        # Trim to 90% so we don't rescan the directory on every write.
+        target = int(self.max_bytes * 0.9)
+        files = []
+        for p in self._entries():
+            try:
+                st = p.stat()
+                files.append((st.st_mtime, st.st_size, p))
+            except OSError:
+                pass
+        files.sort()
+        size = sum(s for _, s, _ in files)
+        for _, s, p in files:
+            if size <= target:
+                break
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            size -= s
+            self.evictions += 1
+        self._size = size
+        log.debug("LLM cache evicted down to %s bytes", size)
+
+
+response_cache = LLMResponseCache()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Per-call LLM telemetry: wall time, time to first byte, prompt / cached /
+completion tokens, retries and estimated cost, tagged with the agent and stage
+that made the call (see llm_stage). Records go to a per-run JSONL file and can
+be scraped in Prometheus text format.
+"""
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("LLM_METRICS", "1") != "0"
+METRICS_DIR = os.getenv("LLM_METRICS_DIR", ".llm_metrics")
+METRICS_PORT = int(os.getenv("LLM_METRICS_PORT", "0"))  # 0 = no Prometheus endpoint
+
+# USD per 1M tokens: (input, cached input, output). Longest matching model prefix wins;
+# LLM_PRICES_JSON='{"my-model": [1, 0.1, 4]}' adds or overrides entries. Unknown models cost 0.
+PRICES: Dict[str, Tuple[float, float, float]] = {
+    "gpt-5-nano": (0.05, 0.005, 0.40),
+    "gpt-5-mini": (0.25, 0.025, 2.00),
+    "gpt-5": (1.25, 0.125, 10.00),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+}
+PRICES.update({k: tuple(v) for k, v in json.loads(os.getenv("LLM_PRICES_JSON", "{}")).items()})
+
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+
+_TAGS: contextvars.ContextVar[Dict[str, str]] = contextvars.ContextVar("llm_tags", default={})
+
+
+@contextlib.contextmanager
+def llm_stage(agent: str, stage: str) -> Iterator[None]:
+    """Tags every LLM call made inside the block (this thread / task) with agent and stage."""
+    token = _TAGS.set({**_TAGS.get(), "agent": agent, "stage": stage})
+    try:
+        yield
+    finally:
+        _TAGS.reset(token)
+
+
+def current_tags() -> Dict[str, str]:
+    tags = _TAGS.get()
+    return {"agent": tags.get("agent", "unknown"), "stage": tags.get("stage", "unknown")}
+
+
+def estimate_cost(model: str, prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> float:
+    match = max((p for p in PRICES if model.startswith(p)), key=len, default=None)
+    if match is None:
+        return 0.0
+    p_in, p_cached, p_out = PRICES[match]
+    uncached = max(0, prompt_tokens - cached_tokens)
+    return (uncached * p_in + cached_tokens * p_cached + completion_tokens * p_out) / 1e6
+
+
+def _pct(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    if len(values) == 1:
+        return round(values[0], 3)
+    return round(statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1], 3)
+
+
+class _Series:
+    """Aggregates for one (client, agent, stage, model) label set."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+        self.wall_sum = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.wall: Deque[float] = deque(maxlen=10_000)
+        self.ttfb: Deque[float] = deque(maxlen=10_000)
+
+
+class LLMMetrics:
+    """
+    Collects one record per LLM call (after retries).
+    - Each record is appended to <dir>/run-<timestamp>-<pid>.jsonl as it happens.
+    - summary() gives per-stage p50/p95 latency, tokens and cost for end-of-run reports.
+    - prometheus_text() / serve(port) expose the same aggregates for scraping.
+    """
+
+    def __init__(self, directory: Optional[str] = METRICS_DIR, enabled: bool = METRICS_ENABLED) -> None:
+        self.enabled = enabled
+        self.directory = Path(directory) if directory else None
+        self.path: Optional[Path] = None
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str, str, str], _Series] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def record(
+        self,
+        client: str,
+        model: str,
+        wall_s: float,
+        ttfb_s: Optional[float] = None,
+        usage: Optional[Dict[str, Any]] = None,
+        retries: int = 0,
+        ok: bool = True,
+        stream: bool = False,
+        error: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        usage = usage or {}
+        prompt = int(usage.get("prompt_tokens") or 0)
+        cached = int((usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0)
+        completion = int(usage.get("completion_tokens") or 0)
+        tags = current_tags()
+        rec = {
+            "ts": round(time.time(), 3),
+            "client": client,
+            **tags,
+            "model": model,
+            "ok": ok,
+            "stream": stream,
+            "wall_s": round(wall_s, 4),
+            "ttfb_s": round(ttfb_s, 4) if ttfb_s is not None else None,
+            "prompt_tokens": prompt,
+            "cached_tokens": cached,
+            "completion_tokens": completion,
+            "retries": retries,
+            "cost_usd": round(estimate_cost(model, prompt, cached, completion), 6),
+        }
+        if error:
+            rec["error"] = error[:500]
+
+        with self._lock:
+            s = self._series.setdefault((client, tags["agent"], tags["stage"], model), _Series())
+            s.calls += 1
+            s.errors += 0 if ok else 1
+            s.retries += retries
+            s.prompt_tokens += prompt
+            s.cached_tokens += cached
+            s.completion_tokens += completion
+            s.cost_usd += rec["cost_usd"]
+            s.wall_sum += wall_s
+            s.wall.append(wall_s)
+            if ttfb_s is not None:
+                s.ttfb.append(ttfb_s)
+            for i, le in enumerate(LATENCY_BUCKETS):
+                if wall_s <= le:
+                    s.buckets[i] += 1
+            self._append(rec)
+        return rec
+
+    def summary(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = []
+            for (client, agent, stage, model), s in sorted(self._series.items()):
+                wall, ttfb = list(s.wall), list(s.ttfb)
+                rows.append({
+                    "client": client, "agent": agent, "stage": stage, "model": model,
+                    "calls": s.calls, "errors": s.errors, "retries": s.retries,
+                    "p50_s": _pct(wall, 50), "p95_s": _pct(wall, 95), "ttfb_p50_s": _pct(ttfb, 50),
+                    "prompt_tokens": s.prompt_tokens, "cached_tokens": s.cached_tokens,
+                    "completion_tokens": s.completion_tokens, "cost_usd": round(s.cost_usd, 4),
+                })
+            return rows
+
+    def prometheus_text(self) -> str:
+        out: List[str] = []
+
+        def family(name: str, kind: str, help_: str) -> None:
+            out.append(f"# HELP {name} {help_}")
+            out.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            items = sorted(self._series.items())
+            family("llm_calls_total", "counter", "LLM calls by outcome.")
+            for key, s in items:
+                out.append(f'llm_calls_total{{{_labels(key)},outcome="ok"}} {s.calls - s.errors}')
+                out.append(f'llm_calls_total{{{_labels(key)},outcome="error"}} {s.errors}')
+            family("llm_retries_total", "counter", "Retried attempts.")
+            for key, s in items:
+                out.append(f"llm_retries_total{{{_labels(key)}}} {s.retries}")
+            family("llm_tokens_total", "counter", "Tokens by kind (cached is a subset of prompt).")
+            for key, s in items:
+                for kind, n in (("prompt", s.prompt_tokens), ("cached", s.cached_tokens),
+                                ("completion", s.completion_tokens)):
+                    out.append(f'llm_tokens_total{{{_labels(key)},kind="{kind}"}} {n}')
+            family("llm_cost_usd_total", "counter", "Estimated spend in USD.")
+            for key, s in items:
+                out.append(f"llm_cost_usd_total{{{_labels(key)}}} {s.cost_usd:.6f}")
+            family("llm_request_seconds", "histogram", "Wall time per call, retries included.")
+            for key, s in items:
+                for le, n in zip(LATENCY_BUCKETS, s.buckets):
+                    out.append(f'llm_request_seconds_bucket{{{_labels(key)},le="{le}"}} {n}')
+                out.append(f'llm_request_seconds_bucket{{{_labels(key)},le="+Inf"}} {s.calls}')
+                out.append(f"llm_request_seconds_sum{{{_labels(key)}}} {s.wall_sum:.4f}")
+                out.append(f"llm_request_seconds_count{{{_labels(key)}}} {s.calls}")
+        return "\n".join(out) + "\n"
+
+    def serve(self, port: int = METRICS_PORT, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """Starts a daemon thread serving GET /metrics in Prometheus text format."""
+        if self._server is not None:
+            return self._server
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                data = metrics.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, fmt: str, *args: Any) -> None:
+                log.debug(fmt, *args)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="llm-metrics", daemon=True).start()
+        log.info("LLM metrics on http://%s:%s/metrics", host, self._server.server_address[1])
+        return self._server
+
+    # private --------------------------------------------------------------
+    def _append(self, rec: Dict[str, Any]) -> None:
+        if self.directory is None:
+            return
+        try:
+            if self.path is None:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self.path = self.directory / f"run-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl"
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        except OSError as e:
+            log.debug("Metrics write failed: %s", e)
+
+
+def _labels(key: Tuple[str, str, str, str]) -> str:
+    names = ("client", "agent", "stage", "model")
+    return ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, key))
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+llm_metrics = LLMMetrics()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import logging
+import os
+import statistics
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+HEALTH_INTERVAL = float(os.getenv("LLM_HEALTH_INTERVAL_SEC", "15"))
+EJECT_AFTER_FAILURES = int(os.getenv("LLM_EJECT_AFTER_FAILURES", "3"))
+EJECT_SLOW_FACTOR = float(os.getenv("LLM_EJECT_SLOW_FACTOR", "3.0"))
+EJECT_SEC = float(os.getenv("LLM_EJECT_SEC", "30"))
+
+
+@dataclass
+class Backend:
+    base: str
+    outstanding: int = 0
+    ewma_s: Optional[float] = None
+    samples: int = 0
+    consecutive_failures: int = 0
+    ejected: bool = False
+    retry_at: float = 0.0  # earliest re-admission check while ejected
+    requests: int = 0
+    failures: int = 0
+
+
+class LLMRouter:
+    """
+    Spreads requests across several OpenAI-compatible backends (LM Studio boxes).
+    - Least-outstanding-requests; ties go to the lower latency EWMA.
+    - A backend is ejected for eject_s after `eject_after` consecutive failures, or when
+      its EWMA is `slow_factor` times the median of its peers.
+    - A background thread re-probes every backend each `health_interval` seconds:
+      failing ones are ejected; ejected ones are re-admitted once eject_s has passed
+      and they answer the probe again (without the thread: once eject_s has passed).
+    """
+
+    def __init__(
+        self,
+        bases: List[str],
+        probe: Callable[[str], bool],
+        health_interval: float = HEALTH_INTERVAL,
+        eject_after: int = EJECT_AFTER_FAILURES,
+        slow_factor: float = EJECT_SLOW_FACTOR,
+        eject_s: float = EJECT_SEC,
+        alpha: float = 0.3,
+        down: Optional[List[str]] = None,
+    ) -> None:
+        if not bases:
+            raise ValueError("LLMRouter needs at least one backend")
+        self.backends = [Backend(b.rstrip("/")) for b in bases]
+        # Backends that failed the initial probe start ejected; the health loop admits them later.
+        for b in self.backends:
+            if down and b.base in down:
+                b.ejected = True
+        self._probe = probe
+        self.health_interval = health_interval
+        self.eject_after = eject_after
+        self.slow_factor = slow_factor
+        self.eject_s = eject_s
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._checker: Optional[threading.Thread] = None
+        if health_interval > 0:
+            self._checker = threading.Thread(target=self._health_loop, name="llm-health", daemon=True)
+            self._checker.start()
+
+    def acquire(self) -> Backend:
+        with self._lock:
+            now = time.time()
+            if self._checker is None:
+                for b in self.backends:
+                    if b.ejected and now >= b.retry_at:
+                        self._readmit(b)
+            pool = [b for b in self.backends if not b.ejected]
+            if not pool:
+                # Everything is ejected: use the one that comes back soonest rather than fail.
+                pool = [min(self.backends, key=lambda b: b.retry_at)]
+            best = min(pool, key=lambda b: (b.outstanding, b.ewma_s if b.ewma_s is not None else 0.0))
+            best.outstanding += 1
+            best.requests += 1
+            return best
+
+    def release(self, backend: Backend, elapsed_s: float, ok: bool) -> None:
+        with self._lock:
+            backend.outstanding = max(0, backend.outstanding - 1)
+            if not ok:
+                backend.failures += 1
+                backend.consecutive_failures += 1
+                if backend.consecutive_failures >= self.eject_after:
+                    self._eject(backend, f"{backend.consecutive_failures} consecutive failures")
+                return
+            backend.consecutive_failures = 0
+            backend.samples += 1
+            backend.ewma_s = elapsed_s if backend.ewma_s is None else (
+                self.alpha * elapsed_s + (1 - self.alpha) * backend.ewma_s
+            )
+            self._check_slow(backend)
+
+    def close(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {
+                    "base": b.base,
+                    "outstanding": b.outstanding,
+                    "ewma_s": round(b.ewma_s, 3) if b.ewma_s is not None else None,
+                    "requests": b.requests,
+                    "failures": b.failures,
+                    "ejected": b.ejected,
+                }
+                for b in self.backends
+            ]
+
+    # private --------------------------------------------------------------
+    def _eject(self, backend: Backend, reason: str) -> None:
+        if len(self.backends) == 1 or backend.ejected:
+            return  # nowhere else to send traffic / already out
+        backend.ejected = True
+        backend.retry_at = time.time() + self.eject_s
+        log.warning("Ejecting LLM backend %s for %.0fs: %s", backend.base, self.eject_s, reason)
+
+    def _readmit(self, backend: Backend) -> None:
+        log.info("Re-admitting LLM backend %s", backend.base)
+        backend.ejected = False
+        backend.consecutive_failures = 0
+        # Forget the slow history so it gets a fair share again.
+        peers = [b.ewma_s for b in self.backends if b is not backend and b.ewma_s is not None]
+        backend.ewma_s = statistics.median(peers) if peers else None
+        backend.samples = 0
+
+    def _check_slow(self, backend: Backend) -> None:
+        peers = [b.ewma_s for b in self.backends if b is not backend and b.ewma_s is not None and b.samples >= 3]
+        if backend.samples < 3 or not peers or backend.ewma_s is None:
+            return
+        median = statistics.median(peers)
+        if median > 0 and backend.ewma_s > self.slow_factor * median:
+            self._eject(backend, f"EWMA {backend.ewma_s:.1f}s vs peers {median:.1f}s")
+
+    def _health_loop(self) -> None:
+        while not self._stop.wait(self.health_interval):
+            for b in list(self.backends):
+                if b.ejected and time.time() < b.retry_at:
+                    continue
+                try:
+                    ok = self._probe(b.base)
+                except Exception:
+                    ok = False
+                with self._lock:
+                    if b.ejected:
+                        if ok:
+                            self._readmit(b)
+                        else:
+                            b.retry_at = time.time() + self.eject_s
+                    elif not ok:
+                        self._eject(b, "health check failed")
@@ -1,13 +1,24 @@
 # utils/local_llm.py
+import contextlib
+import functools
 import json
 import logging
 import os
+import queue
 import socket
+import threading
 import time
-from typing import Any, Dict, List, Optional, Tuple
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import requests
 
+from utils.llm_cache import LLMResponseCache, make_cache_key
+from utils.llm_metrics import llm_metrics
+from utils.llm_router import LLMRouter
+from utils.singleflight import SingleFlight, request_key
+from utils.streaming import delta_content, iter_sse_data
+
 logger = logging.getLogger(__name__)
 logging.basicConfig(
     level=os.getenv("LOG_LEVEL", "DEBUG"),
@@ -22,6 +33,26 @@ DEFAULT_RETRY_BACKOFF_MS = int(os.getenv("LLM_RETRY_BACKOFF_MS", "500"))
 ENV_BASE_URL = os.getenv("LLM_BASE_URL", "").strip().rstrip("/")
 ENV_HOSTS = [h.strip() for h in os.getenv("LLM_HOSTS", "").split(",") if h.strip()]
 
+PROBE_TIMEOUT = float(os.getenv("LLM_PROBE_TIMEOUT_SEC", "5"))
+ENDPOINT_CACHE_FILE = os.getenv(
+    "LLM_ENDPOINT_CACHE", str(Path.home() / ".cache" / "playwright-agent" / "llm_endpoint.json")
+)
+ENDPOINT_TTL = float(os.getenv("LLM_ENDPOINT_TTL_SEC", "600"))
+DEAD_HOST_TTL = float(os.getenv("LLM_DEAD_HOST_TTL_SEC", "60"))
+ROUTING = os.getenv("LLM_ROUTING", "0") == "1"
+
+@functools.lru_cache(maxsize=1)
+def _primary_ip() -> Optional[str]:
+    # UDP connect sends nothing; it only asks the kernel which interface routes outward.
+    try:
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.connect(("8.8.8.8", 80))
+        ip = s.getsockname()[0]
+        s.close()
+        return ip
+    except Exception:
+        return None
+
 def _candidate_hosts() -> List[str]:
     hosts: List[str] = []
     hosts.extend(ENV_HOSTS)
@@ -29,15 +60,9 @@ def _candidate_hosts() -> List[str]:
         hosts.append("host.docker.internal")
     if "localhost" not in hosts:
         hosts.append("localhost")
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        primary_ip = s.getsockname()[0]
-        s.close()
-        if primary_ip not in hosts:
-            hosts.append(primary_ip)
-    except Exception:
-        pass
+    primary_ip = _primary_ip()
+    if primary_ip and primary_ip not in hosts:
+        hosts.append(primary_ip)
     seen = set()
     uniq: List[str] = []
     for h in hosts:
@@ -46,11 +71,74 @@ def _candidate_hosts() -> List[str]:
             seen.add(h)
     return uniq
 
+class _EndpointCache:
+    """
+    Small JSON file remembering the resolved base URL per configuration (TTL) and
+    recently dead candidates (negative TTL), shared by every process on the host.
+    """
+
+    def __init__(self, path: str = ENDPOINT_CACHE_FILE, ttl: float = ENDPOINT_TTL,
+                 dead_ttl: float = DEAD_HOST_TTL) -> None:
+        self.path = Path(path) if path else None
+        self.ttl = ttl
+        self.dead_ttl = dead_ttl
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Any]:
+        if self.path is None:
+            return {}
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except Exception:
+            return {}
+
+    def _store(self, data: Dict[str, Any]) -> None:
+        if self.path is None:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(data), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.debug("Endpoint cache write failed: %s", e)
+
+    def resolved(self, config_key: str) -> Optional[str]:
+        entry = self._load().get("resolved", {}).get(config_key)
+        if entry and time.time() - entry.get("ts", 0) < self.ttl:
+            return entry.get("base")
+        return None
+
+    def dead(self) -> List[str]:
+        now = time.time()
+        return [u for u, ts in self._load().get("dead", {}).items() if now - ts < self.dead_ttl]
+
+    def update(self, config_key: str, base: Optional[str], dead: List[str]) -> None:
+        with self._lock:
+            data = self._load()
+            now = time.time()
+            res = data.setdefault("resolved", {})
+            if base:
+                res[config_key] = {"base": base, "ts": now}
+            else:
+                res.pop(config_key, None)
+            dead_map = {u: ts for u, ts in data.get("dead", {}).items() if now - ts < self.dead_ttl}
+            for u in dead:
+                dead_map[u] = now
+            if base:
+                dead_map.pop(base, None)
+            data["dead"] = dead_map
+            self._store(data)
+
 class LocalLLMClient:
     """
     Hardened client for OpenAI-compatible /v1 API (LM Studio, etc.).
-    - Prefers LLM_BASE_URL; otherwise probes known hosts on DEFAULT_PORT.
+    - Prefers LLM_BASE_URL; otherwise probes known hosts on DEFAULT_PORT concurrently
+      and takes the first healthy one. The result (and dead hosts) is cached on disk.
+    - routing=True (LLM_ROUTING=1) spreads requests over every candidate instead
+      (LLM_BASE_URL may then list several URLs, comma-separated); see LLMRouter.
     - Retries with backoff, rich logging.
+    - Optional persistent response cache (pass an LLMResponseCache).
     """
 
     def __init__(
@@ -61,6 +149,9 @@ class LocalLLMClient:
         retries: int = DEFAULT_RETRIES,
         retry_backoff_ms: int = DEFAULT_RETRY_BACKOFF_MS,
         session: Optional[requests.Session] = None,
+        cache: Optional[LLMResponseCache] = None,
+        endpoint_cache: Optional[_EndpointCache] = None,
+        routing: bool = ROUTING,
     ) -> None:
         self._configured_base_url = (base_url or ENV_BASE_URL).rstrip("/") if (base_url or ENV_BASE_URL) else ""
         self._port = port
@@ -69,9 +160,18 @@ class LocalLLMClient:
         self._retry_backoff_ms = max(0, retry_backoff_ms)
         self._session = session or requests.Session()
         self._resolved_base_url: Optional[str] = None
+        self._cache = cache
+        self._endpoints = endpoint_cache or _EndpointCache()
+        self._routing = routing
+        self._router: Optional[LLMRouter] = None
+        self._router_lock = threading.Lock()
+        self.inflight = SingleFlight()
 
     def health_check(self) -> Tuple[bool, Optional[str]]:
         try:
+            if self._routing:
+                healthy = [b["base"] for b in self._ensure_router().stats() if not b["ejected"]]
+                return bool(healthy), ",".join(healthy)
             base = self._ensure_base_url()
             return True, base
         except Exception as e:
@@ -87,8 +187,6 @@ class LocalLLMClient:
         extra_payload: Optional[Dict[str, Any]] = None,
         return_json: bool = False,
     ) -> Any:
-        base = self._ensure_base_url()
-        url = f"{base}/v1/chat/completions"
         payload: Dict[str, Any] = {
             "model": model,
             "messages": messages,
@@ -99,65 +197,264 @@ class LocalLLMClient:
         if extra_payload:
             payload.update(extra_payload)
 
+        # Full response JSON is not cached, only message content.
+        cache_key: Optional[str] = None
+        if self._cache is not None and not return_json:
+            cache_key = make_cache_key(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                extra={"temperature": temperature, "top_p": top_p, **(extra_payload or {})},
+            )
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                logger.debug("LLM cache hit | model=%s key=%s", model, cache_key[:12])
+                return cached
+
+        # Identical concurrent requests share one upstream call.
+        params = {k: v for k, v in payload.items() if k not in ("model", "messages")}
+        flight_key = request_key(model, messages, return_json=return_json, **params)
+        return self.inflight.do(flight_key, lambda: self._post_chat(payload, cache_key, return_json))
+
+    def _post_chat(self, payload: Dict[str, Any], cache_key: Optional[str], return_json: bool) -> Any:
+        model = payload["model"]
         attempt = 0
         last_error: Optional[Exception] = None
+        t0 = time.monotonic()
+        ttfb: Optional[float] = None
 
         while True:
             attempt += 1
             try:
-                logger.debug(
-                    "LLM call | url=%s model=%s temp=%s top_p=%s max_tokens=%s attempt=%s",
-                    url, model, temperature, top_p, max_tokens, attempt,
-                )
-                r = self._session.post(url, json=payload, timeout=self._timeout)
-                logger.debug("LLM raw status=%s body=%s", r.status_code, self._safe_text(r))
-                r.raise_for_status()
+                with self._backend() as base:
+                    url = f"{base}/v1/chat/completions"
+                    logger.debug(
+                        "LLM call | url=%s model=%s temp=%s top_p=%s max_tokens=%s attempt=%s",
+                        url, model, payload["temperature"], payload["top_p"], payload["max_tokens"], attempt,
+                    )
+                    r = self._session.post(url, json=payload, timeout=self._timeout)
+                    ttfb = r.elapsed.total_seconds()
+                    logger.debug("LLM raw status=%s body=%s", r.status_code, self._safe_text(r))
+                    r.raise_for_status()
 
-                data = r.json()
-                content = self._extract_content(data)
+                    data = r.json()
+                    content = self._extract_content(data)
 
+                llm_metrics.record("local", model, time.monotonic() - t0, ttfb, data.get("usage"),
+                                   retries=attempt - 1)
                 if return_json:
                     return data
+                if cache_key is not None:
+                    self._cache.put(cache_key, content, meta={"model": model, "base": base})
                 return content
 
             except Exception as e:
                 last_error = e
                 logger.error("LLM request failed on attempt %s: %s", attempt, e)
+                if isinstance(e, requests.ConnectionError) and not self._routing:
+                    self._forget_base_url()
                 if attempt > self._retries:
                     break
                 self._sleep_backoff(attempt)
 
+        llm_metrics.record("local", model, time.monotonic() - t0, ttfb, retries=attempt - 1,
+                           ok=False, error=str(last_error))
         raise RuntimeError(f"LLM call failed after {attempt} attempts: {last_error}")
 
+    def stream_chat(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.0,
+        top_p: float = 0.1,
+        max_tokens: int = 2048,
+        extra_payload: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[str]:
+        """
+        Streaming variant of call_chat (stream=True, SSE); yields content deltas.
+        Retries only until the first delta has been yielded.
+        """
+        payload: Dict[str, Any] = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "top_p": top_p,
+            "max_tokens": max_tokens,
+            "stream": True,
+        }
+        if extra_payload:
+            payload.update(extra_payload)
+
+        info: Dict[str, Any] = {"attempts": 1}
+        t0 = time.monotonic()
+        error: Optional[str] = "closed by consumer"
+        try:
+            yield from self._stream_chat(payload, info)
+            error = None
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            ttfb = info["first_delta"] - t0 if "first_delta" in info else None
+            llm_metrics.record("local", model, time.monotonic() - t0, ttfb, info.get("usage"),
+                               retries=info["attempts"] - 1, ok=error is None, stream=True, error=error)
+
+    def _stream_chat(self, payload: Dict[str, Any], info: Dict[str, Any]) -> Iterator[str]:
+        model = payload["model"]
+        attempt = 0
+        last_error: Optional[Exception] = None
+
+        while True:
+            attempt += 1
+            info["attempts"] = attempt
+            started = False
+            try:
+                with self._backend() as base:
+                    url = f"{base}/v1/chat/completions"
+                    logger.debug("LLM stream | url=%s model=%s attempt=%s", url, model, attempt)
+                    with self._session.post(url, json=payload, timeout=self._timeout, stream=True) as r:
+                        r.raise_for_status()
+                        for event in iter_sse_data(r.iter_lines(decode_unicode=True)):
+                            if event.get("usage"):
+                                info["usage"] = event["usage"]
+                            text = delta_content(event)
+                            if text:
+                                if not started:
+                                    info["first_delta"] = time.monotonic()
+                                started = True
+                                yield text
+                    if not started:
+                        raise ValueError("LLM stream produced no content")
+                return
+            except Exception as e:
+                if started:
+                    raise
+                last_error = e
+                logger.error("LLM stream failed on attempt %s: %s", attempt, e)
+                if attempt > self._retries:
+                    break
+                self._sleep_backoff(attempt)
+
+        raise RuntimeError(f"LLM stream failed after {attempt} attempts: {last_error}")
+
+    def router_stats(self) -> List[Dict[str, Any]]:
+        """Per-backend routing counters (empty when routing is off or not started yet)."""
+        return self._router.stats() if self._router is not None else []
+
+    @contextlib.contextmanager
+    def _backend(self) -> Iterator[str]:
+        """Yields the base URL for one request; with routing on, reports the outcome to the router."""
+        if not self._routing:
+            yield self._ensure_base_url()
+            return
+        router = self._ensure_router()
+        backend = router.acquire()
+        t0 = time.monotonic()
+        ok = True
+        try:
+            yield backend.base
+        except requests.HTTPError as e:
+            # Client errors are the request's fault, not the backend's.
+            ok = e.response is not None and e.response.status_code < 500
+            raise
+        except Exception:
+            ok = False
+            raise
+        finally:
+            router.release(backend, time.monotonic() - t0, ok)
+
+    def _ensure_router(self) -> LLMRouter:
+        with self._router_lock:
+            if self._router is None:
+                candidates = self._candidates()
+                healthy = self._probe_healthy(candidates, first_only=False)[0]
+                if not healthy:
+                    raise ConnectionError(
+                        f"No healthy LLM backend to route to. Tried: {candidates}. "
+                        f"Set LLM_BASE_URL / LLM_HOSTS or ensure your LM Studio servers are reachable."
+                    )
+                down = [c for c in candidates if c not in healthy]
+                self._router = LLMRouter(candidates, probe=self._probe_models, down=down)
+                logger.info("LLM routing across %s (down: %s)", healthy, down)
+            return self._router
+
+    def _candidates(self) -> List[str]:
+        if self._configured_base_url:
+            return [u.strip().rstrip("/") for u in self._configured_base_url.split(",") if u.strip()]
+        return [f"http://{h}:{self._port}" for h in _candidate_hosts()]
+
+    def _config_key(self) -> str:
+        return self._configured_base_url or f"hosts={','.join(ENV_HOSTS)};port={self._port}"
+
     def _ensure_base_url(self) -> str:
         if self._resolved_base_url:
             return self._resolved_base_url
 
-        candidates: List[str] = []
-        if self._configured_base_url:
-            candidates.append(self._configured_base_url.rstrip("/"))
-        else:
-            for h in _candidate_hosts():
-                candidates.append(f"http://{h}:{self._port}")
+        cached = self._endpoints.resolved(self._config_key())
+        if cached:
+            logger.debug("LLM base URL from endpoint cache: %s", cached)
+            self._resolved_base_url = cached
+            return cached
 
-        logger.debug("Probing LLM base URLs: %s", candidates)
-        for base in candidates:
-            try:
-                if self._probe_models(base):
-                    self._resolved_base_url = base.rstrip("/")
-                    logger.info("LLM base URL resolved: %s", self._resolved_base_url)
-                    return self._resolved_base_url
-            except Exception as e:
-                logger.debug("Probe failed for %s: %s", base, e)
+        candidates = self._candidates()
+
+        # Skip hosts that failed recently, unless that would leave nothing to try.
+        dead = set(self._endpoints.dead())
+        live = [c for c in candidates if c not in dead] or candidates
+
+        logger.debug("Probing LLM base URLs concurrently: %s (skipping dead: %s)",
+                     live, sorted(dead & set(candidates)))
+        healthy, failed = self._probe_healthy(live, first_only=True)
+        base = healthy[0] if healthy else None
+        self._endpoints.update(self._config_key(), base, failed)
+        if base:
+            self._resolved_base_url = base.rstrip("/")
+            logger.info("LLM base URL resolved: %s", self._resolved_base_url)
+            return self._resolved_base_url
 
         raise ConnectionError(
             f"Could not resolve a healthy LLM base URL. Tried: {candidates}. "
             f"Set LLM_BASE_URL or ensure your LM Studio server is reachable."
         )
 
+    def _probe_healthy(self, candidates: List[str], first_only: bool) -> Tuple[List[str], List[str]]:
+        """
+        Probes all candidates concurrently. Returns (healthy bases in answer order, failed
+        bases); with first_only it returns as soon as one healthy base has answered.
+        """
+        results: "queue.Queue[Tuple[str, bool]]" = queue.Queue()
+
+        def probe(base: str) -> None:
+            try:
+                results.put((base, self._probe_models(base)))
+            except Exception as e:
+                logger.debug("Probe failed for %s: %s", base, e)
+                results.put((base, False))
+
+        # Daemon threads: stragglers must not hold up the caller or interpreter exit.
+        for c in candidates:
+            threading.Thread(target=probe, args=(c,), name="llm-probe", daemon=True).start()
+        healthy: List[str] = []
+        failed: List[str] = []
+        for _ in candidates:
+            base, ok = results.get()
+            if not ok:
+                failed.append(base)
+                continue
+            healthy.append(base)
+            if first_only:
+                break
+        return healthy, failed
+
+    def _forget_base_url(self) -> None:
+        if self._resolved_base_url:
+            logger.info("Dropping unreachable LLM base URL: %s", self._resolved_base_url)
+            self._endpoints.update(self._config_key(), None, [self._resolved_base_url])
+        self._resolved_base_url = None
+
     def _probe_models(self, base: str) -> bool:
         url = f"{base.rstrip('/')}/v1/models"
-        r = self._session.get(url, timeout=min(self._timeout, 10.0))
+        r = self._session.get(url, timeout=min(self._timeout, PROBE_TIMEOUT))
         logger.debug("Probe /v1/models status=%s body=%s", r.status_code, self._safe_text(r))
         r.raise_for_status()
         try:
@@ -193,3 +490,23 @@ class LocalLLMClient:
         time.sleep(sleep_ms / 1000.0)
 
 llm_client = LocalLLMClient()
+
+DEFAULT_MODEL = os.getenv("LLM_MODEL", "mistralai/devstral-small-2507")
+
+def call_llm(
+    prompt: Optional[str] = None,
+    model: str = DEFAULT_MODEL,
+    temperature: float = 0.0,
+    max_tokens: int = 2048,
+    system_prompt: Optional[str] = None,
+    user_prompt: Optional[str] = None,
+) -> str:
+    """One-shot chat call through the shared llm_client; returns the message content.
+
+    system_prompt=None leaves the system prompt to the server-side preset.
+    """
+    messages: List[Dict[str, str]] = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": prompt if prompt is not None else (user_prompt or "")})
+    return llm_client.call_chat(model=model, messages=messages, temperature=temperature, max_tokens=max_tokens)
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Static checks on a converted file map: check_mapping decides whether the
+analyzer's mapping is good enough to skip the builder pass, broken_modules
+finds the files the repair pass has to fix.
+"""
+from __future__ import annotations
+
+import ast
+import logging
+import os
+import sys
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from utils.json_mapping_validator import validate_code_mapping
+
+log = logging.getLogger(__name__)
+
+# Top-level packages converted code may import besides the stdlib and the project's own modules.
+KNOWN_PACKAGES = {"playwright", "pytest", "pytest_playwright", "pages", "tests", "conftest"}
+# More of them for suites with other dependencies, comma-separated (e.g. "faker,requests").
+ALLOWED_PACKAGES = KNOWN_PACKAGES | {
+    p.strip() for p in os.getenv("CONVERT_ALLOWED_PACKAGES", "").split(",") if p.strip()
+}
+
+SELENIUM_NAMES = {"webdriver", "WebDriverWait", "By", "EC", "expected_conditions", "ActionChains", "Keys", "Select"}
+SELENIUM_ATTRS = {"find_element", "find_elements", "send_keys", "until", "until_not", "switch_to", "execute_script"}
+SLEEP_ATTRS = {"sleep", "wait_for_timeout"}
+
+# Below this much code, compiling inline beats shipping it to worker processes.
+PARALLEL_COMPILE_MIN_CHARS = int(os.getenv("CONVERT_PARALLEL_COMPILE_MIN_CHARS", "262144"))
+
+
+def _module_key(module: str) -> str:
+    return module.replace(".", "/")
+
+
+def _defined_names(tree: ast.Module) -> Set[str]:
+    names: Set[str] = set()
+    for node in tree.body:
+        if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.Assign):
+            names.update(t.id for t in node.targets if isinstance(t, ast.Name))
+        elif isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name):
+            names.add(node.target.id)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((a.asname or a.name).split(".")[0] for a in node.names)
+    return names
+
+
+def _resolvable(top: str, out_dir: Optional[Path] = None) -> bool:
+    """Allowed package, stdlib module, or a top.py / top/ of the project in out_dir (never what is installed here)."""
+    if top in ALLOWED_PACKAGES or top in sys.stdlib_module_names:
+        return True
+    if out_dir is None:
+        return False
+    return (Path(out_dir) / f"{top}.py").is_file() or (Path(out_dir) / top).is_dir()
+
+
+def selenium_usages(tree: ast.AST) -> List[Tuple[int, str]]:
+    """(line, what) for every Selenium import, name or API call and every sleep left in tree."""
+    found: List[Tuple[int, str]] = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            modules = [node.module or ""] if isinstance(node, ast.ImportFrom) else [a.name for a in node.names]
+            found.extend((node.lineno, f"imports {m}") for m in modules if m.split(".")[0] == "selenium")
+        elif isinstance(node, ast.Name) and node.id in SELENIUM_NAMES:
+            found.append((node.lineno, f"Selenium name {node.id}"))
+        elif isinstance(node, ast.Attribute):
+            if node.attr in SELENIUM_ATTRS or node.attr.startswith("find_element_by_"):
+                found.append((node.lineno, f"Selenium API .{node.attr}"))
+            elif node.attr in SLEEP_ATTRS:
+                found.append((node.lineno, f".{node.attr}"))
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "sleep":
+            found.append((node.lineno, "sleep()"))
+    return found
+
+
+def check_mapping(mapping: Dict[str, Any], out_dir: Optional[Path] = None) -> List[str]:
+    """
+    Returns the problems found (empty list = passes):
+      - keys outside pages/ / tests/ / conftest, empty or non-string code
+      - modules that do not parse
+      - pages/tests imports that neither the mapping nor out_dir provides (or that
+        lack the imported name)
+      - other imports that are not stdlib, ALLOWED_PACKAGES or a module of out_dir
+      - Selenium APIs or sleeps left in the code
+    """
+    clean, bad_keys = validate_code_mapping(mapping)
+    problems = [f"key {k}: {why}" for k, why in bad_keys.items()]
+
+    trees: Dict[str, ast.Module] = {}
+    for key, code in clean.items():
+        try:
+            trees[key] = ast.parse(code)
+        except SyntaxError as e:
+            problems.append(f"{key}: syntax error line {e.lineno}: {e.msg}")
+
+    resolve = _module_resolver(trees, out_dir)
+    for key, tree in trees.items():
+        problems.extend(f"{key}: {what} (line {line})" for line, what in selenium_usages(tree))
+        problems.extend(f"{key}: {what}" for what in _import_problems(tree, resolve, third_party=True, out_dir=out_dir))
+    return problems
+
+
+def _module_resolver(
+    trees: Dict[str, ast.Module], out_dir: Optional[Path]
+) -> Callable[[str], Optional[ast.Module]]:
+    """Key -> parsed module, from the mapping first and then from out_dir (None if neither has it)."""
+    disk_cache: Dict[str, Optional[ast.Module]] = {}
+
+    def module_tree(key: str) -> Optional[ast.Module]:
+        if key in trees:
+            return trees[key]
+        if out_dir is None:
+            return None
+        if key not in disk_cache:
+            path = Path(out_dir) / f"{key}.py"
+            try:
+                disk_cache[key] = ast.parse(path.read_text(encoding="utf-8")) if path.exists() else None
+            except (OSError, SyntaxError):
+                disk_cache[key] = None
+        return disk_cache[key]
+
+    return module_tree
+
+
+def _import_problems(
+    tree: ast.Module,
+    resolve: Callable[[str], Optional[ast.Module]],
+    third_party: bool,
+    out_dir: Optional[Path] = None,
+) -> List[str]:
+    problems: List[str] = []
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.Import, ast.ImportFrom)):
+            continue
+        if isinstance(node, ast.ImportFrom) and node.level:
+            continue  # relative imports: package layout is the writer's business
+        modules = [node.module] if isinstance(node, ast.ImportFrom) else [a.name for a in node.names]
+        for module in modules:
+            top = (module or "").split(".")[0]
+            if top in ("pages", "tests") or module == "conftest":
+                key = _module_key(module or "")
+                target = resolve(key)
+                if isinstance(node, ast.ImportFrom):
+                    names = [a.name for a in node.names if a.name != "*"]
+                    # `from pages import login_page` imports the submodule pages/login_page.
+                    missing = [n for n in names
+                               if (target is None or n not in _defined_names(target))
+                               and resolve(f"{key}/{n}") is None]
+                    if target is None and len(missing) == len(names):
+                        problems.append(f"import {module} does not resolve (line {node.lineno})")
+                    elif missing:
+                        problems.append(f"{module} has no {', '.join(missing)} (line {node.lineno})")
+                elif target is None:
+                    problems.append(f"import {module} does not resolve (line {node.lineno})")
+            elif third_party and top != "selenium" and not _resolvable(top, out_dir):
+                problems.append(f"unknown package {top}")
+    return problems
+
+
+def _compile_error(item: Tuple[str, str]) -> Optional[str]:
+    key, code = item
+    try:
+        compile(code, f"{key}.py", "exec", dont_inherit=True)
+        return None
+    except (SyntaxError, ValueError) as e:
+        line = getattr(e, "lineno", None)
+        return f"{type(e).__name__} line {line}: {getattr(e, 'msg', e)}" if line else f"{type(e).__name__}: {e}"
+
+
+_COMPILE_POOL: Optional[ProcessPoolExecutor] = None
+_COMPILE_POOL_GUARD = threading.Lock()
+
+
+def _compile_all(items: List[Tuple[str, str]]) -> List[Optional[str]]:
+    """compile() errors per module; large mappings are compiled on a process pool."""
+    global _COMPILE_POOL
+    if len(items) < 2 or sum(len(c) for _, c in items) < PARALLEL_COMPILE_MIN_CHARS:
+        return [_compile_error(i) for i in items]
+    with _COMPILE_POOL_GUARD:
+        if _COMPILE_POOL is None:
+            _COMPILE_POOL = ProcessPoolExecutor(max_workers=min(8, os.cpu_count() or 1))
+    try:
+        return list(_COMPILE_POOL.map(_compile_error, items, chunksize=4))
+    except (OSError, BrokenProcessPool) as e:
+        log.debug("Compile pool unavailable (%s); compiling inline", e)
+        return [_compile_error(i) for i in items]
+
+
+def broken_modules(mapping: Dict[str, str], out_dir: Optional[Path] = None) -> Dict[str, List[str]]:
+    """
+    Per key, what keeps a generated module from loading: compile() errors and
+    pages/tests/conftest imports that neither the mapping nor out_dir provides.
+    Third-party packages and leftover Selenium are not reported (see check_mapping).
+    """
+    items = [(k, v) for k, v in mapping.items() if isinstance(v, str)]
+    broken: Dict[str, List[str]] = {}
+    trees: Dict[str, ast.Module] = {}
+    for (key, code), err in zip(items, _compile_all(items)):
+        if err:
+            broken[key] = [err]
+        else:
+            trees[key] = ast.parse(code)
+    resolve = _module_resolver(trees, out_dir)
+    for key, tree in trees.items():
+        problems = _import_problems(tree, resolve, third_party=False)
+        if problems:
+            broken[key] = problems
+    return broken
+
+
+class GateStats:
+    """Counts how often the builder pass was skipped, and why it was not."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.skipped = 0
+        self.reasons: Counter = Counter()
+
+    def add(self, problems: List[str]) -> None:
+        with self._lock:
+            self.checked += 1
+            if not problems:
+                self.skipped += 1
+            for p in problems:
+                # "tests/x: Selenium API .send_keys (line 3)" -> "Selenium API .send_keys"
+                self.reasons[p.split(": ", 1)[-1].split(" (line")[0]] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checked": self.checked,
+                "builder_skipped": self.skipped,
+                "skip_rate": round(self.skipped / self.checked, 3) if self.checked else 0.0,
+                "top_reasons": self.reasons.most_common(5),
+            }
+
+
+gate_stats = GateStats()
+
+
+class RepairStats:
+    """Counts files that failed the post-generation check and how many repair rounds fixed."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.broken = 0
+        self.repaired = 0
+        self.rounds = 0
+        self.reasons: Counter = Counter()
+
+    def add(self, broken: Dict[str, List[str]], still_broken: Dict[str, List[str]], rounds: int) -> None:
+        with self._lock:
+            self.checked += 1
+            self.broken += len(broken)
+            self.repaired += len(set(broken) - set(still_broken))
+            self.rounds += rounds
+            for problems in broken.values():
+                for p in problems:
+                    # "SyntaxError line 3: invalid syntax" -> "SyntaxError"
+                    self.reasons[p.split(" line ")[0].split(" (line")[0].split(":")[0]] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checked": self.checked,
+                "broken_files": self.broken,
+                "repaired_files": self.repaired,
+                "rounds": self.rounds,
+                "top_reasons": self.reasons.most_common(5),
+            }
+
+
+repair_stats = RepairStats()
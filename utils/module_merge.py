@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+AST-guided merge of generated Python modules that landed on the same file key
+(e.g. two chunks of one Selenium test both emitting tests/test_login).
+Text is spliced from the original sources so formatting and comments survive.
+"""
+from __future__ import annotations
+
+import ast
+import logging
+import textwrap
+from typing import Dict, Iterable, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+
+def _node_span(node: ast.AST) -> Tuple[int, int]:
+    """1-based inclusive line span, decorators included."""
+    start = node.lineno
+    for d in getattr(node, "decorator_list", []) or []:
+        start = min(start, d.lineno)
+    return start, node.end_lineno or node.lineno
+
+
+def _segment(lines: List[str], node: ast.AST) -> str:
+    start, end = _node_span(node)
+    return "".join(lines[start - 1:end])
+
+
+def _def_name(node: ast.AST) -> Optional[str]:
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return node.name
+    if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+        return node.targets[0].id
+    if isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name):
+        return node.target.id
+    return None
+
+
+def _norm(src: str) -> str:
+    try:
+        return ast.dump(ast.parse(textwrap.dedent(src)))
+    except SyntaxError:
+        return src.strip()
+
+
+def merge_modules(base: str, extra: str) -> Tuple[str, List[str]]:
+    """
+    Merges `extra` into `base`:
+      - imports missing from base are added after base's last import,
+      - classes with the same name get the methods/attributes they lack, and
+        their __init__ gets the `self.x = ...` attributes (locators) it lacks,
+      - new top-level functions, classes and assignments are appended.
+    Returns (merged_source, conflicts); a conflict is a name defined in both with
+    different bodies – base's definition is kept.
+    Raises SyntaxError if either module does not parse.
+    """
+    a_tree = ast.parse(base)
+    b_tree = ast.parse(extra)
+    a_lines = base.splitlines(keepends=True)
+    b_lines = extra.splitlines(keepends=True)
+    if a_lines and not a_lines[-1].endswith("\n"):
+        a_lines[-1] += "\n"
+
+    conflicts: List[str] = []
+    inserts: List[Tuple[int, str]] = []  # (after 1-based line, text)
+    appended: List[str] = []
+
+    a_imports = {ast.dump(n) for n in a_tree.body if isinstance(n, (ast.Import, ast.ImportFrom))}
+    a_defs = {}
+    for n in a_tree.body:
+        name = _def_name(n)
+        if name:
+            a_defs[name] = n
+    last_import = max(
+        (_node_span(n)[1] for n in a_tree.body if isinstance(n, (ast.Import, ast.ImportFrom))),
+        default=0,
+    )
+
+    new_imports: List[str] = []
+    for node in b_tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            if ast.dump(node) not in a_imports:
+                a_imports.add(ast.dump(node))
+                new_imports.append(_segment(b_lines, node))
+            continue
+
+        name = _def_name(node)
+        if name is None:
+            continue  # bare expressions / docstrings: keep base's
+        a_node = a_defs.get(name)
+        if a_node is None:
+            appended.append(_segment(b_lines, node))
+            a_defs[name] = node
+            continue
+        if isinstance(a_node, ast.ClassDef) and isinstance(node, ast.ClassDef):
+            added, clash, init_insert = _merge_class(a_node, node, a_lines, b_lines)
+            conflicts.extend(f"{name}.{c}" for c in clash)
+            if added:
+                inserts.append((_node_span(a_node)[1], added))
+            if init_insert:
+                inserts.append(init_insert)  # after the class insert: same line goes in before it
+        elif _norm(_segment(a_lines, a_node)) != _norm(_segment(b_lines, node)):
+            conflicts.append(name)
+
+    if new_imports:
+        inserts.append((last_import, "".join(new_imports)))
+    out = list(a_lines)
+    for after, text in sorted(inserts, key=lambda t: t[0], reverse=True):
+        out.insert(after, text)
+    merged = "".join(out)
+    if appended:
+        merged = merged.rstrip("\n") + "\n\n\n" + "\n\n".join(s.rstrip("\n") + "\n" for s in appended)
+    return merged, conflicts
+
+
+def _self_assigns(fn: ast.FunctionDef) -> Dict[str, ast.stmt]:
+    """`self.x = ...` statements directly in a method body, by attribute name."""
+    out: Dict[str, ast.stmt] = {}
+    for st in fn.body:
+        targets = st.targets if isinstance(st, ast.Assign) else [st.target] if isinstance(st, ast.AnnAssign) else []
+        for t in targets:
+            if isinstance(t, ast.Attribute) and isinstance(t.value, ast.Name) and t.value.id == "self":
+                out.setdefault(t.attr, st)
+    return out
+
+
+def _merge_init(
+    a_fn: ast.FunctionDef, b_fn: ast.FunctionDef, a_lines: List[str], b_lines: List[str]
+) -> Tuple[Optional[Tuple[int, str]], List[str]]:
+    """
+    Two __init__ that differ: when they take the same arguments, the attributes
+    only b assigns are appended to a's body. Returns (insert, clashes); the whole
+    __init__ clashes when the arguments or the other statements differ.
+    """
+    if ast.dump(a_fn.args) != ast.dump(b_fn.args):
+        return None, ["__init__"]
+    a_attrs = _self_assigns(a_fn)
+    b_attrs = _self_assigns(b_fn)
+    attr_nodes = {id(n) for n in [*a_attrs.values(), *b_attrs.values()]}
+    a_rest = [_norm(_segment(a_lines, st)) for st in a_fn.body if id(st) not in attr_nodes]
+    b_rest = [_norm(_segment(b_lines, st)) for st in b_fn.body if id(st) not in attr_nodes]
+    clash = [] if all(r in a_rest for r in b_rest) else ["__init__"]
+    added: List[str] = []
+    for attr, st in b_attrs.items():
+        if attr not in a_attrs:
+            added.append(textwrap.indent(textwrap.dedent(_segment(b_lines, st)), " " * a_fn.body[0].col_offset))
+        elif _norm(_segment(a_lines, a_attrs[attr])) != _norm(_segment(b_lines, st)):
+            clash.append(f"__init__.{attr}")
+    insert = (_node_span(a_fn)[1], "".join(s.rstrip("\n") + "\n" for s in added)) if added else None
+    return insert, clash
+
+
+def _merge_class(
+    a_cls: ast.ClassDef, b_cls: ast.ClassDef, a_lines: List[str], b_lines: List[str]
+) -> Tuple[str, List[str], Optional[Tuple[int, str]]]:
+    a_members = {}
+    for n in a_cls.body:
+        name = _def_name(n)
+        if name:
+            a_members[name] = n
+    indent = " " * (a_cls.body[0].col_offset if a_cls.body else a_cls.col_offset + 4)
+    added: List[str] = []
+    clash: List[str] = []
+    init_insert: Optional[Tuple[int, str]] = None
+    for node in b_cls.body:
+        name = _def_name(node)
+        if name is None:
+            continue
+        seg = _segment(b_lines, node)
+        if name in a_members:
+            a_node = a_members[name]
+            if _norm(_segment(a_lines, a_node)) == _norm(seg):
+                continue
+            if name == "__init__" and isinstance(a_node, ast.FunctionDef) and isinstance(node, ast.FunctionDef):
+                init_insert, init_clash = _merge_init(a_node, node, a_lines, b_lines)
+                clash.extend(init_clash)
+            else:
+                clash.append(name)
+            continue
+        added.append(textwrap.indent(textwrap.dedent(seg), indent))
+    if not added:
+        return "", clash, init_insert
+    return "\n" + "\n".join(s.rstrip("\n") + "\n" for s in added), clash, init_insert
+
+
+def merge_mappings(mappings: Iterable[Dict[str, str]]) -> Tuple[Dict[str, str], Dict[str, List[str]]]:
+    """Key-wise merge of file maps in order. Returns (merged, conflicts_by_key)."""
+    merged: Dict[str, str] = {}
+    conflicts: Dict[str, List[str]] = {}
+    for mapping in mappings:
+        for key, code in mapping.items():
+            if key not in merged:
+                merged[key] = code
+                continue
+            try:
+                merged[key], clash = merge_modules(merged[key], code)
+            except SyntaxError as e:
+                log.error("Cannot merge %s (%s); keeping the first version", key, e)
+                clash = ["<unparseable>"]
+            if clash:
+                conflicts.setdefault(key, []).extend(clash)
+    return merged, conflicts
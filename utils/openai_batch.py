@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import requests
+
+from utils.openai_llm import OPENAI_BASE, OPENAI_KEY
+
+log = logging.getLogger(__name__)
+
+TERMINAL_STATES = ("completed", "failed", "expired", "cancelled")
+
+
+def write_batch_file(path: Path, bodies: Iterable[Tuple[str, Dict[str, Any]]], url: str = "/v1/chat/completions") -> int:
+    """Writes (custom_id, request body) pairs as Batch API JSONL. Returns the line count."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    n = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for custom_id, body in bodies:
+            f.write(json.dumps({"custom_id": custom_id, "method": "POST", "url": url, "body": body},
+                               ensure_ascii=False) + "\n")
+            n += 1
+    return n
+
+
+def parse_batch_output(text: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Maps custom_id -> {"content": str} for successful lines, {"error": str} otherwise.
+    Works for both the output and the error file of a batch.
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        cid = item.get("custom_id")
+        resp = item.get("response") or {}
+        body = resp.get("body") or {}
+        if item.get("error") or resp.get("status_code", 200) >= 400:
+            results[cid] = {"error": json.dumps(item.get("error") or body.get("error") or body)[:2000]}
+            continue
+        try:
+            msg = body["choices"][0]["message"]
+            content = json.dumps(msg["parsed"], ensure_ascii=False) if msg.get("parsed") is not None else msg.get("content")
+            results[cid] = {"content": content or "", "usage": body.get("usage")}
+        except (KeyError, IndexError, TypeError) as e:
+            results[cid] = {"error": f"malformed response: {e}"}
+    return results
+
+
+class BatchClient:
+    """Thin client for the Files + Batches endpoints of the OpenAI API (or a compatible stand-in)."""
+
+    def __init__(self, base: str = OPENAI_BASE, key: str = OPENAI_KEY, timeout_s: float = 120) -> None:
+        self.base = base.rstrip("/")
+        self.timeout_s = timeout_s
+        self._session = requests.Session()
+        self._session.headers["Authorization"] = f"Bearer {key}"
+
+    def upload(self, path: Path) -> str:
+        with open(path, "rb") as fh:
+            r = self._session.post(
+                f"{self.base}/files",
+                files={"file": (path.name, fh, "application/jsonl")},
+                data={"purpose": "batch"},
+                timeout=self.timeout_s,
+            )
+        r.raise_for_status()
+        return r.json()["id"]
+
+    def create(self, input_file_id: str, endpoint: str = "/v1/chat/completions",
+               window: str = "24h", metadata: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        r = self._session.post(
+            f"{self.base}/batches",
+            json={
+                "input_file_id": input_file_id,
+                "endpoint": endpoint,
+                "completion_window": window,
+                "metadata": metadata or {},
+            },
+            timeout=self.timeout_s,
+        )
+        r.raise_for_status()
+        return r.json()
+
+    def get(self, batch_id: str) -> Dict[str, Any]:
+        r = self._session.get(f"{self.base}/batches/{batch_id}", timeout=self.timeout_s)
+        r.raise_for_status()
+        return r.json()
+
+    def wait(self, batch_id: str, poll_s: float = 30.0, timeout_s: Optional[float] = None) -> Dict[str, Any]:
+        t0 = time.monotonic()
+        last = None
+        while True:
+            batch = self.get(batch_id)
+            status = batch.get("status")
+            counts = batch.get("request_counts") or {}
+            progress = (status, counts.get("completed"), counts.get("failed"))
+            if progress != last:
+                log.info("Batch %s: %s (%s/%s done, %s failed)", batch_id, status,
+                         counts.get("completed", 0), counts.get("total", "?"), counts.get("failed", 0))
+                last = progress
+            if status in TERMINAL_STATES:
+                return batch
+            if timeout_s is not None and time.monotonic() - t0 > timeout_s:
+                raise TimeoutError(f"Batch {batch_id} still {status} after {timeout_s:.0f}s")
+            time.sleep(poll_s)
+
+    def download(self, file_id: str) -> str:
+        r = self._session.get(f"{self.base}/files/{file_id}/content", timeout=self.timeout_s)
+        r.raise_for_status()
+        return r.text
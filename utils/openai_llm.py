@@ -1,19 +1,225 @@
 #!/usr/bin/env python3
 from __future__ import annotations
-import os, json, time, logging
-from typing import Any, Dict, List, Optional
+import os, json, time, gzip, logging, threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+
+from utils.llm_metrics import llm_metrics
+from utils.rate_limiter import RateLimiter, estimate_tokens, rate_limiter
+from utils.singleflight import SingleFlight, request_key
+from utils.streaming import delta_content, iter_sse_data
 
 log = logging.getLogger(__name__)
 
 OPENAI_BASE = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
 OPENAI_KEY  = os.getenv("OPENAI_API_KEY", "")
 
-class OpenAIClient:
+POOL_SIZE      = int(os.getenv("OPENAI_POOL_SIZE", "16"))
+HTTP2          = os.getenv("OPENAI_HTTP2", "0") == "1"
+GZIP_MIN_BYTES = int(os.getenv("OPENAI_GZIP_MIN_BYTES", "0"))  # 0 = never compress request bodies
+
+# ===== Connection pool =====
+class _PoolStats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.bytes_raw = 0
+        self.bytes_sent = 0
+
+    def add_request(self, raw: int, sent: int) -> None:
+        with self._lock:
+            self.requests += 1
+            self.bytes_raw += raw
+            self.bytes_sent += sent
+
+    def add_connection(self) -> None:
+        with self._lock:
+            self.new_connections += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "transport": "httpx/h2" if isinstance(_SESSION, _HTTPXSession) else "requests",
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused_connections": max(0, self.requests - self.new_connections),
+                "bytes_raw": self.bytes_raw,
+                "bytes_sent": self.bytes_sent,
+            }
+
+POOL_STATS = _PoolStats()
+
+# ===== Token usage =====
+class _UsageStats:
+    """Token totals from response `usage` blocks, including provider prompt-cache hits."""
+
     def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+
+    def add(self, usage: Optional[Dict[str, Any]]) -> None:
+        if not usage:
+            return
+        details = usage.get("prompt_tokens_details") or {}
+        with self._lock:
+            self.responses += 1
+            self.prompt_tokens += int(usage.get("prompt_tokens") or 0)
+            self.cached_tokens += int(details.get("cached_tokens") or 0)
+            self.completion_tokens += int(usage.get("completion_tokens") or 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "responses": self.responses,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "cached_ratio": round(self.cached_tokens / self.prompt_tokens, 3) if self.prompt_tokens else 0.0,
+                "completion_tokens": self.completion_tokens,
+            }
+
+USAGE_STATS = _UsageStats()
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        POOL_STATS.add_connection()
+        return super()._new_conn()
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        POOL_STATS.add_connection()
+        return super()._new_conn()
+
+class _PooledAdapter(HTTPAdapter):
+    """HTTPAdapter whose urllib3 pools count every fresh TCP/TLS connection."""
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+class _HTTPXSession:
+    """Minimal requests.Session look-alike over httpx with HTTP/2 (needs `httpx[http2]`)."""
+
+    def __init__(self, pool_size: int) -> None:
+        import httpx
+        self._client = httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    def post(self, url: str, headers: Dict[str, str], data: bytes, timeout: float, stream: bool = False):
+        req = self._client.build_request("POST", url, headers=headers, content=data, timeout=timeout)
+        return self._client.send(req, stream=stream)
+
+_SESSION: Any = None
+_SESSION_LOCK = threading.Lock()
+
+def get_session() -> Any:
+    """Process-wide keep-alive session shared by every OpenAIClient (thread-safe)."""
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is not None:
+            return _SESSION
+        if HTTP2:
+            try:
+                _SESSION = _HTTPXSession(POOL_SIZE)
+                log.info("OpenAI transport: httpx HTTP/2 (pool=%s)", POOL_SIZE)
+                return _SESSION
+            except ImportError:
+                log.warning("OPENAI_HTTP2=1 but httpx[http2] is not installed; using requests")
+        sess = requests.Session()
+        adapter = _PooledAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, pool_block=False)
+        sess.mount("https://", adapter)
+        sess.mount("http://", adapter)
+        sess.headers["Connection"] = "keep-alive"
+        _SESSION = sess
+        return _SESSION
+
+def pool_stats() -> Dict[str, Any]:
+    return POOL_STATS.snapshot()
+
+def usage_stats() -> Dict[str, Any]:
+    return USAGE_STATS.snapshot()
+
+def _encode_body(payload: Dict[str, Any], headers: Dict[str, str]) -> Tuple[bytes, int]:
+    """Returns (wire body, uncompressed size); gzips large prompts when enabled."""
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    if GZIP_MIN_BYTES and len(body) >= GZIP_MIN_BYTES:
+        headers["Content-Encoding"] = "gzip"
+        return gzip.compress(body, compresslevel=5), len(body)
+    return body, len(body)
+
+def _raise_for_status(r: Any) -> None:
+    # httpx responses don't raise requests.HTTPError; normalise so callers see one type.
+    if r.status_code >= 400:
+        if getattr(r, "is_stream_consumed", True) is False:
+            r.read()  # httpx streamed error body
+        raise requests.HTTPError(f"{r.status_code} Error for url: {r.url}", response=r)
+
+def _ttfb(r: Any) -> Optional[float]:
+    # requests: time until the response headers were parsed; httpx only knows it once the body is read.
+    try:
+        return r.elapsed.total_seconds()
+    except Exception:
+        return None
+
+def _iter_lines(r: Any) -> Iterator[Any]:
+    if isinstance(r, requests.Response):
+        return r.iter_lines(decode_unicode=True)
+    return r.iter_lines()
+
+def build_chat_payload(
+    model: str,
+    messages: List[Dict[str, Any]],
+    max_tokens: int,
+    json_mode: bool = False,
+    json_schema: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    # Build payload according to modern Chat Completions
+    payload: Dict[str, Any] = {
+        "model": model,
+        "messages": messages,
+        "max_completion_tokens": int(max_tokens),
+        # no temperature/top_p to avoid 400 on GPT-5 family defaults
+    }
+
+    if json_schema:
+        payload["response_format"] = {
+            "type": "json_schema",
+            "json_schema": json_schema,
+        }
+    elif json_mode:
+        payload["response_format"] = {"type": "json_object"}
+    return payload
+
+def _out_of_retries(last_err: Optional[Exception], retries: int) -> RuntimeError:
+    if isinstance(last_err, requests.HTTPError):
+        try:
+            err_body = last_err.response.text  # type: ignore[attr-defined]
+        except Exception:
+            err_body = str(last_err)
+        return RuntimeError(f"OpenAI error {last_err.response.status_code}: {err_body}")  # type: ignore[attr-defined]
+    return RuntimeError(f"OpenAI call failed after {retries} attempts: {last_err}")
+
+class OpenAIClient:
+    def __init__(self, session: Any = None, limiter: Optional[RateLimiter] = None, base: Optional[str] = None) -> None:
         if not OPENAI_KEY:
             raise EnvironmentError("OPENAI_API_KEY is not set.")
-        self.base = OPENAI_BASE.rstrip("/")
+        self.base = (base or OPENAI_BASE).rstrip("/")
+        self._session = session or get_session()
+        self.limiter = limiter or rate_limiter
+        self.inflight = SingleFlight()
+
+    def pool_stats(self) -> Dict[str, Any]:
+        return pool_stats()
 
     def call_chat(
         self,
@@ -29,44 +235,52 @@ class OpenAIClient:
         Returns raw string content from .choices[0].message.
         Enforces Structured Output if json_schema is provided; else JSON mode if json_mode=True.
         Never sends legacy params (no temperature/top_p/modalities/reasoning).
+        Identical concurrent requests share one upstream call (see SingleFlight).
         """
-        url = f"{self.base}/chat/completions"
-
-        # Build payload according to modern Chat Completions
-        payload: Dict[str, Any] = {
-            "model": model,
-            "messages": messages,
-            "max_completion_tokens": int(max_tokens),
-            # no temperature/top_p to avoid 400 on GPT-5 family defaults
-        }
+        key = request_key(model, messages, max_tokens=max_tokens, json_mode=json_mode, json_schema=json_schema)
+        return self.inflight.do(
+            key, lambda: self._call_chat(model, messages, max_tokens, json_mode, json_schema, timeout_s, retries)
+        )
 
-        if json_schema:
-            payload["response_format"] = {
-                "type": "json_schema",
-                "json_schema": json_schema,
-            }
-        elif json_mode:
-            payload["response_format"] = {"type": "json_object"}
+    def _call_chat(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        max_tokens: int,
+        json_mode: bool,
+        json_schema: Optional[Dict[str, Any]],
+        timeout_s: int,
+        retries: int,
+    ) -> str:
+        url = f"{self.base}/chat/completions"
+        payload = build_chat_payload(model, messages, max_tokens, json_mode, json_schema)
+        headers = self._headers()
 
-        headers = {
-            "Authorization": f"Bearer {OPENAI_KEY}",
-            "Content-Type": "application/json",
-        }
+        body, raw_size = _encode_body(payload, headers)
+        est_tokens = estimate_tokens(messages, max_tokens)
 
         backoff = 1.0
         last_err: Optional[Exception] = None
+        t0 = time.monotonic()
+        ttfb: Optional[float] = None
 
         for attempt in range(1, retries + 1):
             try:
-                r = requests.post(url, headers=headers, json=payload, timeout=timeout_s)
+                self.limiter.acquire(model, est_tokens)
+                POOL_STATS.add_request(raw_size, len(body))
+                r = self._session.post(url, headers=headers, data=body, timeout=timeout_s)
+                ttfb = _ttfb(r)
+                self.limiter.update_from_headers(model, r.headers)
                 if r.status_code == 429:
-                    # rate limit – simple backoff
-                    log.warning("Rate limited (429). Sleeping for %.2fs", backoff)
-                    time.sleep(backoff)
+                    # rate limit – honour Retry-After; the limiter holds every caller until then
+                    delay = self.limiter.on_429(model, r.headers, fallback_s=backoff)
+                    log.warning("Rate limited (429). Backing off %.2fs", delay)
                     backoff = min(backoff * 1.7, 15.0)
                     continue
-                r.raise_for_status()
+                _raise_for_status(r)
                 data = r.json()
+                self.limiter.settle(model, est_tokens, (data.get("usage") or {}).get("total_tokens"))
+                USAGE_STATS.add(data.get("usage"))
 
                 # Prefer parsed (Structured Outputs)
                 choices = data.get("choices", [])
@@ -75,17 +289,19 @@ class OpenAIClient:
 
                 msg = choices[0].get("message", {}) or {}
                 if "parsed" in msg and msg["parsed"] is not None:
-                    return json.dumps(msg["parsed"], ensure_ascii=False)
-
-                content = msg.get("content", "")
-                if content is None:
-                    content = ""
-                content = str(content)
+                    content = json.dumps(msg["parsed"], ensure_ascii=False)
+                else:
+                    content = msg.get("content", "")
+                    if content is None:
+                        content = ""
+                    content = str(content)
 
                 if not content.strip():
                     # If we enforced json_schema, content can be empty while parsed exists.
                     # If still empty – try one more time with shorter system.
                     raise ValueError("Empty content from model")
+                llm_metrics.record("openai", model, time.monotonic() - t0, ttfb, data.get("usage"),
+                                   retries=attempt - 1)
                 return content
             except Exception as e:
                 last_err = e
@@ -94,12 +310,109 @@ class OpenAIClient:
                 backoff = min(backoff * 1.7, 10.0)
 
         # Out of retries:
-        if isinstance(last_err, requests.HTTPError):
+        llm_metrics.record("openai", model, time.monotonic() - t0, ttfb, retries=retries - 1,
+                           ok=False, error=str(last_err))
+        raise _out_of_retries(last_err, retries)
+
+    def stream_chat(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        max_tokens: int = 2048,
+        json_mode: bool = False,
+        json_schema: Optional[Dict[str, Any]] = None,
+        timeout_s: int = 120,
+        retries: int = 3,
+    ) -> Iterator[str]:
+        """
+        Same request as call_chat with stream=True; yields content deltas as they arrive.
+        Retries only until the first delta is yielded (a partial stream cannot be replayed).
+        Closing the generator closes the HTTP response.
+        """
+        info: Dict[str, Any] = {"attempts": 1}
+        t0 = time.monotonic()
+        error: Optional[str] = "closed by consumer"
+        try:
+            yield from self._stream_chat(model, messages, max_tokens, json_mode, json_schema, timeout_s, retries, info)
+            error = None
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            ttfb = info["first_delta"] - t0 if "first_delta" in info else None
+            llm_metrics.record("openai", model, time.monotonic() - t0, ttfb, info.get("usage"),
+                               retries=info["attempts"] - 1, ok=error is None, stream=True, error=error)
+
+    def _stream_chat(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        max_tokens: int,
+        json_mode: bool,
+        json_schema: Optional[Dict[str, Any]],
+        timeout_s: int,
+        retries: int,
+        info: Dict[str, Any],
+    ) -> Iterator[str]:
+        url = f"{self.base}/chat/completions"
+        payload = build_chat_payload(model, messages, max_tokens, json_mode, json_schema)
+        payload["stream"] = True
+        payload["stream_options"] = {"include_usage": True}
+        headers = self._headers()
+        headers["Accept"] = "text/event-stream"
+
+        body, raw_size = _encode_body(payload, headers)
+        est_tokens = estimate_tokens(messages, max_tokens)
+
+        backoff = 1.0
+        last_err: Optional[Exception] = None
+
+        for attempt in range(1, retries + 1):
+            info["attempts"] = attempt
+            started = False
             try:
-                err_body = last_err.response.text  # type: ignore[attr-defined]
-            except Exception:
-                err_body = str(last_err)
-            raise RuntimeError(f"OpenAI error {last_err.response.status_code}: {err_body}")  # type: ignore[attr-defined]
-        raise RuntimeError(f"OpenAI call failed after {retries} attempts: {last_err}")
+                self.limiter.acquire(model, est_tokens)
+                POOL_STATS.add_request(raw_size, len(body))
+                r = self._session.post(url, headers=headers, data=body, timeout=timeout_s, stream=True)
+                try:
+                    self.limiter.update_from_headers(model, r.headers)
+                    if r.status_code == 429:
+                        delay = self.limiter.on_429(model, r.headers, fallback_s=backoff)
+                        log.warning("Rate limited (429). Backing off %.2fs", delay)
+                        backoff = min(backoff * 1.7, 15.0)
+                        continue
+                    _raise_for_status(r)
+                    for event in iter_sse_data(_iter_lines(r)):
+                        if event.get("usage"):
+                            self.limiter.settle(model, est_tokens, event["usage"].get("total_tokens"))
+                            USAGE_STATS.add(event["usage"])
+                            info["usage"] = event["usage"]
+                        text = delta_content(event)
+                        if text:
+                            if not started:
+                                info["first_delta"] = time.monotonic()
+                            started = True
+                            yield text
+                finally:
+                    r.close()
+                if not started:
+                    raise ValueError("Empty content from model")
+                return
+            except Exception as e:
+                if started:
+                    raise
+                last_err = e
+                log.debug("OpenAI stream failed (attempt %s): %s", attempt, e)
+                time.sleep(backoff)
+                backoff = min(backoff * 1.7, 10.0)
+
+        raise _out_of_retries(last_err, retries)
+
+    @staticmethod
+    def _headers() -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {OPENAI_KEY}",
+            "Content-Type": "application/json",
+        }
 
 llm_client = OpenAIClient()
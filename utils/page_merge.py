@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Shared pages/* modules written by several source files. Each source's version
+of a page module is kept as a part under <out>/.page_parts/<key>/; the module
+on disk is the AST merge of all parts (utils.module_merge), so when two tests
+both emit pages/login_page neither one's methods or locators are lost, and
+reconverting one source replaces only its own part. Definitions the parts
+disagree on are logged and counted; the version of the source whose path sorts
+first is kept, whatever order the writes came in.
+
+Writes of one key are serialized across threads and processes (flock on
+<key>.lock next to its parts).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List
+
+from utils.module_merge import merge_mappings
+
+try:
+    import fcntl
+except ImportError:  # Windows: per-process locks only
+    fcntl = None  # type: ignore[assignment]
+
+log = logging.getLogger(__name__)
+
+PARTS_DIR = ".page_parts"
+
+
+def _owner_id(owner: Path) -> str:
+    return hashlib.sha256(Path(owner).resolve().as_posix().encode("utf-8")).hexdigest()[:16]
+
+
+def _atomic_write(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class PageMerge:
+    def __init__(self) -> None:
+        self._guard = threading.Lock()
+        self._locks: Dict[Path, threading.Lock] = {}
+        self.merged_writes = 0
+        self.conflicts: Counter = Counter()
+
+    def write(self, out_dir: Path, key: str, owner: Path, code: str) -> str:
+        """Stores owner's version of a pages/* key and rewrites the module from all parts. Returns it."""
+        out_dir = Path(out_dir).resolve()
+        parts = self._parts_dir(out_dir, key)
+        with self._key_lock(parts):
+            _atomic_write(parts / f"{_owner_id(owner)}.json",
+                          json.dumps({"owner": Path(owner).resolve().as_posix(), "code": code}, ensure_ascii=False))
+            return self._compose(out_dir, key, parts)
+
+    def retain(self, out_dir: Path, owner: Path, keys: Iterable[str]) -> List[str]:
+        """Drops owner's parts of pages/* keys it no longer produces (all of them when keys is empty)."""
+        out_dir = Path(out_dir).resolve()
+        root = out_dir / PARTS_DIR
+        if not root.is_dir():
+            return []
+        keep = {k.strip().lstrip("/").removesuffix(".py") for k in keys}
+        dropped: List[str] = []
+        for part in sorted(root.rglob(f"{_owner_id(owner)}.json")):
+            key = part.parent.relative_to(root).as_posix()
+            if key in keep:
+                continue
+            with self._key_lock(part.parent):
+                part.unlink(missing_ok=True)
+                if any(part.parent.glob("*.json")):
+                    self._compose(out_dir, key, part.parent)
+            dropped.append(key)
+        return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        with self._guard:
+            return {
+                "merged_writes": self.merged_writes,
+                "conflicts": sum(self.conflicts.values()),
+                "top_conflicts": self.conflicts.most_common(5),
+            }
+
+    # private --------------------------------------------------------------
+    @staticmethod
+    def _parts_dir(out_dir: Path, key: str) -> Path:
+        return out_dir / PARTS_DIR / key.strip().lstrip("/").removesuffix(".py")
+
+    def _compose(self, out_dir: Path, key: str, parts: Path) -> str:
+        """Merges every part of key (in owner path order) into the module on disk; caller holds the key lock."""
+        items = []
+        for p in sorted(parts.glob("*.json")):
+            try:
+                items.append(json.loads(p.read_text(encoding="utf-8")))
+            except (OSError, ValueError) as e:
+                log.warning("Ignoring unreadable page part %s: %s", p, e)
+        items.sort(key=lambda it: it["owner"])
+        dest = out_dir / f"{key}.py"
+        if not items:
+            return dest.read_text(encoding="utf-8") if dest.exists() else ""
+        if len(items) == 1:
+            code = items[0]["code"]
+        else:
+            merged, conflicts = merge_mappings({key: it["code"]} for it in items)
+            code = merged[key]
+            with self._guard:
+                self.merged_writes += 1
+                self.conflicts.update(f"{key}: {c}" for c in conflicts.get(key, []))
+            if conflicts.get(key):
+                owners = ", ".join(Path(it["owner"]).name for it in items)
+                log.warning("%s: sources (%s) disagree on %s; kept %s's version", key, owners,
+                            ", ".join(conflicts[key]), Path(items[0]["owner"]).name)
+            else:
+                log.info("%s: merged the versions of %s sources", key, len(items))
+        _atomic_write(dest, code)
+        return code
+
+    @contextmanager
+    def _key_lock(self, parts: Path) -> Iterator[None]:
+        with self._guard:
+            lock = self._locks.setdefault(parts, threading.Lock())
+        with lock:
+            if fcntl is None:
+                yield
+                return
+            parts.parent.mkdir(parents=True, exist_ok=True)
+            with open(parts.with_name(parts.name + ".lock"), "a") as fh:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+page_merge = PageMerge()
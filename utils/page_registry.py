@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Registry of converted page objects, kept next to the output
+(<out>/.page_registry.json). Each page-object source is converted once; the
+Playwright classes it produced are stored as compact signatures, handed to the
+tests that import it as prompt context, and its pages/* keys cannot be
+overwritten by another source's conversion. Processes converting into the same
+output share the file: writes are merged into it under a lock, and lookups see
+what the other processes registered.
+"""
+from __future__ import annotations
+
+import ast
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from utils.shared_json import SharedJSONFile
+
+log = logging.getLogger(__name__)
+
+REGISTRY_NAME = ".page_registry.json"
+REGISTRY_VERSION = 1
+
+
+def is_page_source(code: str) -> bool:
+    """True for page-object modules: no test functions and no TestCase classes."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return False
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test"):
+            return False
+        if isinstance(node, ast.ClassDef) and any(ast.unparse(b).endswith("TestCase") for b in node.bases):
+            return False
+    return True
+
+
+def class_signatures(code: str) -> Dict[str, List[str]]:
+    """{class name: ["class X(Base):", "def m(self, a) -> str", ...]} for the public API of a module."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return {}
+    out: Dict[str, List[str]] = {}
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        bases = ", ".join(ast.unparse(b) for b in node.bases)
+        lines = [f"class {node.name}({bases}):" if bases else f"class {node.name}:"]
+        for item in node.body:
+            if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)) and (
+                item.name == "__init__" or not item.name.startswith("_")
+            ):
+                ret = f" -> {ast.unparse(item.returns)}" if item.returns else ""
+                prefix = "async def" if isinstance(item, ast.AsyncFunctionDef) else "def"
+                lines.append(f"{prefix} {item.name}({ast.unparse(item.args)}){ret}")
+        out[node.name] = lines
+    return out
+
+
+def imported_modules(code: str) -> Tuple[List[str], List[str]]:
+    """(last component of every imported module, every imported name) of a source."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return [], []
+    modules: List[str] = []
+    names: List[str] = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.extend(a.name.rsplit(".", 1)[-1] for a in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module.rsplit(".", 1)[-1])
+            names.extend(a.name for a in node.names)
+    return modules, names
+
+
+class PageRegistry:
+    """
+    pages[owner] = {"stem", "keys", "classes": {name: {"key", "signature"}}}
+    where owner is the resolved path of the page-object source and stem its
+    module name (what tests import it as).
+    """
+
+    def __init__(self, out_dir: Path) -> None:
+        self.out_dir = Path(out_dir)
+        self.path = self.out_dir / REGISTRY_NAME
+        self._lock = threading.Lock()
+        self._file = SharedJSONFile(self.path)
+        self.pages: Dict[str, Dict[str, Any]] = self._parse(self._file.read())
+        self.contexts_given = 0
+        self.keys_protected = 0
+
+    def register(self, src_path: Path, mapping: Dict[str, str]) -> None:
+        """Records the pages/* modules a page-object source produced."""
+        classes: Dict[str, Dict[str, Any]] = {}
+        for key, code in sorted(mapping.items()):
+            if key.startswith("pages/"):
+                for name, signature in class_signatures(code).items():
+                    classes[name] = {"key": key, "signature": signature}
+        with self._lock, self._update() as pages:
+            pages[_owner(src_path)] = {
+                "stem": Path(src_path).stem,
+                "keys": sorted(k for k in mapping if k.startswith("pages/")),
+                "classes": classes,
+            }
+
+    def forget(self, src_path: Path) -> bool:
+        """Drops a source's entry (deleted, or no longer a page-object source). Returns whether it had one."""
+        owner = _owner(src_path)
+        with self._lock:
+            self._refresh()
+            if owner not in self.pages:
+                return False
+            with self._update() as pages:
+                if pages.pop(owner, None) is None:
+                    return False
+        log.info("Page registry: forgot %s", Path(src_path).name)
+        return True
+
+    def context_for(self, src_path: Path, code: str, count: bool = True) -> str:
+        """
+        Signatures of the registered page objects `code` imports, as prompt text ('' if none).
+        count=False for lookups that do not go into a prompt (fingerprints).
+        """
+        modules, names = imported_modules(code)
+        owner = _owner(src_path)
+        with self._lock:
+            self._refresh()
+            entries = [
+                e for o, e in sorted(self.pages.items())
+                if o != owner and (e["stem"] in modules or any(n in e["classes"] for n in names))
+            ]
+            if entries and count:
+                self.contexts_given += 1
+        if not entries:
+            return ""
+        blocks = []
+        for e in entries:
+            for name, cls in sorted(e["classes"].items()):
+                blocks.append(f"# {cls['key']} (from {e['stem']}.py)\n" + "\n    ".join(cls["signature"]))
+        return "\n\n".join(blocks)
+
+    def protect(self, src_path: Path, mapping: Dict[str, str]) -> Dict[str, str]:
+        """Drops pages/* keys that another registered source owns."""
+        owner = _owner(src_path)
+        with self._lock:
+            self._refresh()
+            owned = {k: o for o, e in self.pages.items() if o != owner for k in e["keys"]}
+        kept = {}
+        for key, code in mapping.items():
+            if key in owned:
+                log.info("%s: not overwriting %s (owned by %s)", Path(src_path).name, key, Path(owned[key]).name)
+                with self._lock:
+                    self.keys_protected += 1
+                continue
+            kept[key] = code
+        return kept
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            self._refresh()
+            return {
+                "pages": len(self.pages),
+                "contexts_given": self.contexts_given,
+                "keys_protected": self.keys_protected,
+            }
+
+    # private --------------------------------------------------------------
+    def _parse(self, data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        if data and data.get("version") != REGISTRY_VERSION:
+            log.info("Ignoring page registry with version %s", data.get("version"))
+            return {}
+        return data.get("pages", {})
+
+    def _refresh(self) -> None:
+        """Picks up what other processes registered since this one last read or wrote."""
+        if self._file.changed():
+            self.pages = self._parse(self._file.read())
+
+    @contextmanager
+    def _update(self) -> Iterator[Dict[str, Dict[str, Any]]]:
+        """The pages as they are on disk, under the file lock; written back after the block."""
+        with self._file.update() as data:
+            pages = self._parse(data)
+            yield pages
+            data.clear()
+            data.update(version=REGISTRY_VERSION, pages=pages)
+        self.pages = pages
+
+
+def _owner(src_path: Path) -> str:
+    return Path(src_path).resolve().as_posix()
+
+
+_REGISTRIES: Dict[Path, PageRegistry] = {}
+_REGISTRIES_GUARD = threading.Lock()
+
+
+def registry_for(out_dir: Path) -> PageRegistry:
+    """One registry object per output directory per process; it rereads the file when another process wrote it."""
+    out_dir = Path(out_dir).resolve()
+    with _REGISTRIES_GUARD:
+        if out_dir not in _REGISTRIES:
+            _REGISTRIES[out_dir] = PageRegistry(out_dir)
+        return _REGISTRIES[out_dir]
+
+
+def registry_stats() -> Optional[Dict[str, int]]:
+    """Summed stats of every registry used in this process (None if none was)."""
+    with _REGISTRIES_GUARD:
+        regs = list(_REGISTRIES.values())
+    if not regs:
+        return None
+    totals: Dict[str, int] = {}
+    for r in regs:
+        for k, v in r.stats().items():
+            totals[k] = totals.get(k, 0) + v
+    return totals
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import contextlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Mapping, Optional
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: state stays per-process
+    fcntl = None  # type: ignore[assignment]
+
+log = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("OPENAI_RATE_LIMIT", "1") != "0"
+DEFAULT_RPM = float(os.getenv("OPENAI_RPM", "0"))  # 0 = unknown until learned from headers
+DEFAULT_TPM = float(os.getenv("OPENAI_TPM", "0"))
+STATE_FILE = os.getenv("OPENAI_RATE_LIMIT_FILE", "")  # e.g. /tmp/openai_ratelimit.json
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """'1s', '6m0s', '20ms', '1h2m3.5s' or a bare number of seconds -> seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(n) * _UNITS[u] for n, u in parts)
+
+
+def retry_after_seconds(headers: Mapping[str, str]) -> Optional[float]:
+    ms = headers.get("retry-after-ms")
+    if ms:
+        try:
+            return float(ms) / 1000.0
+        except ValueError:
+            pass
+    return parse_duration(headers.get("retry-after"))
+
+
+def estimate_tokens(messages: List[Dict[str, Any]], max_tokens: int) -> int:
+    """Rough TPM cost of a request: ~4 chars per prompt token plus the completion budget."""
+    chars = sum(len(str(m.get("content") or "")) for m in messages)
+    return chars // 4 + int(max_tokens)
+
+
+class RateLimiter:
+    """
+    Client-side token buckets for requests/min and tokens/min, per model.
+    - Starts from OPENAI_RPM / OPENAI_TPM; 0 means "unknown" and never blocks
+      until x-ratelimit-limit-* headers teach the real quota.
+    - x-ratelimit-remaining-* clamp the local buckets to what the server reports.
+    - A 429 blocks every caller until Retry-After (or the request bucket reset).
+    - With state_file set, buckets live in a JSON file guarded by flock so all
+      worker processes on the host draw from the same quota.
+    """
+
+    def __init__(
+        self,
+        rpm: float = DEFAULT_RPM,
+        tpm: float = DEFAULT_TPM,
+        state_file: str = STATE_FILE,
+        enabled: bool = RATE_LIMIT_ENABLED,
+    ) -> None:
+        self.rpm = rpm
+        self.tpm = tpm
+        self.enabled = enabled
+        self.state_file = Path(state_file) if state_file and fcntl is not None else None
+        self._lock = threading.Lock()
+        self._mem: Dict[str, Any] = {}
+        self.waited_s = 0.0
+        self.throttled_429 = 0
+
+    # public ---------------------------------------------------------------
+    def acquire(self, model: str, tokens: int) -> float:
+        """Blocks until one request and `tokens` tokens are available. Returns seconds waited."""
+        if not self.enabled:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._state() as state:
+                b = self._bucket(state, model)
+                now = time.time()
+                self._refill(b, now)
+                if b["blocked_until"] > now:
+                    wait = b["blocked_until"] - now
+                else:
+                    need_tok = min(float(tokens), b["tpm"]) if b["tpm"] else 0.0
+                    req_ok = not b["rpm"] or b["req"] >= 1.0
+                    tok_ok = not b["tpm"] or b["tok"] >= need_tok
+                    if req_ok and tok_ok:
+                        if b["rpm"]:
+                            b["req"] -= 1.0
+                        if b["tpm"]:
+                            b["tok"] -= need_tok
+                        break
+                    wait = 0.0
+                    if not req_ok:
+                        wait = (1.0 - b["req"]) * 60.0 / b["rpm"]
+                    if not tok_ok:
+                        wait = max(wait, (need_tok - b["tok"]) * 60.0 / b["tpm"])
+            wait = min(max(wait, 0.05), 5.0)
+            time.sleep(wait)
+            waited += wait
+        if waited:
+            log.debug("Rate limiter held %s for %.2fs", model, waited)
+            self.waited_s += waited
+        return waited
+
+    def settle(self, model: str, estimated: int, actual: Optional[int]) -> None:
+        """Refunds the part of the token estimate the request didn't use."""
+        if not self.enabled or actual is None or actual >= estimated:
+            return
+        with self._state() as state:
+            b = self._bucket(state, model)
+            if b["tpm"]:
+                b["tok"] = min(b["tpm"], b["tok"] + (estimated - actual))
+
+    def update_from_headers(self, model: str, headers: Mapping[str, str]) -> None:
+        if not self.enabled:
+            return
+        lim_req = _num(headers.get("x-ratelimit-limit-requests"))
+        lim_tok = _num(headers.get("x-ratelimit-limit-tokens"))
+        rem_req = _num(headers.get("x-ratelimit-remaining-requests"))
+        rem_tok = _num(headers.get("x-ratelimit-remaining-tokens"))
+        if lim_req is None and lim_tok is None and rem_req is None and rem_tok is None:
+            return
+        with self._state() as state:
+            b = self._bucket(state, model)
+            self._refill(b, time.time())
+            # OpenAI reports per-minute quotas; learn them and clamp to the server's view.
+            if lim_req:
+                b["rpm"] = lim_req
+            if lim_tok:
+                b["tpm"] = lim_tok
+            if rem_req is not None and b["rpm"]:
+                b["req"] = min(b["req"], rem_req)
+            if rem_tok is not None and b["tpm"]:
+                b["tok"] = min(b["tok"], rem_tok)
+
+    def on_429(self, model: str, headers: Mapping[str, str], fallback_s: float) -> float:
+        """Blocks the model for Retry-After (or the request reset / fallback). Returns the delay."""
+        delay = (
+            retry_after_seconds(headers)
+            or parse_duration(headers.get("x-ratelimit-reset-requests"))
+            or fallback_s
+        )
+        self.throttled_429 += 1
+        if not self.enabled:
+            time.sleep(delay)
+            return delay
+        with self._state() as state:
+            b = self._bucket(state, model)
+            b["blocked_until"] = max(b["blocked_until"], time.time() + delay)
+            b["req"] = 0.0
+        return delay
+
+    def stats(self) -> Dict[str, Any]:
+        with self._state() as state:
+            models = {m: {"rpm": b["rpm"], "tpm": b["tpm"]} for m, b in state.items()}
+        return {
+            "enabled": self.enabled,
+            "shared": self.state_file is not None,
+            "waited_s": round(self.waited_s, 2),
+            "throttled_429": self.throttled_429,
+            "models": models,
+        }
+
+    # private --------------------------------------------------------------
+    def _bucket(self, state: Dict[str, Any], model: str) -> Dict[str, float]:
+        b = state.get(model)
+        if b is None:
+            b = {
+                "rpm": self.rpm, "tpm": self.tpm,
+                "req": self.rpm, "tok": self.tpm,
+                "ts": time.time(), "blocked_until": 0.0,
+            }
+            state[model] = b
+        return b
+
+    @staticmethod
+    def _refill(b: Dict[str, float], now: float) -> None:
+        elapsed = max(0.0, now - b["ts"])
+        b["ts"] = now
+        if b["rpm"]:
+            b["req"] = min(b["rpm"], b["req"] + elapsed * b["rpm"] / 60.0)
+        if b["tpm"]:
+            b["tok"] = min(b["tpm"], b["tok"] + elapsed * b["tpm"] / 60.0)
+
+    @contextlib.contextmanager
+    def _state(self) -> Iterator[Dict[str, Any]]:
+        with self._lock:
+            if self.state_file is None:
+                yield self._mem
+                return
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.state_file, "a+", encoding="utf-8") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    raw = f.read()
+                    try:
+                        state = json.loads(raw) if raw.strip() else {}
+                    except ValueError:
+                        state = {}
+                    yield state
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _num(value: Optional[str]) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+JSON state files that several converter processes update (the output manifest
+and page registry when workers share a job queue). An update holds an flock on
+<file>.lock, re-reads the file, applies the change to what is on disk and
+replaces the file atomically; readers reload only when it was replaced since
+they last looked.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: updates are only serialised within the process
+    fcntl = None  # type: ignore[assignment]
+
+
+class SharedJSONFile:
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(f"{self.path.name}.lock")
+        self._seen: Optional[Tuple[int, int, int]] = None
+
+    def read(self) -> Dict[str, Any]:
+        """The content on disk ({} when missing or unreadable)."""
+        self._seen = self._stat()
+        return self._read()
+
+    def changed(self) -> bool:
+        """True when the file was written (by any process) since the last read() or update()."""
+        return self._stat() != self._seen
+
+    @contextmanager
+    def update(self) -> Iterator[Dict[str, Any]]:
+        """Yields the latest content under an exclusive lock; what it holds after the block is written back."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, "a", encoding="utf-8") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                data = self._read()
+                yield data
+                tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+                tmp.write_text(json.dumps(data, indent=2, sort_keys=True), encoding="utf-8")
+                os.replace(tmp, self.path)
+                self._seen = self._stat()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    # private --------------------------------------------------------------
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from utils.llm_cache import make_cache_key
+
+log = logging.getLogger(__name__)
+
+COALESCE_ENABLED = os.getenv("LLM_COALESCE", "1") != "0"
+
+# Transport knobs: they change how a request is sent, never what it returns.
+_TRANSPORT_KWARGS = ("timeout_s", "retries")
+
+
+def request_key(model: str, messages: List[Dict[str, Any]], **kwargs: Any) -> str:
+    """Normalized key of a call_chat request (same canonical form as the response cache)."""
+    rest = {k: v for k, v in kwargs.items() if k not in _TRANSPORT_KWARGS}
+    return make_cache_key(
+        model=model,
+        messages=messages,
+        max_tokens=rest.pop("max_tokens", 0) or 0,
+        json_mode=rest.pop("json_mode", False),
+        json_schema=rest.pop("json_schema", None),
+        extra=rest,
+    )
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Request coalescing: concurrent callers with the same key share one execution.
+    - do(key, fn): blocking; the first caller runs fn, the others wait for its
+      result (or its exception).
+    - ado(key, factory): asyncio twin; the shared call runs as a task that only
+      gets cancelled once every caller waiting on it has been cancelled.
+    Nothing is remembered after a call completes - that is the response cache's job.
+    """
+
+    def __init__(self, enabled: bool = COALESCE_ENABLED) -> None:
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self._tasks: Dict[Tuple[int, str], List[Any]] = {}  # (loop id, key) -> [task, waiters]
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        if not self.enabled:
+            return fn()
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            log.debug("Coalesced LLM request %s… onto in-flight call", key[:12])
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    async def ado(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await factory()
+        loop = asyncio.get_running_loop()
+        tkey = (id(loop), key)
+        with self._lock:
+            slot = self._tasks.get(tkey)
+            if slot is None:
+                task = loop.create_task(factory())
+                slot = self._tasks[tkey] = [task, 0]
+                task.add_done_callback(lambda _t, s=slot: self._forget(tkey, s))
+                self.calls += 1
+            else:
+                self.coalesced += 1
+                log.debug("Coalesced LLM request %s… onto in-flight task", key[:12])
+            slot[1] += 1
+        task = slot[0]
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if slot[1] == 1:
+                task.cancel()  # last interested caller is gone
+            raise
+        finally:
+            slot[1] -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.calls + self.coalesced
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "saved_ratio": round(self.coalesced / total, 3) if total else 0.0,
+                "in_flight": len(self._flights) + len(self._tasks),
+            }
+
+    def _forget(self, tkey: Tuple[int, str], slot: List[Any]) -> None:
+        with self._lock:
+            if self._tasks.get(tkey) is slot:
+                del self._tasks[tkey]
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Token-aware, AST-aware splitting of Selenium sources that are too large to
+convert in one prompt, or whose test methods are converted one per call
+(fan-out). Each chunk is a valid, self-contained module: the
+module preamble (imports, settings, helpers), the class header with its
+shared members (setUp, private helpers, __init__) and a subset of the
+class's test methods (or public methods for page objects).
+"""
+from __future__ import annotations
+
+import ast
+import functools
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+log = logging.getLogger(__name__)
+
+TOKEN_MODEL = os.getenv("TOKEN_COUNT_MODEL", "gpt-4o")
+
+
+@functools.lru_cache(maxsize=4)
+def _encoder(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:  # BPE files are downloaded on first use; offline hosts fall back
+        log.warning("tiktoken encoding unavailable (%s); estimating 4 chars/token", e)
+        return None
+
+
+def count_tokens(text: str, model: str = TOKEN_MODEL) -> int:
+    """tiktoken count when available, ~4 chars/token otherwise."""
+    enc = _encoder(model)
+    if enc is None:
+        return len(text) // 4 + 1
+    return len(enc.encode(text, disallowed_special=()))
+
+
+@dataclass
+class SourceChunk:
+    index: int
+    total: int
+    code: str
+    units: List[str] = field(default_factory=list)  # method names carried by this chunk
+    tokens: int = 0
+
+
+def _span(node: ast.AST) -> Tuple[int, int]:
+    start = node.lineno
+    for d in getattr(node, "decorator_list", []) or []:
+        start = min(start, d.lineno)
+    return start, node.end_lineno or node.lineno
+
+
+def _is_unit(node: ast.stmt, has_tests: bool) -> bool:
+    if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return False
+    if has_tests:
+        return node.name.startswith("test")
+    return not node.name.startswith("_")
+
+
+def split_source(code: str, max_tokens: int, model: str = TOKEN_MODEL, fanout_min: int = 0) -> List[SourceChunk]:
+    """
+    Splits `code` into chunks of at most ~max_tokens each (a single oversized
+    method still becomes its own chunk). With fanout_min > 0, test classes with
+    at least that many test methods are split one method per chunk even when
+    the file fits. Returns one chunk if nothing is split or the file cannot be
+    parsed.
+    """
+    total_tokens = count_tokens(code, model)
+    if total_tokens <= max_tokens and fanout_min <= 0:
+        return [SourceChunk(0, 1, code, tokens=total_tokens)]
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        log.warning("Cannot split unparsable source (%s); converting whole file", e)
+        return [SourceChunk(0, 1, code, tokens=total_tokens)]
+
+    lines = code.splitlines(keepends=True)
+    if lines and not lines[-1].endswith("\n"):
+        lines[-1] += "\n"
+
+    def text(a: int, b: int) -> str:
+        return "".join(lines[a - 1:b])
+
+    # Only classes with several units are worth splitting.
+    splittable = []
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            has_tests = any(
+                isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef)) and n.name.startswith("test")
+                for n in node.body
+            )
+            units = [n for n in node.body if _is_unit(n, has_tests)]
+            fan_out = has_tests and 0 < fanout_min <= len(units)
+            if len(units) > 1 and (fan_out or total_tokens > max_tokens):
+                splittable.append((node, units, fan_out))
+    if not splittable:
+        return [SourceChunk(0, 1, code, tokens=total_tokens)]
+
+    split_ids = {id(c) for c, _, _ in splittable}
+    preamble = "".join(
+        text(*_span(n)) for n in tree.body if id(n) not in split_ids
+    )
+
+    bodies: List[Tuple[List[str], str]] = []  # (units, chunk text)
+    for cls, units, fan_out in splittable:
+        unit_ids = {id(u) for u in units}
+        header = text(_span(cls)[0], _span(cls.body[0])[0] - 1)
+        shared = "".join(text(*_span(n)) + "\n" for n in cls.body if id(n) not in unit_ids)
+        base = preamble + "\n\n" + header + shared
+        budget = 0 if fan_out else max(max_tokens - count_tokens(base, model), 1)
+
+        group: List[ast.stmt] = []
+        used = 0
+        for u in units:
+            seg = text(*_span(u)) + "\n"
+            cost = count_tokens(seg, model)
+            if group and used + cost > budget:
+                bodies.append(([g.name for g in group], base + "".join(text(*_span(g)) + "\n" for g in group)))
+                group, used = [], 0
+            group.append(u)
+            used += cost
+        if group:
+            bodies.append(([g.name for g in group], base + "".join(text(*_span(g)) + "\n" for g in group)))
+
+    chunks = [
+        SourceChunk(i, len(bodies), body, units=names, tokens=count_tokens(body, model))
+        for i, (names, body) in enumerate(bodies)
+    ]
+    log.info("Split source (%s tokens) into %s chunks", total_tokens, len(chunks))
+    return chunks
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import json
+import logging
+import re
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+log = logging.getLogger(__name__)
+
+# ===== Server-Sent Events (Chat Completions stream=True) =====
+def iter_sse_data(lines: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+    """Yields each JSON `data:` payload until `data: [DONE]`."""
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        try:
+            yield json.loads(data)
+        except ValueError:
+            log.debug("Skipping malformed SSE line: %.200s", data)
+
+
+def delta_content(event: Dict[str, Any]) -> str:
+    choices = event.get("choices") or []
+    if not choices:
+        return ""
+    delta = choices[0].get("delta") or {}
+    return delta.get("content") or ""
+
+
+# ===== Incremental file-map parser =====
+class StreamAborted(ValueError):
+    """Raised from an on_key/on_entry callback to stop consuming a stream."""
+
+
+_STR_STOP = re.compile(r'["\\]')
+
+
+class FileMapStreamParser:
+    """
+    Incremental parser for a flat JSON object of string values, e.g. the
+    {"pages/x": "...", "tests/y": "..."} file map, fed in arbitrary chunks.
+    - on_key(key) fires as soon as a key's closing quote arrives (validate/abort early).
+    - on_entry(key, value) fires as soon as the value's closing quote arrives.
+    Text before the first '{' (Markdown fences, chatter) is ignored; any
+    non-string value raises ValueError.
+    """
+
+    def __init__(
+        self,
+        on_entry: Optional[Callable[[str, str], None]] = None,
+        on_key: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self.on_entry = on_entry
+        self.on_key = on_key
+        self.result: Dict[str, str] = {}
+        self.done = False
+        self._state = "start"
+        self._buf: list = []
+        self._escape = False
+        self._key: Optional[str] = None
+
+    def feed(self, chunk: str) -> None:
+        i, n = 0, len(chunk)
+        while i < n:
+            st = self._state
+            if st in ("key", "value"):
+                i = self._consume_string(chunk, i)
+                continue
+            c = chunk[i]
+            i += 1
+            if c.isspace():
+                continue
+            if st == "start":
+                if c == "{":
+                    self._state = "key_or_end"
+            elif st == "key_or_end":
+                if c == '"':
+                    self._state = "key"
+                elif c == "}":
+                    self._finish()
+                else:
+                    raise ValueError(f"expected key, got {c!r}")
+            elif st == "colon":
+                if c != ":":
+                    raise ValueError(f"expected ':', got {c!r}")
+                self._state = "value_start"
+            elif st == "value_start":
+                if c != '"':
+                    raise ValueError(f"value for {self._key!r} is not a string")
+                self._state = "value"
+            elif st == "comma_or_end":
+                if c == ",":
+                    self._state = "key_only"
+                elif c == "}":
+                    self._finish()
+                else:
+                    raise ValueError(f"expected ',' or '}}', got {c!r}")
+            elif st == "key_only":
+                if c != '"':
+                    raise ValueError(f"expected key, got {c!r}")
+                self._state = "key"
+            elif st == "done":
+                return  # trailing text (closing fence etc.)
+
+    def close(self) -> Dict[str, str]:
+        if not self.done:
+            raise ValueError("stream ended before the JSON object was complete")
+        return self.result
+
+    # private --------------------------------------------------------------
+    def _consume_string(self, chunk: str, i: int) -> int:
+        n = len(chunk)
+        while i < n:
+            if self._escape:
+                self._buf.append(chunk[i])
+                self._escape = False
+                i += 1
+                continue
+            m = _STR_STOP.search(chunk, i)
+            if m is None:
+                self._buf.append(chunk[i:])
+                return n
+            j = m.start()
+            if j > i:
+                self._buf.append(chunk[i:j])
+            if chunk[j] == "\\":
+                self._buf.append("\\")
+                self._escape = True
+                i = j + 1
+                continue
+            self._end_string()
+            return j + 1
+        return n
+
+    def _end_string(self) -> None:
+        text = json.loads('"' + "".join(self._buf) + '"')
+        self._buf = []
+        if self._state == "key":
+            self._key = text
+            self._state = "colon"
+            if self.on_key:
+                self.on_key(text)
+        else:
+            key = self._key or ""
+            self.result[key] = text
+            self._state = "comma_or_end"
+            if self.on_entry:
+                self.on_entry(key, text)
+
+    def _finish(self) -> None:
+        self._state = "done"
+        self.done = True
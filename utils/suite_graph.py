@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Import graph of a Selenium suite. Files are converted after the suite modules
+they import (page objects, workflow helpers), so the page registry can hand
+dependents the converted signatures; among ready files the one heading the
+longest remaining chain goes first. The same graph gives the critical path and
+a wall-clock estimate for a given number of workers.
+"""
+from __future__ import annotations
+
+import ast
+import heapq
+import logging
+import os
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from utils.source_chunker import count_tokens
+
+log = logging.getLogger(__name__)
+
+# Conversion time per 1k source tokens until the manifest has timings of earlier runs.
+DEFAULT_S_PER_KTOKEN = float(os.getenv("CONVERT_EST_S_PER_KTOKEN", "15"))
+
+# Imports of these are never matched to suite files by suffix or stem.
+EXTERNAL_PACKAGES = {"selenium", "pytest", "webdriver_manager", "playwright"}
+
+
+def _dotted(path: Path, root: Path) -> str:
+    try:
+        rel = path.with_suffix("").relative_to(root)
+    except ValueError:
+        rel = Path(path.stem)
+    parts = list(rel.parts)
+    if parts and parts[-1] == "__init__":
+        parts.pop()
+    return ".".join(parts)
+
+
+def _imported_modules(tree: ast.Module, importer: str) -> List[str]:
+    """Dotted names a module imports; `from a import b` also yields a.b (b may be a submodule)."""
+    package = importer.rsplit(".", 1)[0] if "." in importer else ""
+    found: List[str] = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            found.extend(a.name for a in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ""
+            if node.level:
+                anchor = package.split(".") if package else []
+                anchor = anchor[:len(anchor) - (node.level - 1)] if node.level > 1 else anchor
+                base = ".".join(p for p in [*anchor, base] if p)
+            if base:
+                found.append(base)
+            found.extend(f"{base}.{a.name}" if base else a.name for a in node.names if a.name != "*")
+    return found
+
+
+@dataclass
+class SuiteGraph:
+    files: List[Path]
+    deps: Dict[Path, Set[Path]]  # file -> suite files it imports (cycles broken)
+    tokens: Dict[Path, int]
+    s_per_token: float = DEFAULT_S_PER_KTOKEN / 1000
+    dependents: Dict[Path, Set[Path]] = field(default_factory=dict)
+    levels: Dict[Path, float] = field(default_factory=dict)  # see bottom_levels()
+    cycles: List[Tuple[Path, Path]] = field(default_factory=list)  # dropped back edges
+
+    @classmethod
+    def build(cls, files: Iterable[Path], root: Path, s_per_token: Optional[float] = None) -> "SuiteGraph":
+        """
+        Resolves each file's imports to files of the suite: by dotted path under
+        root, then by unique dotted suffix, then by unique module stem (suites are
+        often copied around, so `page_objects.Pages.LoginPage` may live at
+        login/LoginPage.py). Anything else is a third-party or missing module.
+        """
+        files = list(dict.fromkeys(Path(f) for f in files))
+        root = Path(root)
+        names = {f: _dotted(f, root) for f in files}
+        by_name = {n: f for f, n in names.items() if n}
+        by_stem: Dict[str, List[Path]] = {}
+        for f, n in names.items():
+            by_stem.setdefault(n.rsplit(".", 1)[-1], []).append(f)
+
+        def resolve(module: str) -> Optional[Path]:
+            if module in by_name:
+                return by_name[module]
+            top = module.split(".")[0]
+            if top in EXTERNAL_PACKAGES or top in sys.stdlib_module_names:
+                return None
+            suffix = [f for n, f in by_name.items() if n.endswith("." + module)]
+            if len(suffix) == 1:
+                return suffix[0]
+            stem = by_stem.get(module.rsplit(".", 1)[-1], [])
+            return stem[0] if len(stem) == 1 else None
+
+        deps: Dict[Path, Set[Path]] = {}
+        tokens: Dict[Path, int] = {}
+        for f in files:
+            code = f.read_text(encoding="utf-8")
+            tokens[f] = count_tokens(code)
+            try:
+                tree = ast.parse(code)
+            except SyntaxError:
+                deps[f] = set()
+                continue
+            deps[f] = {d for m in _imported_modules(tree, names[f]) if (d := resolve(m)) and d != f}
+        graph = cls(files, deps, tokens, s_per_token if s_per_token else DEFAULT_S_PER_KTOKEN / 1000)
+        graph._break_cycles()
+        graph.dependents = {f: set() for f in files}
+        for f, ds in graph.deps.items():
+            for d in ds:
+                graph.dependents[d].add(f)
+        graph.levels = graph.bottom_levels()
+        return graph
+
+    def cost(self, f: Path) -> float:
+        """Estimated seconds to convert f."""
+        return self.tokens[f] * self.s_per_token
+
+    def bottom_levels(self) -> Dict[Path, float]:
+        """Cost of the longest chain from each file through everything that (transitively) imports it."""
+        levels: Dict[Path, float] = {}
+        for f in reversed(self._topo()):
+            levels[f] = self.cost(f) + max((levels[d] for d in self.dependents[f]), default=0.0)
+        return levels
+
+    def order(self) -> List[Path]:
+        """Topological order, longest remaining chain first among ready files."""
+        waiting = {f: len(self.deps[f]) for f in self.files}
+        heap = [self._key(f) for f in self.files if not waiting[f]]
+        heapq.heapify(heap)
+        order: List[Path] = []
+        while heap:
+            f = heapq.heappop(heap)[2]
+            order.append(f)
+            for d in self.dependents[f]:
+                waiting[d] -= 1
+                if not waiting[d]:
+                    heapq.heappush(heap, self._key(d))
+        return order
+
+    def ready(self, done: Set[Path], started: Set[Path]) -> List[Path]:
+        """Files not started whose suite imports are all done, most urgent first."""
+        return sorted((f for f in self.files if f not in started and self.deps[f] <= done), key=self._key)
+
+    def critical_path(self) -> Tuple[List[Path], float]:
+        """The chain of imports that bounds the wall-clock time however many workers run."""
+        roots = [f for f in self.files if not self.deps[f]]
+        if not roots:
+            return [], 0.0
+        f = min(roots, key=self._key)
+        path = [f]
+        while self.dependents[f]:
+            f = min(self.dependents[f], key=self._key)
+            path.append(f)
+        return path, self.levels[path[0]]
+
+    def estimate(self, jobs: int) -> float:
+        """Wall-clock seconds of this schedule on `jobs` workers (list scheduling with the estimated costs)."""
+        jobs = max(1, jobs)
+        waiting = {f: len(self.deps[f]) for f in self.files}
+        ready = [self._key(f) for f in self.files if not waiting[f]]
+        heapq.heapify(ready)
+        running: List[Tuple[float, str, Path]] = []
+        now = 0.0
+        while ready or running:
+            while ready and len(running) < jobs:
+                f = heapq.heappop(ready)[2]
+                heapq.heappush(running, (now + self.cost(f), f.as_posix(), f))
+            now, _, f = heapq.heappop(running)
+            for d in self.dependents[f]:
+                waiting[d] -= 1
+                if not waiting[d]:
+                    heapq.heappush(ready, self._key(d))
+        return now
+
+    def downstream(self, files: Iterable[Path]) -> Set[Path]:
+        """Files that import any of `files`, directly or through other suite files."""
+        seen: Set[Path] = set()
+        todo = [f for f in files if f in self.dependents]
+        while todo:
+            for d in self.dependents[todo.pop()]:
+                if d not in seen:
+                    seen.add(d)
+                    todo.append(d)
+        return seen
+
+    def edges(self) -> int:
+        return sum(len(d) for d in self.deps.values())
+
+    # private --------------------------------------------------------------
+    def _key(self, f: Path) -> Tuple[float, str, Path]:
+        return -self.levels[f], f.as_posix(), f
+
+    def _topo(self) -> List[Path]:
+        waiting = {f: len(self.deps[f]) for f in self.files}
+        queue = [f for f in self.files if not waiting[f]]
+        for f in queue:  # grows while iterating
+            for d in sorted(self.dependents[f], key=Path.as_posix):
+                waiting[d] -= 1
+                if not waiting[d]:
+                    queue.append(d)
+        return queue
+
+    def _break_cycles(self) -> None:
+        """Drops back edges (DFS in file order) so the graph is a DAG; import cycles are logged."""
+        state: Dict[Path, int] = {}  # 1 = on the DFS stack, 2 = finished
+
+        for start in self.files:
+            if start in state:
+                continue
+            state[start] = 1
+            stack = [(start, iter(sorted(self.deps[start], key=Path.as_posix)))]
+            while stack:
+                node, it = stack[-1]
+                nxt = next(it, None)
+                if nxt is None:
+                    state[node] = 2
+                    stack.pop()
+                elif state.get(nxt) == 1:
+                    self.deps[node].discard(nxt)
+                    self.cycles.append((node, nxt))
+                    log.warning("Import cycle: %s -> %s; %s will not wait for %s", node.name, nxt.name, node.name, nxt.name)
+                elif nxt not in state:
+                    state[nxt] = 1
+                    stack.append((nxt, iter(sorted(self.deps[nxt], key=Path.as_posix))))